@@ -2,15 +2,23 @@
 
 from datetime import datetime, timedelta
 
-from sp_api.util import retry
-
 from airflow import DAG
-from airflow.operators.bash import BashOperator
+from airflow.decorators import task
+
+from sales_data.marketplaces import MARKETPLACES
 
 #----------------------------------------------------
 #Why?
-# This Dag Schedules all 3 sync scripts (orders, order_items, sales)
-# You can later run them in parallel or add retry alerts as needed.
+# Runs the sync modules in-process as TaskFlow tasks (no fresh interpreter
+# per script) and fans out per credential region:
+#
+#   orders_<region> (one mapped task per marketplace) >> items_<region>
+#   sales_<region>  (one mapped task per marketplace, independent of orders)
+#
+# Each region's calls go through pools sized to its SP-API quota, so
+# regions run side by side while a region never runs two tasks against
+# the same API at once. Create the pools with:
+#   airflow pools import /opt/airflow/pools.json
 #----------------------------------------------------
 
 # Default arguments for all tasks in this DAG
@@ -22,8 +30,52 @@ default_args = {
     'retry_delay': timedelta(minutes=5),
 }
 
+REGIONS = sorted({region for _, _, region in MARKETPLACES.values()})
+
+
+def region_slug(region):
+    return region.lower().replace(" ", "_")
+
+
+# ───────────────────────────────────────
+# 🔧 Tasks (sync modules are imported inside each task so DAG parsing
+# doesn't load sp_api, pandas or client_config)
+# ───────────────────────────────────────
+
+@task
+def list_marketplaces(region):
+    """Marketplace ids in this region that we hold credentials for."""
+    from client_config import CREDENTIALS
+    if region not in CREDENTIALS:
+        return []
+    return [mp_id for mp_id, (_, _, mp_region) in MARKETPLACES.items() if mp_region == region]
+
+
+@task
+def sync_orders(marketplace_id):
+    from sales_data.amazon_sync import sync_marketplaces
+    return sync_marketplaces([marketplace_id])
+
+
+@task
+def sync_order_items(marketplace_ids):
+    from sales_data.order_items_sync import main_pipeline
+    if not marketplace_ids:
+        return 0
+    return main_pipeline(marketplace_ids=marketplace_ids)
+
+
+@task
+def sync_sales_summary(marketplace_id):
+    from sales_data.update_daily_sales import fetch_and_store
+    written, failed = fetch_and_store([marketplace_id])
+    if failed:
+        raise RuntimeError(f"SalesSummary refresh failed for {marketplace_id}")
+    return written
+
+
 # Define the DAG
-dag = DAG(
+with DAG(
     dag_id='amazon_order_items_sync',
     default_args=default_args,
     description='Sync data from SP API using Amazon + Sales Scripts',
@@ -31,41 +83,26 @@ dag = DAG(
     start_date=datetime(2025, 4, 6),
     catchup=False,
     tags=['sp-api','amazon','sync']
-)
-
-
-# ───────────────────────────────────────
-# 🔧 Task 1: Sync Amazon Orders
-# ───────────────────────────────────────
+) as dag:
 
-sync_orders = BashOperator(
-    task_id='sync_amazon_orders',
-    bash_command = 'python /app/sales_data/amazon_sync.py',
-    dag=dag
-)
+    for region in REGIONS:
+        slug = region_slug(region)
+        marketplaces = list_marketplaces.override(task_id=f"marketplaces_{slug}")(region)
 
+        # ───────────────────────────────────────
+        # 🔧 Orders → Order Items (Orders API quota)
+        # ───────────────────────────────────────
+        orders = sync_orders.override(
+            task_id=f"orders_{slug}", pool=f"sp_orders_{slug}"
+        ).expand(marketplace_id=marketplaces)
+        items = sync_order_items.override(
+            task_id=f"items_{slug}", pool=f"sp_orders_{slug}"
+        )(marketplaces)
+        orders >> items
 
-# ───────────────────────────────────────
-# 🔧 Task 2: Sync Order Items
-# ───────────────────────────────────────
-
-sync_order_items = BashOperator(
-    task_id='sync_order_items',
-    bash_command = 'python /app/sales_data/order_items-sync.py',\
-    dag=dag
-)
-
-# ───────────────────────────────────────
-# 🔧 Task 3: Sync Sales Summary
-# ───────────────────────────────────────
-sync_sales_summary = BashOperator(
-    task_id='sync_sales_summary',
-    bash_command = 'python /app/sales_data/update_daily_sales.py',
-    dag=dag
-)
-
-# ───────────────────────────────────────
-# 📊 Task Dependencies (sequential)
-# Can be made parallel by removing these arrows
-# ───────────────────────────────────────
-sync_orders >> sync_order_items >> sync_sales_summary
+        # ───────────────────────────────────────
+        # 🔧 Sales Summary (Sales API quota, in parallel with orders)
+        # ───────────────────────────────────────
+        sync_sales_summary.override(
+            task_id=f"sales_{slug}", pool=f"sp_sales_{slug}"
+        ).expand(marketplace_id=marketplaces)
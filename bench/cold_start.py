@@ -0,0 +1,129 @@
+import sys
+import os
+import argparse
+import json
+import statistics
+import subprocess
+import time
+from datetime import datetime, timezone
+
+# Dynamically add the root project dir to sys.path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from bench.run_benchmark import save_result, load_results, _git_revision
+
+# Commands a user or scheduler typically starts; `--help` exits before any
+# network or database work, so what's left is interpreter + import cost.
+COMMANDS = {
+    "help": ["--help"],
+    "monitor": ["monitor", "--help"],
+    "orders": ["orders", "--help"],
+    "items": ["items", "--help"],
+    "sales": ["sales", "--help"],
+    "backfill": ["backfill", "--help"],
+    "report-backfill": ["report-backfill", "--help"],
+    "export": ["export", "--help"],
+    "dead-letters": ["dead-letters", "--help"],
+    "retention": ["retention", "--help"],
+}
+MODULES = ("sales_data.amazon_sync", "sales_data.order_items_sync", "sales_data.update_daily_sales",
+           "sales_data.fetch_historic_sales", "sales_data.report_backfill",
+           "sales_data.export", "sales_data.dead_letters", "sales_data.retention", "utils.monitor")
+# Should only be imported by the code paths that use them, never at import time
+HEAVY = ("pandas", "sp_api", "pytz", "requests", "boto3", "openpyxl", "pyarrow")
+
+_PROBE = (
+    "import importlib, json, sys; importlib.import_module(sys.argv[1]); "
+    "print(json.dumps(sorted(m for m in {heavy} if m in sys.modules)))"
+).format(heavy=repr(set(HEAVY)))
+
+
+def _env():
+    env = dict(os.environ)
+    env["PYTHONPATH"] = ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    return env
+
+
+def time_command(args, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        proc = subprocess.run([sys.executable, "-m", "nimbussync", *args], cwd=ROOT, env=_env(),
+                              stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        samples.append(time.perf_counter() - started)
+        if proc.returncode != 0:
+            return {"error": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"exit {proc.returncode}"}
+    return {"median_ms": round(statistics.median(samples) * 1000, 1),
+            "min_ms": round(min(samples) * 1000, 1)}
+
+
+def probe_module(module):
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-c", _PROBE, module], cwd=ROOT, env=_env(),
+                          capture_output=True, text=True)
+    elapsed = round((time.perf_counter() - started) * 1000, 1)
+    if proc.returncode != 0:
+        return {"error": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"exit {proc.returncode}"}
+    return {"import_ms": elapsed, "heavy_imports": json.loads(proc.stdout)}
+
+
+def run(repeat):
+    commit, dirty = _git_revision()
+    return {
+        "benchmark": "cold_start",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": commit,
+        "dirty": dirty,
+        "python": sys.version.split()[0],
+        "repeat": repeat,
+        "commands": {name: time_command(args, repeat) for name, args in COMMANDS.items()},
+        "modules": {module: probe_module(module) for module in MODULES},
+    }
+
+
+def print_summary(record):
+    print(f"\n--- 🚀 Cold start @ {record['commit'] or 'unknown'}{' (dirty)' if record['dirty'] else ''} ---")
+    for name, res in record["commands"].items():
+        value = res.get("error") or f"{res['median_ms']:.0f} ms median ({res['min_ms']:.0f} min)"
+        print(f"  nimbussync {' '.join(COMMANDS[name]):<20} {value}")
+    print()
+    for module, res in record["modules"].items():
+        if "error" in res:
+            print(f"  import {module:<34} ❌ {res['error']}")
+            continue
+        heavy = ", ".join(res["heavy_imports"])
+        print(f"  import {module:<34} {res['import_ms']:>6.0f} ms{'  ⚠️ loads ' + heavy if heavy else ''}")
+
+
+def print_comparison(records, last=10):
+    print(f"\n--- 📊 Last {min(last, len(records))} cold-start runs (median ms) ---")
+    print(f"{'commit':<12}" + "".join(f"{name:>10}" for name in COMMANDS))
+    for record in records[-last:]:
+        commit = (record["commit"] or "?") + ("*" if record["dirty"] else "")
+        cells = "".join(
+            f"{record['commands'].get(name, {}).get('median_ms', float('nan')):>10.0f}" for name in COMMANDS
+        )
+        print(f"{commit:<12}{cells}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure `nimbussync` start-up and module import cost")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--no-save", action="store_true")
+    parser.add_argument("--compare", type=int, metavar="N", nargs="?", const=10,
+                        help="print the last N stored runs and exit")
+    parser.add_argument("--strict", action="store_true",
+                        help="exit 1 if importing any module loads a heavy dependency")
+    args = parser.parse_args()
+
+    if args.compare:
+        print_comparison(load_results(benchmark="cold_start"), args.compare)
+        sys.exit(0)
+
+    record = run(args.repeat)
+    print_summary(record)
+    if not args.no_save:
+        save_result(record)
+    leaked = any(res.get("heavy_imports") for res in record["modules"].values())
+    sys.exit(1 if args.strict and leaked else 0)
@@ -0,0 +1,429 @@
+import sys
+import os
+import argparse
+import base64
+import bisect
+import gzip
+import itertools
+import json
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from zoneinfo import ZoneInfo
+
+# Dynamically add the root project dir to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sales_data.marketplaces import MARKETPLACES
+from utils.rate_limiter import OPERATION_LIMITS, DEFAULT_LIMIT, RATE_LIMIT_HEADER
+
+logger = logging.getLogger(__name__)
+
+# Local stand-in for the SP-API calls NimbusSync makes: getOrders (with
+# NextToken paging), getOrderItems, getOrderMetrics, the orders flat-file
+# report (createReport / getReport / getReportDocument plus the document
+# download) and the LWA token endpoint, all served from deterministic
+# synthetic data.
+
+CURRENCIES = {
+    "US": "USD", "CA": "CAD", "MX": "MXN", "DE": "EUR", "FR": "EUR", "IT": "EUR",
+    "ES": "EUR", "NL": "EUR", "BE": "EUR", "SE": "SEK", "PL": "PLN", "TR": "TRY",
+    "UK": "GBP", "JP": "JPY", "AU": "AUD",
+}
+ORDER_STATUSES = (("Shipped", 80), ("Unshipped", 8), ("Pending", 5), ("Canceled", 5), ("Shipping", 2))
+EXCLUDED_FROM_METRICS = ("Canceled",)
+MAX_PAGE_SIZE = 100
+ORDERS_REPORT_TYPE = "GET_FLAT_FILE_ALL_ORDERS_DATA_BY_ORDER_DATE_GENERAL"
+REPORT_COLUMNS = (
+    "amazon-order-id", "merchant-order-id", "purchase-date", "last-updated-date", "order-status",
+    "fulfillment-channel", "sales-channel", "product-name", "sku", "asin", "item-status", "quantity",
+    "currency", "item-price", "item-tax", "shipping-price", "shipping-tax", "gift-wrap-price",
+    "gift-wrap-tax", "item-promotion-discount", "ship-promotion-discount",
+)
+
+
+def _iso(dt):
+    return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _parse(value):
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+# ───────────────────────────────────────
+# Synthetic data
+# ───────────────────────────────────────
+
+class Dataset:
+    """Orders per marketplace, sorted by PurchaseDate and by LastUpdateDate for paging."""
+
+    def __init__(self, orders_per_marketplace=1000, days=30, max_items=3, seed=42, marketplaces=None):
+        self.now = datetime.now(timezone.utc).replace(microsecond=0)
+        self.orders = {}
+        self.items = {}
+        self.by_field = {}
+        marketplaces = marketplaces or list(MARKETPLACES)
+        for mp_index, mp_id in enumerate(marketplaces):
+            rng = random.Random(f"{seed}:{mp_id}")
+            name = MARKETPLACES[mp_id][0]
+            orders = [
+                self._order(rng, mp_index, i, mp_id, CURRENCIES[name], days, max_items)
+                for i in range(orders_per_marketplace)
+            ]
+            orders.sort(key=lambda o: o["_purchase"])
+            self.orders[mp_id] = orders
+            by_update = sorted(orders, key=lambda o: o["_updated"])
+            self.by_field[(mp_id, "PurchaseDate")] = (orders, [o["_purchase"] for o in orders])
+            self.by_field[(mp_id, "LastUpdateDate")] = (by_update, [o["_updated"] for o in by_update])
+
+    def _order(self, rng, mp_index, i, mp_id, currency, days, max_items):
+        order_id = f"{100 + mp_index:03d}-{i:07d}-{rng.randrange(10 ** 7):07d}"
+        purchased = self.now - timedelta(seconds=rng.randrange(days * 86400))
+        updated = min(self.now, purchased + timedelta(minutes=rng.randrange(72 * 60)))
+        status = rng.choices([s for s, _ in ORDER_STATUSES], [w for _, w in ORDER_STATUSES])[0]
+
+        items = []
+        for n in range(rng.randint(1, max_items)):
+            qty = rng.choice((1, 1, 1, 2, 3))
+            unit = rng.randrange(499, 9999) / 100
+            sku = rng.randrange(500)
+            items.append({
+                "ASIN": f"B0{sku:08d}",
+                "SellerSKU": f"SKU-{sku:04d}",
+                "OrderItemId": f"{rng.randrange(10 ** 13, 10 ** 14)}",
+                "Title": f"Synthetic product {sku}",
+                "QuantityOrdered": qty,
+                "ItemPrice": {"CurrencyCode": currency, "Amount": f"{unit * qty:.2f}"},
+                "ShippingPrice": {"CurrencyCode": currency, "Amount": f"{rng.choice((0, 0, 4.99)):.2f}"},
+            })
+        self.items[order_id] = items
+
+        total = sum(float(item["ItemPrice"]["Amount"]) for item in items)
+        return {
+            "AmazonOrderId": order_id,
+            "PurchaseDate": _iso(purchased),
+            "LastUpdateDate": _iso(updated),
+            "OrderStatus": status,
+            "MarketplaceId": mp_id,
+            "OrderTotal": {"CurrencyCode": currency, "Amount": f"{total:.2f}"},
+            "BuyerInfo": {"BuyerEmail": f"buyer{i}@marketplace.example", "BuyerName": f"Buyer {i}"},
+            "_purchase": purchased,
+            "_updated": updated,
+        }
+
+    def page(self, mp_id, field, after, offset, size):
+        orders, keys = self.by_field[(mp_id, field)]
+        start = bisect.bisect_right(keys, after) + offset
+        chunk = orders[start:start + size]
+        more = start + size < len(orders)
+        return [{k: v for k, v in o.items() if not k.startswith("_")} for o in chunk], more
+
+    def report_tsv(self, mp_id, start, end):
+        """The orders flat-file report body for orders purchased in [start, end)."""
+        orders, keys = self.by_field.get((mp_id, "PurchaseDate"), ([], []))
+        lines = ["\t".join(REPORT_COLUMNS)]
+        for order in orders[bisect.bisect_left(keys, start):bisect.bisect_left(keys, end)]:
+            currency = order["OrderTotal"]["CurrencyCode"]
+            for item in self.items[order["AmazonOrderId"]]:
+                lines.append("\t".join((
+                    order["AmazonOrderId"], "", order["PurchaseDate"], order["LastUpdateDate"],
+                    order["OrderStatus"], "Amazon", f"Amazon.{MARKETPLACES[mp_id][0].lower()}",
+                    item["Title"], item["SellerSKU"], item["ASIN"], order["OrderStatus"],
+                    str(item["QuantityOrdered"]), currency, item["ItemPrice"]["Amount"], "0.00",
+                    item["ShippingPrice"]["Amount"], "0.00", "", "", "", "",
+                )))
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+    def metrics(self, mp_id, start, end, tz_name):
+        tz = ZoneInfo(tz_name)
+        orders, keys = self.by_field[(mp_id, "PurchaseDate")]
+        currency = CURRENCIES[MARKETPLACES[mp_id][0]]
+        entries = []
+        day = start.astimezone(tz).date()
+        while True:
+            lo = max(start, datetime.combine(day, datetime.min.time(), tz))
+            next_day = day + timedelta(days=1)
+            hi = min(end, datetime.combine(next_day, datetime.min.time(), tz))
+            if lo >= end:
+                break
+            units = items = count = 0
+            sales = 0.0
+            for order in orders[bisect.bisect_left(keys, lo):bisect.bisect_left(keys, hi)]:
+                if order["OrderStatus"] in EXCLUDED_FROM_METRICS:
+                    continue
+                count += 1
+                for item in self.items[order["AmazonOrderId"]]:
+                    units += item["QuantityOrdered"]
+                    items += 1
+                    sales += float(item["ItemPrice"]["Amount"])
+            offset = datetime.combine(day, datetime.min.time(), tz).strftime("%z")
+            offset = f"{offset[:3]}:{offset[3:]}"
+            entries.append({
+                "interval": f"{day}T00:00{offset}--{next_day}T00:00{offset}",
+                "unitCount": units,
+                "orderItemCount": items,
+                "orderCount": count,
+                "averageUnitPrice": {"amount": f"{sales / units if units else 0:.2f}", "currencyCode": currency},
+                "totalSales": {"amount": f"{sales:.2f}", "currencyCode": currency},
+            })
+            day = next_day
+        return entries
+
+
+# ───────────────────────────────────────
+# Throttling and call accounting
+# ───────────────────────────────────────
+
+class Quota:
+    """Server-side usage plan: the documented rate times `scale`, non-blocking."""
+
+    def __init__(self, operation, scale):
+        rate, burst = OPERATION_LIMITS.get(operation, DEFAULT_LIMIT)
+        self.rate = rate * scale
+        self.burst = float(burst)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+
+class Stats:
+    def __init__(self):
+        self.calls = {}
+        self.throttled = {}
+        self._lock = threading.Lock()
+
+    def record(self, operation, throttled=False):
+        with self._lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+            if throttled:
+                self.throttled[operation] = self.throttled.get(operation, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            return {"calls": dict(self.calls), "throttled": dict(self.throttled)}
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+            self.throttled.clear()
+
+
+# ───────────────────────────────────────
+# HTTP handler
+# ───────────────────────────────────────
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "FakeSPAPI/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _error(self, status, code, message, headers=None):
+        self._send(status, {"errors": [{"code": code, "message": message}]}, headers)
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+        if path == "/reports/2021-06-30/reports":
+            self._call("createReport", self._create_report, json.loads(body or b"{}"))
+        elif path == "/auth/o2/token":
+            self.server.stats.record("lwaToken")
+            self._send(200, {"access_token": f"Atza|local-{time.time_ns()}",
+                             "token_type": "bearer", "expires_in": 3600})
+        elif path == "/_stats/reset":
+            self.server.stats.reset()
+            self._send(200, {})
+        else:
+            self._error(404, "NotFound", path)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        parts = url.path.strip("/").split("/")
+
+        if url.path == "/_stats":
+            return self._send(200, self.server.stats.snapshot())
+        if url.path == "/orders/v0/orders":
+            return self._call("getOrders", self._get_orders, query)
+        if len(parts) == 5 and parts[:3] == ["orders", "v0", "orders"] and parts[4] == "orderItems":
+            return self._call("getOrderItems", self._get_order_items, parts[3])
+        if url.path == "/sales/v1/orderMetrics":
+            return self._call("getOrderMetrics", self._get_order_metrics, query)
+        if len(parts) == 4 and parts[:3] == ["reports", "2021-06-30", "reports"]:
+            return self._call("getReport", self._get_report, parts[3])
+        if len(parts) == 4 and parts[:3] == ["reports", "2021-06-30", "documents"]:
+            return self._call("getReportDocument", self._get_report_document, parts[3])
+        if len(parts) == 2 and parts[0] == "_documents":
+            # Stands in for the pre-signed S3 URL: no token, no quota
+            return self._download(parts[1])
+        self._error(404, "NotFound", url.path)
+
+    def _call(self, operation, handler, arg):
+        server = self.server
+        if server.latency:
+            time.sleep(max(0.0, random.gauss(server.latency, server.jitter)))
+
+        quota = server.quotas.get(operation)
+        headers = {RATE_LIMIT_HEADER: f"{quota.rate:g}"} if quota else {}
+        throttled = quota is not None and not quota.take()
+        if not throttled and server.throttle_probability:
+            throttled = random.random() < server.throttle_probability
+        server.stats.record(operation, throttled)
+        if throttled:
+            return self._error(429, "QuotaExceeded", "You exceeded your quota for the requested resource.", headers)
+
+        try:
+            status, body = handler(arg)
+        except (KeyError, ValueError) as e:
+            status, body = 400, {"errors": [{"code": "InvalidInput", "message": str(e)}]}
+        self._send(status, body, headers)
+
+    def _get_orders(self, query):
+        data = self.server.dataset
+        if "NextToken" in query:
+            try:
+                state = json.loads(base64.urlsafe_b64decode(query["NextToken"]))
+            except ValueError:
+                return 400, {"errors": [{"code": "InvalidInput", "message": "Invalid NextToken"}]}
+            mp_id, field, after, offset, size = state["m"], state["f"], _parse(state["a"]), state["o"], state["s"]
+        else:
+            mp_id = query["MarketplaceIds"].split(",")[0]
+            if "LastUpdatedAfter" in query:
+                field, after = "LastUpdateDate", _parse(query["LastUpdatedAfter"])
+            else:
+                field, after = "PurchaseDate", _parse(query["CreatedAfter"])
+            offset = 0
+            size = min(int(query.get("MaxResultsPerPage", MAX_PAGE_SIZE)), MAX_PAGE_SIZE)
+
+        if (mp_id, field) not in data.by_field:
+            return 200, {"payload": {"Orders": []}}
+        orders, more = data.page(mp_id, field, after, offset, size)
+        payload = {"Orders": orders}
+        if more:
+            token = {"m": mp_id, "f": field, "a": _iso(after), "o": offset + size, "s": size}
+            payload["NextToken"] = base64.urlsafe_b64encode(json.dumps(token).encode()).decode()
+        return 200, {"payload": payload}
+
+    def _get_order_items(self, order_id):
+        items = self.server.dataset.items.get(order_id)
+        if items is None:
+            return 404, {"errors": [{"code": "NotFound", "message": f"Order {order_id} not found"}]}
+        return 200, {"payload": {"AmazonOrderId": order_id, "OrderItems": items}}
+
+    def _get_order_metrics(self, query):
+        mp_id = query["marketplaceIds"].split(",")[0]
+        start, end = (_parse(part) for part in query["interval"].split("--"))
+        if mp_id not in self.server.dataset.orders:
+            return 200, {"payload": []}
+        tz_name = query.get("granularityTimeZone") or "UTC"
+        return 200, {"payload": self.server.dataset.metrics(mp_id, start, end, tz_name)}
+
+
+    def _create_report(self, body):
+        if body.get("reportType") != ORDERS_REPORT_TYPE:
+            return 400, {"errors": [{"code": "InvalidInput", "message": f"Unsupported reportType {body.get('reportType')}"}]}
+        report_id = str(next(self.server.report_ids))
+        self.server.reports[report_id] = (
+            body["marketplaceIds"][0], _parse(body["dataStartTime"]), _parse(body["dataEndTime"]),
+        )
+        return 202, {"payload": {"reportId": report_id}}
+
+    def _get_report(self, report_id):
+        if report_id not in self.server.reports:
+            return 404, {"errors": [{"code": "NotFound", "message": f"Report {report_id} not found"}]}
+        # Reports are generated instantly; the client's polling loop sees DONE on the first call
+        return 200, {"payload": {"reportId": report_id, "reportType": ORDERS_REPORT_TYPE,
+                                 "processingStatus": "DONE", "reportDocumentId": f"doc-{report_id}"}}
+
+    def _get_report_document(self, document_id):
+        if document_id.split("-", 1)[-1] not in self.server.reports:
+            return 404, {"errors": [{"code": "NotFound", "message": f"Document {document_id} not found"}]}
+        host, port = self.server.server_address[:2]
+        return 200, {"payload": {"reportDocumentId": document_id, "compressionAlgorithm": "GZIP",
+                                 "url": f"http://{host}:{port}/_documents/{document_id}"}}
+
+    def _download(self, document_id):
+        report = self.server.reports.get(document_id.split("-", 1)[-1])
+        if report is None:
+            return self._error(404, "NotFound", document_id)
+        self.server.stats.record("downloadReportDocument")
+        data = gzip.compress(self.server.dataset.report_tsv(*report))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/tab-separated-values; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def make_server(dataset, port=0, latency_ms=0, jitter_ms=0, rate_scale=1.0,
+                throttle=True, throttle_probability=0.0, addr="127.0.0.1"):
+    """Build (but don't start) a stand-in server. Port 0 picks a free port."""
+    server = ThreadingHTTPServer((addr, port), _Handler)
+    server.daemon_threads = True
+    server.dataset = dataset
+    server.stats = Stats()
+    server.reports = {}
+    server.report_ids = itertools.count(1)
+    server.latency = latency_ms / 1000
+    server.jitter = jitter_ms / 1000
+    server.throttle_probability = throttle_probability
+    server.quotas = {op: Quota(op, rate_scale) for op in OPERATION_LIMITS} if throttle else {}
+    return server
+
+
+def serve_in_background(server):
+    threading.Thread(target=server.serve_forever, name="fake-sp-api", daemon=True).start()
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}"
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Local SP-API stand-in serving synthetic orders")
+    parser.add_argument("--port", type=int, default=8700)
+    parser.add_argument("--orders", type=int, default=1000, help="orders per marketplace")
+    parser.add_argument("--days", type=int, default=30, help="spread orders over the last N days")
+    parser.add_argument("--max-items", type=int, default=3, help="max items per order")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", type=float, default=10)
+    parser.add_argument("--rate-scale", type=float, default=100,
+                        help="multiply the documented per-operation rates (1 = real quotas)")
+    parser.add_argument("--no-throttle", action="store_true", help="never answer 429 from the quotas")
+    parser.add_argument("--throttle-probability", type=float, default=0.0,
+                        help="additionally answer 429 to this fraction of calls at random")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    dataset = Dataset(args.orders, args.days, args.max_items, args.seed)
+    logger.info(f"🧪 Generated {len(dataset.items)} orders in {time.perf_counter() - started:.1f}s")
+    server = make_server(dataset, args.port, args.latency_ms, args.jitter_ms, args.rate_scale,
+                         not args.no_throttle, args.throttle_probability, addr="0.0.0.0")
+    logger.info(f"🛰️ Fake SP-API on http://0.0.0.0:{args.port} — set SP_API_ENDPOINT and "
+                f"LWA_TOKEN_URL=http://localhost:{args.port}/auth/o2/token")
+    server.serve_forever()
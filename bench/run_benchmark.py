@@ -0,0 +1,259 @@
+import sys
+import os
+import argparse
+import json
+import logging
+import subprocess
+import tempfile
+import threading
+import time
+import types
+from datetime import datetime, timezone
+
+# Dynamically add the root project dir to sys.path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from bench.fake_sp_api import Dataset, make_server, serve_in_background
+
+logger = logging.getLogger("benchmark")
+
+RESULTS_PATH = os.path.join(ROOT, "bench", "results.jsonl")
+STAGES = ("orders", "items", "sales", "report")
+# "report" loads the same orders and items as orders + items, so it is
+# benchmarked on its own: --reset --stages report
+DEFAULT_STAGES = ("orders", "items", "sales")
+REGIONS = ("North America", "Europe", "Far East", "Australia")
+# Everything a benchmark run writes; truncated by --reset
+BENCH_TABLES = ("amazon_order_detail_item", "amazon_orders_detail", "sales_summary",
+                "daily_product_sales", "sync_state", "backfill_windows")
+
+
+class RoundTrips:
+    """Counts statements sent through the engine (COPY on the raw DBAPI cursor is not seen)."""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, *args, **kwargs):
+        with self._lock:
+            self.count += 1
+
+
+def _point_at_stand_in(endpoint, cache_dir):
+    # Read at import time by utils.sp_clients / utils.token_cache, so this
+    # must run before any sync module is imported.
+    os.environ["SP_API_ENDPOINT"] = endpoint
+    os.environ["LWA_TOKEN_URL"] = f"{endpoint}/auth/o2/token"
+    os.environ["LWA_TOKEN_CACHE"] = os.path.join(cache_dir, "lwa_tokens.json")
+    fake = types.ModuleType("client_config")
+    fake.CREDENTIALS = {
+        region: {"refresh_token": f"bench-{i}", "lwa_app_id": "bench-app", "lwa_client_secret": "bench-secret",
+                 "aws_access_key": "bench", "aws_secret_key": "bench", "role_arn": "arn:aws:iam::0:role/bench"}
+        for i, region in enumerate(REGIONS)
+    }
+    sys.modules["client_config"] = fake
+
+
+def _table_counts(engine):
+    from sqlalchemy import text
+    with engine.connect() as conn:
+        return {
+            "orders": conn.execute(text("SELECT count(*) FROM amazon_orders_detail")).scalar(),
+            "items": conn.execute(text("SELECT count(*) FROM amazon_order_detail_item")).scalar(),
+            "sales": conn.execute(text("SELECT count(*) FROM sales_summary")).scalar(),
+        }
+
+
+def _api_stats(server):
+    snap = server.stats.snapshot()
+    return sum(snap["calls"].values()), sum(snap["throttled"].values())
+
+
+def run_stage(name, fn, server, engine, trips):
+    before = _table_counts(engine)
+    calls_before, throttled_before = _api_stats(server)
+    trips_before = trips.count
+    started = time.perf_counter()
+    error = None
+    try:
+        fn()
+    except Exception as e:
+        error = str(e)
+        logger.error(f"❌ Stage {name} failed: {e}")
+    seconds = time.perf_counter() - started
+    after = _table_counts(engine)
+    calls, throttled = _api_stats(server)
+
+    result = {
+        "seconds": round(seconds, 3),
+        "api_calls": calls - calls_before,
+        "throttled": throttled - throttled_before,
+        "db_round_trips": trips.count - trips_before,
+        "orders": after["orders"] - before["orders"],
+        "items": after["items"] - before["items"],
+        "sales_rows": after["sales"] - before["sales"],
+    }
+    result["orders_per_sec"] = round(result["orders"] / seconds, 1) if seconds else 0.0
+    result["items_per_sec"] = round(result["items"] / seconds, 1) if seconds else 0.0
+    if error:
+        result["error"] = error
+    return result
+
+
+def _git_revision():
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+        dirty = bool(subprocess.check_output(["git", "status", "--porcelain", "--untracked-files=no"],
+                                             cwd=ROOT, text=True).strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, False
+
+
+def run(args):
+    started = time.perf_counter()
+    dataset = Dataset(args.orders, args.days, args.max_items, args.seed)
+    logger.info(f"🧪 Generated {len(dataset.items)} synthetic orders in {time.perf_counter() - started:.1f}s")
+    server = make_server(dataset, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                         rate_scale=args.rate_scale, throttle=not args.no_throttle,
+                         throttle_probability=args.throttle_probability)
+    endpoint = serve_in_background(server)
+    logger.info(f"🛰️ Fake SP-API listening on {endpoint}")
+
+    cache_dir = tempfile.mkdtemp(prefix="nimbussync_bench_")
+    _point_at_stand_in(endpoint, cache_dir)
+
+    from sqlalchemy import event, text
+    from db.connect import engine
+    from db.migrations import run_migrations
+    from sales_data import amazon_sync, order_items_sync, update_daily_sales, report_backfill
+
+    run_migrations(engine)
+    if args.reset:
+        with engine.begin() as conn:
+            conn.execute(text(f"TRUNCATE {', '.join(BENCH_TABLES)}"))
+        logger.info(f"🧹 Truncated {', '.join(BENCH_TABLES)}")
+
+    trips = RoundTrips()
+    event.listen(engine, "before_cursor_execute", trips)
+
+    def orders():
+        if args.serial:
+            amazon_sync.main(write_mode=args.write_mode)
+        else:
+            amazon_sync.main_concurrent(write_mode=args.write_mode, max_workers=args.max_workers)
+
+    def items():
+        if args.serial:
+            order_items_sync.main()
+        else:
+            order_items_sync.main_pipeline(workers=args.workers, batch_size=args.batch_size)
+
+    def report():
+        # Stand-in reports are ready on the first poll
+        report_backfill.POLL_SECONDS = 0
+        report_backfill.backfill(days=args.days, max_workers=args.max_workers)
+
+    stage_fns = {"orders": orders, "items": items, "sales": update_daily_sales.fetch_and_store,
+                 "report": report}
+    results = {}
+    for name in args.stages:
+        logger.info(f"⏱️ Stage {name}")
+        results[name] = run_stage(name, stage_fns[name], server, engine, trips)
+
+    server.shutdown()
+    commit, dirty = _git_revision()
+    record = {
+        "benchmark": "throughput",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": commit,
+        "dirty": dirty,
+        "label": args.label,
+        "params": {
+            "orders_per_marketplace": args.orders, "days": args.days, "max_items": args.max_items,
+            "seed": args.seed, "latency_ms": args.latency_ms, "jitter_ms": args.jitter_ms,
+            "rate_scale": args.rate_scale, "throttle": not args.no_throttle,
+            "throttle_probability": args.throttle_probability, "serial": args.serial,
+            "write_mode": args.write_mode, "max_workers": args.max_workers,
+            "workers": args.workers, "batch_size": args.batch_size, "reset": args.reset,
+        },
+        "stages": results,
+    }
+    return record
+
+
+def save_result(record, path=RESULTS_PATH):
+    with open(path, "a") as f:
+        f.write(json.dumps(record) + "\n")
+
+
+def load_results(path=RESULTS_PATH, benchmark="throughput"):
+    try:
+        with open(path) as f:
+            records = [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+    return [r for r in records if r.get("benchmark", "throughput") == benchmark]
+
+
+def print_summary(record):
+    print(f"\n--- ⏱️ Benchmark @ {record['commit'] or 'unknown'}{' (dirty)' if record['dirty'] else ''} ---")
+    print(f"{'stage':<8}{'seconds':>10}{'orders/s':>11}{'items/s':>10}{'api calls':>11}{'throttled':>11}{'db trips':>10}")
+    for name, st in record["stages"].items():
+        print(f"{name:<8}{st['seconds']:>10.2f}{st['orders_per_sec']:>11.1f}{st['items_per_sec']:>10.1f}"
+              f"{st['api_calls']:>11}{st['throttled']:>11}{st['db_round_trips']:>10}"
+              f"{'  ❌ ' + st['error'] if 'error' in st else ''}")
+
+
+def print_comparison(records, last=10):
+    print(f"\n--- 📊 Last {min(last, len(records))} benchmark runs ---")
+    print(f"{'commit':<12}{'label':<14}{'stage':<8}{'seconds':>10}{'orders/s':>11}{'items/s':>10}"
+          f"{'api calls':>11}{'db trips':>10}")
+    for record in records[-last:]:
+        commit = (record["commit"] or "?") + ("*" if record["dirty"] else "")
+        for name, st in record["stages"].items():
+            print(f"{commit:<12}{(record.get('label') or ''):<14}{name:<8}{st['seconds']:>10.2f}"
+                  f"{st['orders_per_sec']:>11.1f}{st['items_per_sec']:>10.1f}"
+                  f"{st['api_calls']:>11}{st['db_round_trips']:>10}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(
+        description="Run the sync stages against a local SP-API stand-in and the configured Postgres")
+    parser.add_argument("--orders", type=int, default=500, help="synthetic orders per marketplace")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--max-items", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--jitter-ms", type=float, default=5)
+    parser.add_argument("--rate-scale", type=float, default=100,
+                        help="multiply the documented SP-API rates (1 = real quotas)")
+    parser.add_argument("--no-throttle", action="store_true")
+    parser.add_argument("--throttle-probability", type=float, default=0.0)
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(DEFAULT_STAGES))
+    parser.add_argument("--serial", action="store_true",
+                        help="use the one-at-a-time code paths instead of the concurrent ones")
+    parser.add_argument("--write-mode", default="upsert")
+    parser.add_argument("--max-workers", type=int, default=4, help="order sync region lanes")
+    parser.add_argument("--workers", type=int, default=4, help="item pipeline fetch workers")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--reset", action="store_true",
+                        help="truncate the synced tables first — point DB_* at a scratch database")
+    parser.add_argument("--label", default=None, help="free-form tag stored with the result")
+    parser.add_argument("--no-save", action="store_true", help=f"don't append to {os.path.relpath(RESULTS_PATH, ROOT)}")
+    parser.add_argument("--compare", type=int, metavar="N", nargs="?", const=10,
+                        help="print the last N stored runs and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        print_comparison(load_results(), args.compare)
+        sys.exit(0)
+
+    record = run(args)
+    print_summary(record)
+    if not args.no_save:
+        save_result(record)
+        logger.info(f"💾 Appended result to {RESULTS_PATH}")
@@ -0,0 +1,129 @@
+import csv
+import io
+
+from sqlalchemy import func, literal_column, or_, select, text, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from utils.metrics import record_rows
+
+# Batches at or above this size go through COPY into a temp staging table
+# instead of one multi-row INSERT statement.
+COPY_THRESHOLD = 1000
+
+
+def dedupe_rows(rows, conflict_cols):
+    # A single INSERT ... ON CONFLICT DO UPDATE cannot touch the same key twice,
+    # so keep the last occurrence of each key within the batch.
+    unique = {}
+    for row in rows:
+        unique[tuple(row[c] for c in conflict_cols)] = row
+    return list(unique.values())
+
+
+def upsert_rows(session, model, rows, conflict_cols, update_cols=None):
+    """One multi-row INSERT ... ON CONFLICT. Returns (inserted, updated)."""
+    rows = dedupe_rows(rows, conflict_cols)
+    if not rows:
+        return 0, 0
+
+    table = model.__table__
+    stmt = pg_insert(table).values(rows)
+    if update_cols:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=conflict_cols,
+            set_={c: stmt.excluded[c] for c in update_cols},
+            # Skip no-op updates so reruns don't churn dead tuples
+            where=or_(*[table.c[c].is_distinct_from(stmt.excluded[c]) for c in update_cols]),
+        )
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=conflict_cols)
+
+    # Keys already present become updates (or no-ops); the rest are inserts
+    existing = session.execute(
+        select(func.count()).select_from(table).where(
+            tuple_(*[table.c[c] for c in conflict_cols]).in_(
+                [tuple(row[c] for c in conflict_cols) for row in rows]
+            )
+        )
+    ).scalar()
+    affected = len(session.execute(stmt.returning(literal_column("1"))).all())
+    return _count(table.name, len(rows) - existing, affected, len(rows))
+
+
+def copy_upsert_rows(session, model, rows, conflict_cols, update_cols=None):
+    """COPY into a temp staging table, then INSERT ... SELECT ... ON CONFLICT."""
+    if not rows:
+        return 0, 0
+
+    table = model.__table__
+    cols = list(rows[0].keys())
+    col_list = ", ".join(cols)
+    conflict_list = ", ".join(conflict_cols)
+    staging = f"_stage_{table.name}"
+
+    session.execute(text(f"DROP TABLE IF EXISTS {staging}"))
+    session.execute(text(
+        f"CREATE TEMP TABLE {staging} ON COMMIT DROP AS "
+        f"SELECT {col_list} FROM {table.name} WITH NO DATA"
+    ))
+    # Batch position, so duplicates resolve to the last occurrence like dedupe_rows
+    session.execute(text(f"ALTER TABLE {staging} ADD COLUMN _ord bigserial"))
+
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in rows:
+        writer.writerow([_copy_value(row.get(c)) for c in cols])
+    buf.seek(0)
+
+    raw = session.connection().connection
+    with raw.cursor() as cur:
+        cur.copy_expert(f"COPY {staging} ({col_list}) FROM STDIN WITH (FORMAT csv)", buf)
+
+    if update_cols:
+        set_clause = ", ".join(f"{c} = EXCLUDED.{c}" for c in update_cols)
+        changed = " OR ".join(f"{table.name}.{c} IS DISTINCT FROM EXCLUDED.{c}" for c in update_cols)
+        conflict = f"DO UPDATE SET {set_clause} WHERE {changed}"
+    else:
+        conflict = "DO NOTHING"
+
+    key_match = " AND ".join(f"t.{c} = s.{c}" for c in conflict_cols)
+    existing = session.execute(text(
+        f"SELECT count(*) FROM (SELECT DISTINCT {conflict_list} FROM {staging}) s "
+        f"WHERE EXISTS (SELECT 1 FROM {table.name} t WHERE {key_match})"
+    )).scalar()
+    unique_rows = session.execute(text(
+        f"SELECT count(*) FROM (SELECT DISTINCT {conflict_list} FROM {staging}) s"
+    )).scalar()
+
+    result = session.execute(text(
+        f"INSERT INTO {table.name} ({col_list}) "
+        f"SELECT DISTINCT ON ({conflict_list}) {col_list} FROM {staging} "
+        f"ORDER BY {conflict_list}, _ord DESC "
+        f"ON CONFLICT ({conflict_list}) {conflict} "
+        f"RETURNING 1"
+    ))
+    return _count(table.name, unique_rows - existing, len(result.all()), len(rows))
+
+
+def upsert(session, model, rows, conflict_cols, update_cols=None):
+    if len(rows) >= COPY_THRESHOLD:
+        return copy_upsert_rows(session, model, rows, conflict_cols, update_cols)
+    return upsert_rows(session, model, rows, conflict_cols, update_cols)
+
+
+def _count(table_name, new_keys, affected, attempted):
+    # Counted from the keys present beforehand, not xmax: partitioned tables
+    # (orders, items) can't return system columns. A concurrent writer can
+    # skew the split, never the total.
+    inserted = min(new_keys, affected)
+    updated = affected - inserted
+    record_rows(table_name, inserted=inserted, updated=updated, skipped=attempted - affected)
+    return inserted, updated
+
+
+def _copy_value(value):
+    if value is None:
+        return None
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
@@ -1,5 +1,7 @@
+from contextlib import contextmanager
+
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, scoped_session
 import os
 
 DB_USER = os.getenv("POSTGRES_USER", "postgres")
@@ -10,5 +12,63 @@ DB_PORT = os.getenv("DB_PORT", "5432")
 
 DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
-engine = create_engine(DATABASE_URL)
+# Pool sizing: one connection per concurrent writer/feeder plus headroom
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Recycle before typical load balancer / pgbouncer idle cutoffs
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# Server-side limits in milliseconds; 0 disables
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "300000"))
+DB_IDLE_IN_TRANSACTION_TIMEOUT_MS = int(os.getenv("DB_IDLE_IN_TRANSACTION_TIMEOUT_MS", "600000"))
+
+
+def make_engine(url=DATABASE_URL, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW,
+                pool_timeout=DB_POOL_TIMEOUT, pool_recycle=DB_POOL_RECYCLE,
+                statement_timeout_ms=DB_STATEMENT_TIMEOUT_MS,
+                idle_in_transaction_timeout_ms=DB_IDLE_IN_TRANSACTION_TIMEOUT_MS, **kwargs):
+    """Engine with a bounded pool, liveness checks and server-side timeouts."""
+    options = []
+    if statement_timeout_ms:
+        options.append(f"-c statement_timeout={statement_timeout_ms}")
+    if idle_in_transaction_timeout_ms:
+        options.append(f"-c idle_in_transaction_session_timeout={idle_in_transaction_timeout_ms}")
+    connect_args = kwargs.pop("connect_args", {})
+    if options:
+        connect_args["options"] = " ".join(options)
+
+    return create_engine(
+        url,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        pool_recycle=pool_recycle,
+        pool_pre_ping=True,
+        # Batch executemany (bulk_save_objects, multi-row updates) into
+        # multi-VALUES statements instead of one round trip per row
+        executemany_mode="values_plus_batch",
+        connect_args=connect_args,
+        **kwargs,
+    )
+
+
+engine = make_engine()
 SessionLocal = sessionmaker(bind=engine)
+
+# One session per thread, for code that can't easily pass a session around.
+# Call ScopedSession.remove() when the thread's unit of work is done.
+ScopedSession = scoped_session(SessionLocal)
+
+
+@contextmanager
+def session_scope(factory=SessionLocal):
+    """Session for one unit of work: commit on success, roll back on error, always close."""
+    session = factory()
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
@@ -0,0 +1,124 @@
+import logging
+import os
+import socket
+import threading
+import uuid
+
+from sqlalchemy import text
+
+from db.connect import session_scope
+
+logger = logging.getLogger(__name__)
+
+# A claimed job belongs to its worker until the lease runs out. Workers renew
+# leases from a heartbeat thread while they work; jobs of a worker that
+# crashed simply become claimable again once their lease expires.
+DEFAULT_LEASE_SECONDS = 300
+
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+def claim(db, kind, owner, limit, regions=None, lease_seconds=DEFAULT_LEASE_SECONDS):
+    """Lease up to `limit` available jobs to `owner`, skipping rows other workers hold locked.
+
+    Commits, so the lease is visible to other workers immediately.
+    """
+    region_filter = "AND region = ANY(:regions)" if regions else ""
+    rows = db.execute(text(f"""
+        WITH next AS (
+            SELECT id FROM jobs
+            WHERE kind = :kind {region_filter}
+              AND available_at <= now()
+              AND (lease_expires_at IS NULL OR lease_expires_at < now())
+            ORDER BY available_at, id
+            LIMIT :limit
+            FOR UPDATE SKIP LOCKED
+        )
+        UPDATE jobs j
+        SET lease_owner = :owner,
+            lease_expires_at = now() + make_interval(secs => :lease),
+            attempts = j.attempts + 1
+        FROM next
+        WHERE j.id = next.id
+        RETURNING j.id, j.job_key, j.key_date, j.region, j.marketplace_id, j.attempts
+    """), {"kind": kind, "owner": owner, "limit": limit, "lease": lease_seconds,
+           "regions": list(regions or [])}).all()
+    db.commit()
+    return rows
+
+
+def heartbeat(db, owner, job_ids, lease_seconds=DEFAULT_LEASE_SECONDS):
+    """Extend the leases `owner` still holds. Returns how many it still holds."""
+    if not job_ids:
+        return 0
+    held = db.execute(text("""
+        UPDATE jobs SET lease_expires_at = now() + make_interval(secs => :lease)
+        WHERE id = ANY(:ids) AND lease_owner = :owner
+    """), {"ids": list(job_ids), "owner": owner, "lease": lease_seconds}).rowcount
+    db.commit()
+    return held
+
+
+def complete(db, owner, job_ids):
+    """Delete finished jobs in the caller's transaction, so they go with the work they did."""
+    if not job_ids:
+        return 0
+    return db.execute(text("DELETE FROM jobs WHERE id = ANY(:ids) AND lease_owner = :owner"),
+                      {"ids": list(job_ids), "owner": owner}).rowcount
+
+
+def release(db, owner, job_ids, delay_seconds=0):
+    """Hand jobs back, claimable again after `delay_seconds`, in the caller's transaction."""
+    if not job_ids:
+        return 0
+    return db.execute(text("""
+        UPDATE jobs
+        SET lease_owner = NULL, lease_expires_at = NULL,
+            available_at = now() + make_interval(secs => :delay)
+        WHERE id = ANY(:ids) AND lease_owner = :owner
+    """), {"ids": list(job_ids), "owner": owner, "delay": delay_seconds}).rowcount
+
+
+class Heartbeat:
+    """Background lease renewal for the jobs a worker currently holds."""
+
+    def __init__(self, owner, lease_seconds=DEFAULT_LEASE_SECONDS):
+        self.owner = owner
+        self.lease_seconds = lease_seconds
+        self._ids = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="heartbeat", daemon=True)
+
+    def hold(self, job_ids):
+        with self._lock:
+            self._ids.update(job_ids)
+
+    def drop(self, job_ids):
+        with self._lock:
+            self._ids.difference_update(job_ids)
+
+    def _run(self):
+        # Renew at a third of the lease, so one missed beat doesn't lose it
+        while not self._stop.wait(self.lease_seconds / 3):
+            with self._lock:
+                ids = list(self._ids)
+            if not ids:
+                continue
+            try:
+                with session_scope() as db:
+                    held = heartbeat(db, self.owner, ids, self.lease_seconds)
+                if held < len(ids):
+                    logger.warning(f"💔 Lost {len(ids) - held} of {len(ids)} leases (expired and reclaimed)")
+            except Exception as e:
+                logger.error(f"❌ Heartbeat failed: {e}")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
@@ -0,0 +1,367 @@
+import logging
+from datetime import datetime, timezone
+
+from sqlalchemy import text
+
+from db import partitions
+from db.models import Base
+
+logger = logging.getLogger(__name__)
+
+# Rows copied per transaction when a column is rewritten online
+BACKFILL_BATCH_SIZE = 50000
+
+# ──────────────────────────────
+# Schema changes for existing deployments
+# ──────────────────────────────
+# create_all() only creates missing tables; it never alters existing ones.
+# Each migration below is idempotent so it is also safe on a fresh database
+# where create_all() already produced the final shape.
+
+
+def _m001_items_fetch_state(conn):
+    conn.execute(text(
+        "ALTER TABLE amazon_orders_detail "
+        "ADD COLUMN IF NOT EXISTS items_status VARCHAR NOT NULL DEFAULT 'pending', "
+        "ADD COLUMN IF NOT EXISTS items_attempts INTEGER NOT NULL DEFAULT 0, "
+        "ADD COLUMN IF NOT EXISTS items_fetched_at TIMESTAMP"
+    ))
+    # Orders that already have items were fetched before this column existed
+    conn.execute(text(
+        "UPDATE amazon_orders_detail o "
+        "SET items_status = 'fetched', items_attempts = 1 "
+        "WHERE o.items_status = 'pending' AND EXISTS ("
+        "  SELECT 1 FROM amazon_order_detail_item i WHERE i.order_id = o.amazon_order_id"
+        ")"
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_orders_detail_items_pending "
+        "ON amazon_orders_detail (id) WHERE items_status = 'pending'"
+    ))
+
+
+def _m002_sales_summary_unique_key(conn):
+    # Keep the newest row of any (date, country) duplicates before adding the key
+    conn.execute(text(
+        "DELETE FROM sales_summary s USING sales_summary d "
+        "WHERE s.date = d.date AND s.country = d.country AND s.id < d.id"
+    ))
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_sales_summary_date_country "
+        "ON sales_summary (date, country)"
+    ))
+
+
+def _column_type(conn, table, column):
+    return conn.execute(text(
+        "SELECT data_type FROM information_schema.columns "
+        "WHERE table_schema = current_schema() AND table_name = :t AND column_name = :c"
+    ), {"t": table, "c": column}).scalar()
+
+
+def _retype_column(engine, table, column, target, sql_type, using, not_null=False, after_swap=()):
+    """Rewrite a column to a new type without holding a lock for the whole copy.
+
+    Values are copied into a shadow column in id-range batches, each in its own
+    transaction. A final short transaction locks the table against writes,
+    catches up any rows that changed in the meantime, and swaps the columns.
+    """
+    with engine.begin() as conn:
+        if _column_type(conn, table, column) in (None, target):
+            return
+        shadow = f"{column}__new"
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {shadow} {sql_type}"))
+        lo, hi = conn.execute(text(f"SELECT min(id), max(id) FROM {table}")).one()
+
+    converted = using.format(col=column)
+    if lo is not None:
+        for start in range(lo - 1, hi, BACKFILL_BATCH_SIZE):
+            with engine.begin() as conn:
+                conn.execute(text(
+                    f"UPDATE {table} SET {shadow} = {converted} "
+                    f"WHERE id > :lo AND id <= :hi"
+                ), {"lo": start, "hi": start + BACKFILL_BATCH_SIZE})
+        logger.info(f"  ↳ {table}.{column}: copied ids {lo}..{hi}")
+
+    with engine.begin() as conn:
+        conn.execute(text(f"LOCK TABLE {table} IN SHARE ROW EXCLUSIVE MODE"))
+        conn.execute(text(
+            f"UPDATE {table} SET {shadow} = {converted} "
+            f"WHERE {shadow} IS DISTINCT FROM {converted}"
+        ))
+        conn.execute(text(f"ALTER TABLE {table} DROP COLUMN {column}"))
+        conn.execute(text(f"ALTER TABLE {table} RENAME COLUMN {shadow} TO {column}"))
+        if not_null:
+            conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN {column} SET NOT NULL"))
+        for statement in after_swap:
+            conn.execute(text(statement))
+
+
+# Text that isn't a plain decimal becomes NULL rather than failing the cast
+_TEXT_TO_MONEY = "CASE WHEN btrim({{col}}) ~ '^-?[0-9]+(\\.[0-9]+)?$' THEN btrim({{col}})::{type} END"
+_NAIVE_UTC_TO_TZ = "{col} AT TIME ZONE 'UTC'"
+
+
+def _m003_typed_money_and_timestamps(engine):
+    _retype_column(engine, "sales_summary", "total_sales", "numeric", "NUMERIC(14, 2)",
+                   _TEXT_TO_MONEY.format(type="NUMERIC(14, 2)"))
+    _retype_column(engine, "sales_summary", "average_unit_price", "numeric", "NUMERIC(14, 4)",
+                   _TEXT_TO_MONEY.format(type="NUMERIC(14, 4)"))
+    # Dropping the old date column drops the unique key with it; rebuild it in the swap
+    _retype_column(engine, "sales_summary", "date", "date", "DATE", "{col}::date", not_null=True,
+                   after_swap=["CREATE UNIQUE INDEX IF NOT EXISTS uq_sales_summary_date_country "
+                               "ON sales_summary (date, country)"])
+
+    _retype_column(engine, "amazon_orders_detail", "order_total", "numeric", "NUMERIC(14, 2)",
+                   _TEXT_TO_MONEY.format(type="NUMERIC(14, 2)"))
+    _retype_column(engine, "amazon_orders_detail", "purchase_date", "timestamp with time zone",
+                   "TIMESTAMPTZ", _NAIVE_UTC_TO_TZ)
+    _retype_column(engine, "amazon_orders_detail", "items_fetched_at", "timestamp with time zone",
+                   "TIMESTAMPTZ", _NAIVE_UTC_TO_TZ)
+
+    for column, sql_type in (("item_price", "NUMERIC(14, 2)"), ("shipping_price", "NUMERIC(14, 2)"),
+                             ("unit_price", "NUMERIC(14, 4)")):
+        _retype_column(engine, "amazon_order_detail_item", column, "numeric", sql_type,
+                       f"{{col}}::{sql_type}")
+
+
+def _m004_order_indexes(engine):
+    # CONCURRENTLY can't run inside a transaction block
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        # Nor on a partitioned table, which create_all() already built with these indexes
+        if partitions.is_partitioned(conn, "amazon_orders_detail"):
+            return
+        for statement in (
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_orders_detail_purchase_date "
+            "ON amazon_orders_detail (purchase_date)",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_orders_detail_marketplace_purchase "
+            "ON amazon_orders_detail (marketplace_id, purchase_date)",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_orders_detail_order_status "
+            "ON amazon_orders_detail (order_status)",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_amazon_order_detail_item_order_id "
+            "ON amazon_order_detail_item (order_id)",
+        ):
+            conn.execute(text(statement))
+
+
+def _m005_item_keys(engine):
+    with engine.begin() as conn:
+        conn.execute(text(
+            "ALTER TABLE amazon_order_detail_item "
+            "ADD COLUMN IF NOT EXISTS order_item_id VARCHAR, "
+            "ADD COLUMN IF NOT EXISTS content_hash VARCHAR(16)"
+        ))
+    # Existing rows keep a NULL order_item_id, which never conflicts; they are
+    # replaced by keyed rows the next time their order is fetched.
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if partitions.is_partitioned(conn, "amazon_order_detail_item"):
+            return
+        conn.execute(text(
+            "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_order_detail_item_key "
+            "ON amazon_order_detail_item (order_id, order_item_id)"
+        ))
+
+
+# Converting orders and items to monthly range partitions (db/partitions.py).
+# Rows are copied into new partitioned tables in id batches while the sync
+# keeps running; a final transaction blocks writes, applies what changed
+# since, and swaps the tables. The originals are kept, renamed with this
+# suffix, until someone drops them.
+PRE_PARTITIONING = "_pre_partitioning"
+_NEW = "__new"
+
+_ORDERS = "amazon_orders_detail"
+_ITEMS = "amazon_order_detail_item"
+
+# Keys and indexes of the partitioned tables, named {name}{suffix} until the swap
+_PARTITIONED_KEYS = {
+    _ORDERS: [
+        ("amazon_orders_detail_pkey", "ALTER TABLE {t} ADD CONSTRAINT {n} PRIMARY KEY (id, purchase_date)"),
+        ("uq_orders_detail_order_key", "ALTER TABLE {t} ADD CONSTRAINT {n} UNIQUE (amazon_order_id, purchase_date)"),
+        ("ix_orders_detail_items_pending", "CREATE INDEX {n} ON {t} (id) WHERE items_status = 'pending'"),
+        ("ix_orders_detail_purchase_date", "CREATE INDEX {n} ON {t} (purchase_date)"),
+        ("ix_orders_detail_marketplace_purchase", "CREATE INDEX {n} ON {t} (marketplace_id, purchase_date)"),
+        ("ix_orders_detail_order_status", "CREATE INDEX {n} ON {t} (order_status)"),
+    ],
+    _ITEMS: [
+        ("amazon_order_detail_item_pkey", "ALTER TABLE {t} ADD CONSTRAINT {n} PRIMARY KEY (id, purchase_date)"),
+        ("uq_order_detail_item_key",
+         "ALTER TABLE {t} ADD CONSTRAINT {n} UNIQUE (order_id, order_item_id, purchase_date)"),
+        ("ix_amazon_order_detail_item_order_id", "CREATE INDEX {n} ON {t} (order_id)"),
+    ],
+}
+
+
+def _columns(conn, table):
+    return list(conn.execute(text(
+        "SELECT column_name FROM information_schema.columns "
+        "WHERE table_schema = current_schema() AND table_name = :t ORDER BY ordinal_position"
+    ), {"t": table}).scalars())
+
+
+def _create_partitioned_tables(conn):
+    orders, items = _ORDERS + _NEW, _ITEMS + _NEW
+    conn.execute(text(f"DROP TABLE IF EXISTS {items}, {orders}"))  # left by an interrupted attempt
+    # LIKE keeps the columns and their defaults, including the id sequences
+    conn.execute(text(
+        f"CREATE TABLE {orders} (LIKE {_ORDERS} INCLUDING DEFAULTS) PARTITION BY RANGE (purchase_date)"
+    ))
+    conn.execute(text(f"ALTER TABLE {orders} ALTER COLUMN purchase_date SET NOT NULL"))
+    conn.execute(text(
+        f"CREATE TABLE {items} (LIKE {_ITEMS} INCLUDING DEFAULTS, purchase_date TIMESTAMPTZ NOT NULL) "
+        f"PARTITION BY RANGE (purchase_date)"
+    ))
+    for table in (_ORDERS, _ITEMS):
+        for name, ddl in _PARTITIONED_KEYS[table]:
+            conn.execute(text(ddl.format(t=table + _NEW, n=name + _NEW)))
+    conn.execute(text(
+        f"ALTER TABLE {items} ADD CONSTRAINT fk_order_detail_item_order "
+        f"FOREIGN KEY (order_id, purchase_date) REFERENCES {orders} (amazon_order_id, purchase_date)"
+    ))
+
+
+def _copy_in_batches(engine, source, sql):
+    with engine.begin() as conn:
+        lo, hi = conn.execute(text(f"SELECT min(id), max(id) FROM {source}")).one()
+    if lo is None:
+        return
+    for start in range(lo - 1, hi, BACKFILL_BATCH_SIZE):
+        with engine.begin() as conn:
+            conn.execute(text(sql), {"lo": start, "hi": start + BACKFILL_BATCH_SIZE})
+    logger.info(f"  ↳ {source}: copied ids {lo}..{hi}")
+
+
+def _ensure_new_partitions(conn):
+    # Every month that has orders, through the usual months ahead
+    first = conn.execute(text(f"SELECT min(purchase_date) FROM {_ORDERS}")).scalar()
+    this_month = partitions.month_start(datetime.now(timezone.utc))
+    partitions.ensure_range(conn, min(partitions.month_start(first), this_month) if first else this_month,
+                            partitions.add_months(this_month, partitions.AHEAD_MONTHS), parent_suffix=_NEW)
+
+
+def _m006_partition_orders(engine):
+    with engine.begin() as conn:
+        if partitions.is_partitioned(conn, _ORDERS):
+            return
+        order_cols = _columns(conn, _ORDERS)
+        item_cols = _columns(conn, _ITEMS)
+        _create_partitioned_tables(conn)
+        _ensure_new_partitions(conn)
+
+    orders, items = _ORDERS + _NEW, _ITEMS + _NEW
+    o_cols = ", ".join(order_cols)
+    i_cols = ", ".join(item_cols)
+    i_select = ", ".join(f"i.{c}" for c in item_cols)
+    # Orders without a purchase date have no partition; they stay behind in the old table
+    insert_orders = (f"INSERT INTO {orders} ({o_cols}) SELECT {o_cols} FROM {_ORDERS} o "
+                     f"WHERE o.purchase_date IS NOT NULL")
+    insert_items = (f"INSERT INTO {items} ({i_cols}, purchase_date) SELECT {i_select}, o.purchase_date "
+                    f"FROM {_ITEMS} i JOIN {orders} o ON o.amazon_order_id = i.order_id")
+    _copy_in_batches(engine, _ORDERS, f"{insert_orders} AND o.id > :lo AND o.id <= :hi")
+    _copy_in_batches(engine, _ITEMS, f"{insert_items} WHERE i.id > :lo AND i.id <= :hi")
+
+    def same(cols, a, b):
+        return f"({', '.join(f'{a}.{c}' for c in cols)}) IS NOT DISTINCT FROM ({', '.join(f'{b}.{c}' for c in cols)})"
+
+    updatable = [c for c in order_cols if c not in ("id", "amazon_order_id", "purchase_date")]
+    with engine.begin() as conn:
+        conn.execute(text(f"LOCK TABLE {_ORDERS}, {_ITEMS} IN SHARE ROW EXCLUSIVE MODE"))
+        _ensure_new_partitions(conn)  # a backfill may have reached further back meanwhile
+        # Catch up on what the sync wrote during the copy: item lines go first
+        # so no order is removed while lines still point at it
+        conn.execute(text(
+            f"DELETE FROM {items} n WHERE NOT EXISTS "
+            f"(SELECT 1 FROM {_ITEMS} i WHERE i.id = n.id AND {same(item_cols, 'i', 'n')})"
+        ))
+        conn.execute(text(
+            f"UPDATE {orders} n SET {', '.join(f'{c} = o.{c}' for c in updatable)} FROM {_ORDERS} o "
+            f"WHERE o.id = n.id AND NOT {same(order_cols, 'o', 'n')}"
+        ))
+        conn.execute(text(f"DELETE FROM {orders} n WHERE NOT EXISTS (SELECT 1 FROM {_ORDERS} o WHERE o.id = n.id)"))
+        conn.execute(text(
+            f"{insert_orders} AND NOT EXISTS (SELECT 1 FROM {orders} n WHERE n.id = o.id)"
+        ))
+        conn.execute(text(
+            f"{insert_items} WHERE NOT EXISTS (SELECT 1 FROM {items} n WHERE n.id = i.id)"
+        ))
+        left_behind = conn.execute(text(
+            f"SELECT (SELECT count(*) FROM {_ORDERS}) - (SELECT count(*) FROM {orders}), "
+            f"       (SELECT count(*) FROM {_ITEMS}) - (SELECT count(*) FROM {items})"
+        )).one()
+
+        sequences = {t: conn.execute(text("SELECT pg_get_serial_sequence(:t, 'id')"), {"t": t}).scalar()
+                     for t in (_ORDERS, _ITEMS)}
+        for table in (_ITEMS, _ORDERS):
+            for index in conn.execute(text("SELECT indexname FROM pg_indexes "
+                                           "WHERE schemaname = current_schema() AND tablename = :t"),
+                                      {"t": table}).scalars().all():
+                conn.execute(text(f"ALTER INDEX {index} RENAME TO {(index + PRE_PARTITIONING)[:63]}"))
+            conn.execute(text(f"ALTER TABLE {table} RENAME TO {table}{PRE_PARTITIONING}"))
+        for table in (_ORDERS, _ITEMS):
+            conn.execute(text(f"ALTER TABLE {table}{_NEW} RENAME TO {table}"))
+            for name, _ in _PARTITIONED_KEYS[table]:
+                conn.execute(text(f"ALTER INDEX {name}{_NEW} RENAME TO {name}"))
+            if sequences[table]:
+                # So dropping the old table later doesn't take the sequence with it
+                conn.execute(text(f"ALTER SEQUENCE {sequences[table]} OWNED BY {table}.id"))
+
+    orders_left, items_left = left_behind
+    if orders_left or items_left:
+        logger.warning(f"  ↳ {orders_left} orders without a purchase date and {items_left} of their items "
+                       f"were not moved; they remain in {_ORDERS}{PRE_PARTITIONING}")
+    logger.info(f"  ↳ Old tables kept as {_ORDERS}{PRE_PARTITIONING} and {_ITEMS}{PRE_PARTITIONING}; "
+                f"drop them once the partitioned tables are verified")
+
+
+def _m007_job_key_date(conn):
+    # Lets a worker look its claimed orders up by partition instead of by id alone
+    conn.execute(text("ALTER TABLE jobs ADD COLUMN IF NOT EXISTS key_date TIMESTAMPTZ"))
+    conn.execute(text(
+        "UPDATE jobs j SET key_date = o.purchase_date FROM amazon_orders_detail o "
+        "WHERE j.kind = 'order_items' AND j.key_date IS NULL AND o.amazon_order_id = j.job_key"
+    ))
+
+
+# (version, description, function, transactional). Non-transactional
+# migrations receive the engine and manage their own transactions.
+MIGRATIONS = [
+    (1, "items fetch state on order headers", _m001_items_fetch_state, True),
+    (2, "unique (date, country) on sales_summary", _m002_sales_summary_unique_key, True),
+    (3, "numeric money and timezone-aware timestamps", _m003_typed_money_and_timestamps, False),
+    (4, "indexes on order date, marketplace, status and item FK", _m004_order_indexes, False),
+    (5, "order_item_id key and content hash on items", _m005_item_keys, False),
+    (6, "monthly range partitions for orders and items", _m006_partition_orders, False),
+    (7, "purchase date on queued jobs", _m007_job_key_date, True),
+]
+
+
+def run_migrations(engine):
+    """Create missing tables, then apply every pending versioned migration."""
+    with engine.begin() as conn:
+        Base.metadata.create_all(bind=conn)
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "  version INTEGER PRIMARY KEY,"
+            "  description VARCHAR,"
+            "  applied_at TIMESTAMP NOT NULL DEFAULT now()"
+            ")"
+        ))
+        applied = {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+    for version, description, migrate, transactional in MIGRATIONS:
+        if version in applied:
+            continue
+        logger.info(f"🛠️ Applying migration {version}: {description}")
+        if transactional:
+            with engine.begin() as conn:
+                migrate(conn)
+        else:
+            migrate(engine)
+        with engine.begin() as conn:
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, description) VALUES (:v, :d)"),
+                {"v": version, "d": description},
+            )
+
+    with engine.begin() as conn:
+        partitions.ensure_ahead(conn)
@@ -1,9 +1,21 @@
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Float
+from sqlalchemy import (
+    Column, BigInteger, Integer, String, Date, DateTime, ForeignKeyConstraint, Numeric, Index, Text, UniqueConstraint,
+    text, func
+)
 from sqlalchemy.orm import relationship
 
 Base = declarative_base()
 
+# Item-fetch state tracked on each order header
+ITEMS_PENDING = "pending"
+ITEMS_FETCHED = "fetched"
+ITEMS_DEAD = "dead"  # gave up; see dead_letters, requeue explicitly
+
+# Money columns: exact decimals instead of text/float
+Money = Numeric(14, 2)
+UnitMoney = Numeric(14, 4)
+
 # ──────────────────────────────
 # 1. Top-level Amazon Orders
 # ──────────────────────────────
@@ -22,30 +34,53 @@ class SalesSummary(Base):
     __tablename__ = "sales_summary"
 
     id = Column(Integer, primary_key=True, index=True)
-    date = Column(DateTime, nullable=False)
+    date = Column(Date, nullable=False)
     country = Column(String, nullable=False)
-    average_unit_price = Column(String)
+    average_unit_price = Column(UnitMoney)
     order_item_count = Column(Integer)
     unit_count = Column(Integer)
-    total_sales = Column(String)
+    total_sales = Column(Money)
     currency = Column(String)
 
+    __table_args__ = (
+        UniqueConstraint("date", "country", name="uq_sales_summary_date_country"),
+    )
+
 # ──────────────────────────────
 # 3. Order Detail Header Table
 # ──────────────────────────────
 class AmazonOrderDetail(Base):
     __tablename__ = "amazon_orders_detail"
 
-    id = Column(Integer, primary_key=True, index=True)
-    amazon_order_id = Column(String, unique=True, nullable=False)  # ✅ UNIQUE for FK
-    purchase_date = Column(DateTime)
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    amazon_order_id = Column(String, nullable=False)
+    # Partition key (monthly ranges, see db/partitions.py), so it is part of
+    # every unique key. Amazon never changes an order's purchase date.
+    purchase_date = Column(DateTime(timezone=True), primary_key=True)
     order_status = Column(String)
     buyer_name = Column(String)
     buyer_email = Column(String)
     marketplace_id = Column(String)
-    order_total = Column(String)
+    order_total = Column(Money)
     currency = Column(String)
 
+    # Work tracking for order_items_sync (replaces the NOT IN anti-join)
+    items_status = Column(String, nullable=False, default=ITEMS_PENDING, server_default=ITEMS_PENDING)
+    items_attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    items_fetched_at = Column(DateTime(timezone=True))
+
+    __table_args__ = (
+        UniqueConstraint("amazon_order_id", "purchase_date", name="uq_orders_detail_order_key"),
+        Index(
+            "ix_orders_detail_items_pending", "id",
+            postgresql_where=text(f"items_status = '{ITEMS_PENDING}'"),
+        ),
+        Index("ix_orders_detail_purchase_date", "purchase_date"),
+        Index("ix_orders_detail_marketplace_purchase", "marketplace_id", "purchase_date"),
+        Index("ix_orders_detail_order_status", "order_status"),
+        {"postgresql_partition_by": "RANGE (purchase_date)"},
+    )
+
     items = relationship(
         "AmazonOrderDetailItem",
         back_populates="order",
@@ -58,18 +93,115 @@ class AmazonOrderDetail(Base):
 class AmazonOrderDetailItem(Base):
     __tablename__ = "amazon_order_detail_item"
 
-    id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(String, ForeignKey("amazon_orders_detail.amazon_order_id"), nullable=False)
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    order_id = Column(String, nullable=False, index=True)
+    # The order's purchase date: lines are partitioned alongside their order
+    purchase_date = Column(DateTime(timezone=True), primary_key=True)
 
     asin = Column(String)
     seller_sku = Column(String)
     title = Column(String)
     quantity_ordered = Column(Integer)
-    item_price = Column(Float)
+    item_price = Column(Money)
     item_currency = Column(String)
-    shipping_price = Column(Float)
+    shipping_price = Column(Money)
     shipping_currency = Column(String)
     country = Column(String)
-    unit_price = Column(Float)
+    unit_price = Column(UnitMoney)
+
+    # OrderItemId from getOrderItems; NULL on rows loaded from order reports
+    order_item_id = Column(String)
+    # Digest of the fields above, compared on re-fetch to skip unchanged lines
+    content_hash = Column(String(16))
+
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ["order_id", "purchase_date"],
+            ["amazon_orders_detail.amazon_order_id", "amazon_orders_detail.purchase_date"],
+            name="fk_order_detail_item_order",
+        ),
+        UniqueConstraint("order_id", "order_item_id", "purchase_date", name="uq_order_detail_item_key"),
+        {"postgresql_partition_by": "RANGE (purchase_date)"},
+    )
 
     order = relationship("AmazonOrderDetail", back_populates="items")
+
+# ──────────────────────────────
+# 5. Per-marketplace Sync State
+# ──────────────────────────────
+class SyncState(Base):
+    __tablename__ = "sync_state"
+
+    marketplace_id = Column(String, primary_key=True)
+    stream = Column(String, primary_key=True)          # e.g. "orders"
+    high_water_mark = Column(DateTime(timezone=True))  # newest timestamp fully synced
+    window_start = Column(DateTime(timezone=True))     # start of the in-flight pagination
+    next_token = Column(Text)                          # NextToken to resume from, if any
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+# ──────────────────────────────
+# 6. Completed Backfill Windows
+# ──────────────────────────────
+class BackfillWindow(Base):
+    __tablename__ = "backfill_windows"
+
+    stream = Column(String, primary_key=True)          # e.g. "sales_summary"
+    marketplace_id = Column(String, primary_key=True)
+    window_start = Column(DateTime, primary_key=True)
+    window_end = Column(DateTime, nullable=False)
+    row_count = Column(Integer)
+    completed_at = Column(DateTime(timezone=True), server_default=func.now())
+
+# ──────────────────────────────
+# 7. Daily Product Sales (local aggregate)
+# ──────────────────────────────
+class DailyProductSales(Base):
+    __tablename__ = "daily_product_sales"
+
+    sales_date = Column(Date, primary_key=True)          # marketplace-local calendar day
+    marketplace_id = Column(String, primary_key=True)
+    asin = Column(String, primary_key=True)              # '' when Amazon sent none
+    seller_sku = Column(String, primary_key=True)
+    units = Column(Integer, nullable=False)
+    item_count = Column(Integer, nullable=False)
+    revenue = Column(Money)
+    currency = Column(String)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+# ──────────────────────────────
+# 8. Dead Letters (work that exhausted its retries)
+# ──────────────────────────────
+class DeadLetter(Base):
+    __tablename__ = "dead_letters"
+
+    stream = Column(String, primary_key=True)          # e.g. "order_items"
+    item_key = Column(String, primary_key=True)        # e.g. the amazon_order_id
+    marketplace_id = Column(String)
+    error_kind = Column(String)                        # throttled / transient / permanent
+    last_error = Column(Text)
+    attempts = Column(Integer, nullable=False, default=0)
+    first_failed_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_failed_at = Column(DateTime(timezone=True), server_default=func.now())
+
+# ──────────────────────────────
+# 9. Job Queue (claimed with FOR UPDATE SKIP LOCKED, see db/job_queue.py)
+# ──────────────────────────────
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(BigInteger, primary_key=True)
+    kind = Column(String, nullable=False)              # e.g. "order_items"
+    job_key = Column(String, nullable=False)           # e.g. the amazon_order_id
+    key_date = Column(DateTime(timezone=True))         # e.g. its purchase_date, to find it by partition
+    region = Column(String)                            # credential region; workers can be pinned to some
+    marketplace_id = Column(String)
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    available_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    lease_owner = Column(String)
+    lease_expires_at = Column(DateTime(timezone=True))
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        UniqueConstraint("kind", "job_key", name="uq_jobs_kind_key"),
+        Index("ix_jobs_claim", "kind", "region", "available_at"),
+    )
@@ -0,0 +1,195 @@
+import logging
+import re
+from datetime import date, datetime, timezone
+
+from sqlalchemy import text, true
+from sqlalchemy.exc import IntegrityError
+
+from db.sync_state import parse_amazon_datetime
+
+logger = logging.getLogger(__name__)
+
+# Orders and their items are range-partitioned by purchase_date, one partition
+# per calendar month (UTC). Items carry their order's purchase_date, so an
+# order and its lines always sit in partitions of the same month.
+#
+#   amazon_orders_detail_p2024_05, amazon_order_detail_item_p2024_05, ...
+#
+# Parents first: items reference orders, so they are created after them and
+# detached before them.
+PARTITIONED = ("amazon_orders_detail", "amazon_order_detail_item")
+
+# Months created ahead of the current one, so inserts never wait on DDL
+AHEAD_MONTHS = 3
+
+_NAME = re.compile(r"_p(\d{4})_(\d{2})$")
+
+# ((tables, parent_suffix), month) seen with every partition in place, so a
+# page of orders for a known month costs no catalog lookups. Only months that
+# already existed are added: ones created here can still roll back with the
+# caller's transaction. Another process may detach a cached month; see
+# write_for_dates.
+_ensured = set()
+
+
+def month_start(value):
+    value = parse_amazon_datetime(value) if isinstance(value, str) else value
+    if isinstance(value, datetime):
+        value = value.astimezone(timezone.utc) if value.tzinfo else value
+    return date(value.year, value.month, 1)
+
+
+def add_months(month, n):
+    index = month.year * 12 + month.month - 1 + n
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def months_between(first, last):
+    month = month_start(first)
+    last = month_start(last)
+    while month <= last:
+        yield month
+        month = add_months(month, 1)
+
+
+def partition_name(table, month):
+    return f"{table}_p{month:%Y_%m}"
+
+
+def date_range(values):
+    """(earliest, latest) of these purchase dates (datetimes or Amazon strings, None skipped)."""
+    values = [parse_amazon_datetime(v) if isinstance(v, str) else v for v in values if v]
+    return (min(values), max(values)) if values else (None, None)
+
+
+def within(column, values):
+    """Bound `column` to the span of these purchase dates, so only their months' partitions are read.
+
+    Add it wherever rows are looked up by order id: amazon_order_id alone
+    carries no partition key and probes every month of the table.
+    """
+    first, last = date_range(values)
+    return column.between(first, last) if first else true()
+
+
+def is_partitioned(conn, table):
+    return conn.execute(text(
+        "SELECT c.relkind = 'p' FROM pg_class c "
+        "WHERE c.oid = to_regclass(:t)"
+    ), {"t": table}).scalar() or False
+
+
+def attached_months(conn, table):
+    """Months that currently have an attached partition of `table`, oldest first."""
+    names = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:t)"
+    ), {"t": table}).scalars()
+    months = []
+    for name in names:
+        match = _NAME.search(name)
+        if match:
+            months.append(date(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months)
+
+
+def _missing(conn, months, tables):
+    return [
+        month for month in months
+        if any(conn.execute(text("SELECT to_regclass(:n)"), {"n": partition_name(t, month)}).scalar() is None
+               for t in tables)
+    ]
+
+
+def ensure_months(conn, months, tables=PARTITIONED, parent_suffix=""):
+    """Create any missing monthly partitions of `tables`, in the caller's transaction.
+
+    Returns the months created. A month whose partition exists as a detached
+    table (see sales_data/retention.py) is left alone: loading into it fails
+    until it is attached again.
+    """
+    key = (tuple(tables), parent_suffix)
+    months = sorted(m for m in set(months) if (key, m) not in _ensured)
+    if not months:
+        return []
+    missing = _missing(conn, months, tables)
+    _ensured.update((key, m) for m in months if m not in missing)
+    if not missing:
+        return []
+    if not is_partitioned(conn, tables[0] + parent_suffix):
+        return []  # not converted yet; migration 6 creates the partitions it needs
+    # Concurrent writers may find the same month missing; let one create it
+    conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('nimbussync.partitions'))"))
+    created = []
+    for month in _missing(conn, missing, tables):
+        start, end = month, add_months(month, 1)
+        for table in tables:
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {partition_name(table, month)} "
+                f"PARTITION OF {table}{parent_suffix} "
+                f"FOR VALUES FROM ('{start} 00:00:00+00') TO ('{end} 00:00:00+00')"
+            ))
+        created.append(month)
+    if created:
+        logger.info(f"🗂️ Created partitions for {', '.join(f'{m:%Y-%m}' for m in created)}")
+    return created
+
+
+def ensure_range(conn, first, last, tables=PARTITIONED, parent_suffix=""):
+    return ensure_months(conn, months_between(first, last), tables, parent_suffix)
+
+
+def ensure_ahead(conn, months=AHEAD_MONTHS):
+    """Partitions from the current month to `months` ahead."""
+    this_month = month_start(datetime.now(timezone.utc))
+    return ensure_range(conn, this_month, add_months(this_month, months))
+
+
+def ensure_for_dates(conn, values):
+    """Partitions for every purchase date about to be written (None values are skipped)."""
+    return ensure_months(conn, {month_start(v) for v in values if v})
+
+
+def _forget(months):
+    _ensured.difference_update({k for k in set(_ensured) if k[1] in months})
+
+
+def _no_partition(error):
+    # check_violation, raised by an insert whose row has no attached partition
+    return getattr(error.orig, "pgcode", None) == "23514" and "no partition" in str(error.orig)
+
+
+def write_for_dates(session, values, write):
+    """Ensure partitions for these purchase dates, then return write(), run in a savepoint.
+
+    If a cached month was detached by another process since (retention), the
+    insert fails with "no partition of relation ... found for row": the month
+    is then looked up again, created if needed, and write() retried once.
+    """
+    months = {month_start(v) for v in values if v}
+    ensure_months(session, months)
+    try:
+        with session.begin_nested():
+            return write()
+    except IntegrityError as e:
+        if not _no_partition(e):
+            raise
+    logger.warning(f"🗂️ Partition gone for {', '.join(f'{m:%Y-%m}' for m in sorted(months))}; checking again")
+    _forget(months)
+    ensure_months(session, months)
+    return write()
+
+
+def detach_month(conn, month, drop=False):
+    """Detach (or drop) one month of every partitioned table, items first. Returns the tables."""
+    _forget({month})
+    detached = []
+    for table in reversed(PARTITIONED):
+        name = partition_name(table, month)
+        if month not in attached_months(conn, table):
+            continue
+        conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+        if drop:
+            conn.execute(text(f"DROP TABLE {name}"))
+        detached.append(name)
+    return detached
@@ -0,0 +1,28 @@
+from datetime import datetime, timezone
+
+from db.bulk import upsert_rows
+from db.models import SyncState
+
+
+def load_state(db, marketplace_id, stream):
+    return db.query(SyncState).filter_by(marketplace_id=marketplace_id, stream=stream).one_or_none()
+
+
+def save_state(db, marketplace_id, stream, high_water_mark=None, window_start=None, next_token=None):
+    """Stage the state row in the caller's transaction; the caller commits."""
+    upsert_rows(db, SyncState, [{
+        "marketplace_id": marketplace_id,
+        "stream": stream,
+        "high_water_mark": high_water_mark,
+        "window_start": window_start,
+        "next_token": next_token,
+        "updated_at": datetime.now(timezone.utc),
+    }], ["marketplace_id", "stream"], ["high_water_mark", "window_start", "next_token", "updated_at"])
+
+
+def parse_amazon_datetime(value):
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
@@ -1,9 +1,15 @@
-from db.connect import engine
-from db.models import Base, AmazonOrder, SalesSummary, AmazonOrderDetail
-Base.metadata.create_all(bind=engine)
+import logging
+
+from db.connect import make_engine
+from db.migrations import run_migrations
 
 
 if __name__ == "__main__":
-    print("Creating tables...")
-    Base.metadata.create_all(bind=engine)
-    print("Tables created.")
+    logging.basicConfig(level=logging.INFO)
+    print("Applying schema migrations...")
+    # Backfills and CREATE INDEX CONCURRENTLY can outlast the sync statement timeout
+    migration_engine = make_engine(pool_size=2, max_overflow=0, statement_timeout_ms=0,
+                                   idle_in_transaction_timeout_ms=0)
+    run_migrations(migration_engine)
+    migration_engine.dispose()
+    print("Schema up to date.")
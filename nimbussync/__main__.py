@@ -0,0 +1,5 @@
+import sys
+
+from nimbussync.cli import main
+
+sys.exit(main())
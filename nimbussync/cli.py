@@ -0,0 +1,74 @@
+import sys
+import os
+import argparse
+import importlib
+import logging
+import time
+
+# Dynamically add the root project dir to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+LOG_FORMAT = "%(asctime)s [%(threadName)s] %(levelname)s %(name)s: %(message)s"
+
+# subcommand: (module, function taking argv, help). Modules are only imported
+# when their subcommand runs, so `nimbussync --help` stays fast.
+COMMANDS = {
+    "orders": ("sales_data.amazon_sync", "cli", "sync order headers (or status changes with --updates)"),
+    "items": ("sales_data.order_items_sync", "cli", "fetch line items for pending orders"),
+    "sales": ("sales_data.update_daily_sales", "cli", "refresh the last few days of SalesSummary"),
+    "backfill": ("sales_data.fetch_historic_sales", "cli", "backfill historic SalesSummary windows"),
+    "report-backfill": ("sales_data.report_backfill", "cli", "bulk-load historic orders and items from order reports"),
+    "dead-letters": ("sales_data.dead_letters", "cli", "list or requeue orders that exhausted their retries"),
+    "export": ("sales_data.export", "cli", "export tables as Parquet/CSV partitions by marketplace and month"),
+    "retention": ("sales_data.retention", "cli", "create, list or detach the monthly order partitions"),
+    "monitor": ("utils.monitor", "main", "data integrity audit"),
+}
+
+
+def _run(args):
+    from nimbussync import orchestrator
+
+    names = args.stages or list(orchestrator.DEFAULT_STAGES)
+    try:
+        stages = orchestrator.select(names)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    from utils import metrics
+    metrics.install_exporters()
+
+    started = time.perf_counter()
+    results = orchestrator.run(stages, max_parallel=args.max_parallel)
+    orchestrator.print_summary(results, time.perf_counter() - started)
+    return 0 if all(r["status"] == orchestrator.OK for r in results.values()) else 1
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    parser = argparse.ArgumentParser(prog="nimbussync", description="NimbusSync Amazon SP-API sync")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="run sync stages in-process, respecting their dependencies")
+    run.add_argument("stages", nargs="*",
+                     help="stages to run (default: sales_backfill orders items); "
+                          "choices: sales_backfill, orders_report, orders, order_updates, items, sales_summary, export")
+    run.add_argument("--max-parallel", type=int, default=4, help="stages running at once")
+
+    for name, (_, _, help_text) in COMMANDS.items():
+        # Options are parsed by the module's own parser (try `nimbussync orders --help`)
+        sub.add_parser(name, help=help_text, add_help=False)
+
+    args, rest = parser.parse_known_args(argv)
+    # Configure logging before any sync module's basicConfig runs, so every
+    # stage streams through one handler tagged with its thread name
+    logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
+
+    if args.command == "run":
+        if rest:
+            parser.error(f"unrecognized arguments: {' '.join(rest)}")
+        return _run(args)
+
+    module_name, func_name, _ = COMMANDS[args.command]
+    module = importlib.import_module(module_name)
+    return getattr(module, func_name)(rest)
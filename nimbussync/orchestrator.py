@@ -0,0 +1,159 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+logger = logging.getLogger(__name__)
+
+OK = "ok"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+
+class Stage:
+    def __init__(self, name, fn, deps=(), description=""):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.description = description
+
+
+# ───────────────────────────────────────
+# Stages (sync modules are imported when a stage starts)
+# ───────────────────────────────────────
+
+def _sales_backfill():
+    from sales_data.fetch_historic_sales import backfill
+    inserted, failed = backfill()
+    if failed:
+        raise RuntimeError(f"{failed} backfill windows failed")
+    return f"{inserted} rows"
+
+
+def _orders_report():
+    from sales_data.report_backfill import backfill
+    orders, items, failed = backfill()
+    if failed:
+        raise RuntimeError(f"{failed} report windows failed")
+    return f"{orders} orders, {items} items"
+
+
+def _orders():
+    from sales_data.amazon_sync import main_concurrent
+    failed = main_concurrent()
+    if failed:
+        raise RuntimeError(f"{failed} marketplaces failed")
+
+
+def _order_updates():
+    from sales_data.amazon_sync import main_concurrent, UPDATES_STREAM
+    failed = main_concurrent(stream=UPDATES_STREAM)
+    if failed:
+        raise RuntimeError(f"{failed} marketplaces failed")
+
+
+def _items():
+    from sales_data.order_items_sync import main_pipeline
+    return f"{main_pipeline()} items"
+
+
+def _sales_summary():
+    from sales_data.update_daily_sales import fetch_and_store
+    written, failed = fetch_and_store()
+    if failed:
+        raise RuntimeError(f"{failed} marketplaces failed")
+    return f"{written} rows"
+
+
+def _export():
+    from sales_data.export import export
+    summary = export()
+    return f"{sum(w for w, _ in summary.values())} partitions rewritten"
+
+
+STAGES = {
+    stage.name: stage for stage in (
+        Stage("sales_backfill", _sales_backfill, description="historic SalesSummary windows"),
+        Stage("orders_report", _orders_report, description="historic orders and items from order reports"),
+        Stage("orders", _orders, description="new order headers"),
+        Stage("order_updates", _order_updates, deps=("orders",), description="status changes"),
+        Stage("items", _items, deps=("orders",), description="line items for pending orders"),
+        Stage("sales_summary", _sales_summary, description="last days of SalesSummary"),
+        Stage("export", _export, deps=("sales_backfill", "orders_report", "orders", "order_updates", "items",
+                                       "sales_summary"), description="changed Parquet/CSV partitions"),
+    )
+}
+# What run_all.py used to run
+DEFAULT_STAGES = ("sales_backfill", "orders", "items")
+
+
+def select(names):
+    """The named stages, with dependencies outside the selection dropped."""
+    unknown = [n for n in names if n not in STAGES]
+    if unknown:
+        raise ValueError(f"Unknown stages: {', '.join(unknown)} (choose from {', '.join(STAGES)})")
+    chosen = set(names)
+    return [
+        Stage(s.name, s.fn, [d for d in s.deps if d in chosen], s.description)
+        for s in STAGES.values() if s.name in chosen
+    ]
+
+
+def _run_stage(stage):
+    threading.current_thread().name = stage.name
+    started = time.perf_counter()
+    logger.info(f"🟡 {stage.name} started")
+    result = stage.fn()
+    logger.info(f"🟢 {stage.name} finished in {time.perf_counter() - started:.1f}s")
+    return result
+
+
+def run(stages, max_parallel=4):
+    """Run stages as their dependencies complete; a failure skips everything downstream.
+
+    Returns {name: {"status", "seconds", "result"/"error"}} in completion order.
+    """
+    pending = {s.name: s for s in stages}
+    results = {}
+    running = {}
+    started_at = {}
+
+    def skip_dependents(failed_name):
+        for name, stage in list(pending.items()):
+            # A stage reachable along two paths is skipped by the first one
+            if failed_name in stage.deps and pending.pop(name, None):
+                results[name] = {"status": SKIPPED, "seconds": 0.0, "error": f"{failed_name} failed"}
+                logger.warning(f"⏭️ {name} skipped: {failed_name} failed")
+                skip_dependents(name)
+
+    with ThreadPoolExecutor(max_workers=max_parallel, thread_name_prefix="stage") as pool:
+        while pending or running:
+            for name, stage in list(pending.items()):
+                if all(results.get(d, {}).get("status") == OK for d in stage.deps):
+                    del pending[name]
+                    started_at[name] = time.perf_counter()
+                    running[pool.submit(_run_stage, stage)] = name
+
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                seconds = time.perf_counter() - started_at[name]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error(f"❌ {name} failed after {seconds:.1f}s: {e}")
+                    results[name] = {"status": FAILED, "seconds": seconds, "error": str(e)}
+                    skip_dependents(name)
+                else:
+                    results[name] = {"status": OK, "seconds": seconds, "result": result}
+    return results
+
+
+def print_summary(results, wall):
+    icons = {OK: "✅", FAILED: "❌", SKIPPED: "⏭️"}
+    print(f"\n--- ⏱️ Stage Summary ({wall:.1f}s wall) ---")
+    for name, res in results.items():
+        detail = res.get("error") or res.get("result") or ""
+        print(f"{icons[res['status']]} {name:<16}{res['status']:<9}{res['seconds']:>8.1f}s  {detail}")
@@ -1,15 +1,7 @@
-import subprocess
+import sys
 
-scripts = [
-    "sales_data/fetch_historic_sales.py",
-    "sales_data/amazon_sync.py",
-    "sales_data/order_items_sync.py"
-]
+from nimbussync.cli import main
 
-for script in scripts:
-    print(f"\n🟡 Running {script}...\n" + "-" * 40)
-    result = subprocess.run(["python", script], capture_output=True, text=True)
-
-    print(result.stdout)
-    if result.stderr:
-        print(f"🔴 Error in {script}:\n{result.stderr}")
+# Kept for existing cron jobs / habits; equivalent to `python -m nimbussync run`
+if __name__ == "__main__":
+    sys.exit(main(["run", *sys.argv[1:]]))
@@ -1,162 +1,479 @@
 import sys
 import os
+import argparse
 import logging
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta, timezone
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy import func
-import pytz
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from client_config import CREDENTIALS as credentials
-from sp_api.api import Orders
-from sp_api.base import Marketplaces, SellingApiException
-from db.connect import SessionLocal
-from db.models import AmazonOrderDetail
+from db import partitions
+from db.connect import ScopedSession, session_scope
+from db.models import AmazonOrderDetail, ITEMS_PENDING, ITEMS_FETCHED
+from db.bulk import upsert
+from db.sync_state import load_state, save_state, parse_amazon_datetime
+from utils.rate_limiter import call_limited
+from utils.sp_clients import get_client, load_credentials
+from utils import metrics
+from sales_data.daily_aggregates import refresh_for_orders
+from sales_data.marketplaces import MARKETPLACES, marketplace_region, sp_marketplaces
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-marketplace_timezones = {
-    Marketplaces.US: "America/Los_Angeles",
-    Marketplaces.CA: "America/Los_Angeles",
-    Marketplaces.MX: "America/Mexico_City",
-    Marketplaces.DE: "Europe/Berlin",
-    Marketplaces.FR: "Europe/Paris",
-    Marketplaces.IT: "Europe/Rome",
-    Marketplaces.ES: "Europe/Madrid",
-    Marketplaces.NL: "Europe/Amsterdam",
-    Marketplaces.BE: "Europe/Brussels",
-    Marketplaces.SE: "Europe/Stockholm",
-    Marketplaces.PL: "Europe/Warsaw",
-    Marketplaces.TR: "Europe/Istanbul",
-    Marketplaces.UK: "Europe/London",
-    Marketplaces.JP: "Asia/Tokyo",
-    Marketplaces.AU: "Australia/Sydney"
+# Header fields that can legitimately change after the first insert
+ORDER_UPDATE_COLUMNS = ["order_status", "buyer_name", "buyer_email", "order_total", "currency"]
+
+# upsert: INSERT ... ON CONFLICT DO UPDATE, ignore: ON CONFLICT DO NOTHING,
+# row: legacy one-commit-per-order path (kept for throughput comparison)
+WRITE_MODES = ("upsert", "ignore", "row")
+
+ORDERS_STREAM = "orders"
+UPDATES_STREAM = "order_updates"
+# getOrders filter and the order field that advances the watermark, per stream
+STREAM_QUERY = {
+    ORDERS_STREAM: ("CreatedAfter", "PurchaseDate"),
+    UPDATES_STREAM: ("LastUpdatedAfter", "LastUpdateDate"),
 }
+# Re-read this far behind the watermark so orders that Amazon indexes late are not missed
+WATERMARK_OVERLAP = timedelta(hours=1)
+# Lookback for a marketplace that has neither sync state nor any orders yet
+INITIAL_LOOKBACK = timedelta(days=720)
+# How far back the first LastUpdatedAfter poll reaches for status changes
+UPDATES_LOOKBACK = timedelta(days=30)
+# Window searched for a marketplace's newest order before the full history
+LATEST_ORDER_PROBE = timedelta(days=35)
+# Orders are unique per (id, purchase date), the partition key
+ORDER_KEY = ["amazon_order_id", "purchase_date"]
 
-session = SessionLocal()
+def get_latest_order_date(marketplace_id=None, db=None):
+    db = db or ScopedSession()
+    # Look in the recent partitions first; only a marketplace without orders
+    # in that window makes the query reach into older months
+    for since in (datetime.now(timezone.utc) - LATEST_ORDER_PROBE, None):
+        query = db.query(func.max(AmazonOrderDetail.purchase_date))
+        if marketplace_id:
+            query = query.filter(AmazonOrderDetail.marketplace_id == marketplace_id)
+        if since:
+            query = query.filter(AmazonOrderDetail.purchase_date >= since)
+        latest = query.scalar()
+        if latest:
+            return parse_amazon_datetime(latest)
+    return None
 
-def get_latest_order_date():
-    latest = session.query(func.max(AmazonOrderDetail.purchase_date)).scalar()
-    return latest or datetime.utcnow().replace(tzinfo=timezone.utc) - timedelta(days=720)
+def resolve_start(marketplace, db=None, stream=ORDERS_STREAM):
+    """Returns (window_start, next_token, high_water_mark) for this marketplace."""
+    db = db or ScopedSession()
+    state = load_state(db, marketplace.marketplace_id, stream)
+    if state and state.next_token:
+        return state.window_start, state.next_token, state.high_water_mark
+
+    if state and state.high_water_mark:
+        hwm = state.high_water_mark
+    elif stream == ORDERS_STREAM:
+        # No state yet: bootstrap from this marketplace's own newest order
+        hwm = get_latest_order_date(marketplace.marketplace_id, db)
+    else:
+        return datetime.now(timezone.utc) - UPDATES_LOOKBACK, None, None
 
-def fetch_and_insert_orders(marketplace, creds, start_date):
-    logger.info(f"Fetching orders for {marketplace.name} starting from {start_date.isoformat()}")
-    api = Orders(credentials=creds, marketplace=marketplace)
-    next_token = None
-    retry_count = 0
+    if hwm:
+        return hwm - WATERMARK_OVERLAP, None, hwm
+    return datetime.now(timezone.utc) - INITIAL_LOOKBACK, None, None
+
+def fetch_and_insert_orders(marketplace, creds, write_mode="upsert", db=None, stream=ORDERS_STREAM):
+    from sp_api.api import Orders
+    from sp_api.base import SellingApiException
+    from requests.exceptions import RequestException
+
+    db = db or ScopedSession()
+    region = _region_label(marketplace)
+    api = get_client(Orders, region, marketplace, creds)
+    date_param, watermark_field = STREAM_QUERY[stream]
+    window_start, next_token, hwm = resolve_start(marketplace, db, stream)
+    db.commit()  # don't sit idle in a read transaction across API calls
+    resuming = bool(next_token)
+    if resuming:
+        logger.info(f"⏯️ Resuming {marketplace.name} [{stream}] from saved NextToken (window from {window_start.isoformat()})")
+    else:
+        logger.info(f"Fetching {stream} for {marketplace.name} with {date_param} {window_start.isoformat()}")
     total_inserted = 0
+    total_updated = 0
 
     while True:
+        # Only the API call is caught: a failed write propagates so the
+        # marketplace counts as failed instead of ending early as a success
         try:
             if next_token:
-                res = api.get_orders(NextToken=next_token)
+                res = call_limited(region, "getOrders", api.get_orders, NextToken=next_token)
             else:
-                res = api.get_orders(
-                    CreatedAfter=start_date.strftime('%Y-%m-%dT%H:%M:%SZ'),
+                res = call_limited(
+                    region, "getOrders", api.get_orders,
                     MarketplaceIds=[marketplace.marketplace_id],
-                    MaxResultsPerPage=100
+                    MaxResultsPerPage=100,
+                    **{date_param: window_start.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')}
                 )
+        except SellingApiException as e:
+            if resuming:
+                # Saved tokens can expire between runs; restart the window instead
+                logger.warning(f"Saved NextToken for {marketplace.name} rejected ({e}); restarting window")
+                next_token = None
+                resuming = False
+                continue
+            logger.error(f"SP API Exception: {e}")
+            break
+        except RequestException as e:
+            logger.error(f"Network error fetching orders: {e}")
+            break
+        resuming = False
+
+        orders = res.payload.get('Orders', [])
+        next_token = res.payload.get('NextToken')
+        for order in orders:
+            seen = parse_amazon_datetime(order.get(watermark_field))
+            if seen and (hwm is None or seen > hwm):
+                hwm = seen
+
+        # Orders and the checkpoint land in one transaction
+        if stream == UPDATES_STREAM:
+            inserted, updated = write_update_page(
+                db, orders, marketplace.marketplace_id, window_start, next_token, hwm
+            )
+        else:
+            inserted, updated = write_page(
+                db, orders, write_mode, marketplace.marketplace_id, window_start, next_token, hwm
+            )
+        if orders:
+            logger.info(f"Inserted {inserted}, updated {updated} orders for {marketplace.name} in this batch")
+        total_inserted += inserted
+        total_updated += updated
 
-            orders = res.payload.get('Orders', [])
-            if not orders:
-                break
+        if not next_token:
+            break
 
-            inserted = insert_orders(orders)
-            logger.info(f"Inserted {inserted} orders for {marketplace.name} in this batch")
-            total_inserted += inserted
+    return total_inserted, total_updated
 
-            next_token = res.payload.get('NextToken')
-            if not next_token:
-                break
+def write_page(db, orders, write_mode, marketplace_id, window_start, next_token, hwm):
+    if write_mode == "row":
+        counts = insert_orders_row_by_row(orders, db=db)
+        save_state(db, marketplace_id, ORDERS_STREAM, hwm, window_start, next_token)
+        db.commit()
+        return counts
 
-            time.sleep(2)
+    rows = [_order_row(order) for order in orders]
+    started = time.perf_counter()
+    try:
+        inserted, updated = _write_orders(db, rows, write_mode)
+        save_state(db, marketplace_id, ORDERS_STREAM, hwm, window_start, next_token)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    if rows:
+        _log_throughput(write_mode, len(rows), time.perf_counter() - started)
+    return inserted, updated
 
-        except SellingApiException as e:
-            if 'QuotaExceeded' in str(e):
-                retry_count += 1
-                wait_time = min(60 * retry_count, 300)
-                logger.warning(f"QuotaExceeded. Sleeping {wait_time}s and retrying... [Attempt {retry_count}]")
-                time.sleep(wait_time)
-                continue
-            else:
-                logger.error(f"SP API Exception: {e}")
-                break
-        except Exception as e:
-            logger.error(f"Error fetching orders: {e}")
-            break
+def write_update_page(db, orders, marketplace_id, window_start, next_token, hwm):
+    """Upsert changed headers and re-queue item fetches for orders whose status moved."""
+    rows = [_order_row(order) for order in orders]
+    try:
+        previous = {}
+        # Only the partitions these orders were purchased in need looking at
+        earliest = min((parse_amazon_datetime(row["purchase_date"]) for row in rows if row["purchase_date"]),
+                       default=None)
+        if rows:
+            ids = [row["amazon_order_id"] for row in rows]
+            query = db.query(AmazonOrderDetail.amazon_order_id, AmazonOrderDetail.order_status) \
+                .filter(AmazonOrderDetail.amazon_order_id.in_(ids))
+            if earliest:
+                query = query.filter(AmazonOrderDetail.purchase_date >= earliest)
+            previous = dict(query.all())
+        inserted, updated = _write_orders(db, rows, "upsert")
+
+        moved = [
+            row["amazon_order_id"] for row in rows
+            if row["amazon_order_id"] in previous and previous[row["amazon_order_id"]] != row["order_status"]
+        ]
+        flagged = 0
+        if moved:
+            query = db.query(AmazonOrderDetail).filter(
+                AmazonOrderDetail.amazon_order_id.in_(moved),
+                AmazonOrderDetail.items_status == ITEMS_FETCHED,
+            )
+            # `purchase_date >= NULL` would match nothing and silently skip the re-queue
+            if earliest:
+                query = query.filter(AmazonOrderDetail.purchase_date >= earliest)
+            flagged = query.update({
+                AmazonOrderDetail.items_status: ITEMS_PENDING,
+                AmazonOrderDetail.items_attempts: 0,
+            }, synchronize_session=False)
+            # Cancellations change revenue even before the items are refetched
+            refresh_for_orders(db, {row["amazon_order_id"]: row["purchase_date"]
+                                    for row in rows if row["amazon_order_id"] in moved})
+
+        save_state(db, marketplace_id, UPDATES_STREAM, hwm, window_start, next_token)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    if moved:
+        logger.info(f"🔁 {len(moved)} status changes, {flagged} orders re-queued for item fetch")
+    return inserted, updated
+
+def _order_row(order):
+    return {
+        "amazon_order_id": order.get('AmazonOrderId'),
+        "purchase_date": order.get('PurchaseDate'),
+        "order_status": order.get('OrderStatus'),
+        "buyer_name": order.get('BuyerInfo', {}).get('BuyerName'),
+        "buyer_email": order.get('BuyerInfo', {}).get('BuyerEmail'),
+        "marketplace_id": order.get('MarketplaceId'),
+        "order_total": order.get('OrderTotal', {}).get('Amount'),
+        "currency": order.get('OrderTotal', {}).get('CurrencyCode'),
+    }
+
+def insert_orders(order_list, write_mode="upsert", db=None):
+    """Write one page of orders. Returns (inserted, updated)."""
+    db = db or ScopedSession()
+    if write_mode == "row":
+        return insert_orders_row_by_row(order_list, db=db)
 
-    return total_inserted
+    rows = [_order_row(order) for order in order_list]
+    started = time.perf_counter()
+    try:
+        inserted, updated = _write_orders(db, rows, write_mode)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    _log_throughput(write_mode, len(rows), time.perf_counter() - started)
+    return inserted, updated
 
-def insert_orders(order_list):
+def _write_orders(db, rows, write_mode):
+    if not rows:
+        return 0, 0
+    update_cols = ORDER_UPDATE_COLUMNS if write_mode == "upsert" else None
+    return partitions.write_for_dates(db, [row["purchase_date"] for row in rows],
+                                      lambda: upsert(db, AmazonOrderDetail, rows, ORDER_KEY, update_cols))
+
+def insert_orders_row_by_row(order_list, db=None):
+    db = db or ScopedSession()
     inserted = 0
+    started = time.perf_counter()
+    partitions.ensure_for_dates(db, [order.get('PurchaseDate') for order in order_list])
+    db.commit()
     for order in order_list:
         try:
-            obj = AmazonOrderDetail(
-                amazon_order_id=order.get('AmazonOrderId'),
-                purchase_date=order.get('PurchaseDate'),
-                order_status=order.get('OrderStatus'),
-                buyer_name=order.get('BuyerInfo', {}).get('BuyerName'),
-                buyer_email=order.get('BuyerInfo', {}).get('BuyerEmail'),
-                marketplace_id=order.get('MarketplaceId'),
-                order_total=order.get('OrderTotal', {}).get('Amount'),
-                currency=order.get('OrderTotal', {}).get('CurrencyCode'),
-            )
-            session.add(obj)
-            session.commit()
+            db.add(AmazonOrderDetail(**_order_row(order)))
+            db.commit()
             inserted += 1
         except IntegrityError:
-            session.rollback()
-    return inserted
+            db.rollback()
+    metrics.record_rows(AmazonOrderDetail.__tablename__, inserted=inserted, skipped=len(order_list) - inserted)
+    _log_throughput("row", len(order_list), time.perf_counter() - started)
+    return inserted, 0
+
+def _log_throughput(write_mode, rows, elapsed):
+    rate = rows / elapsed if elapsed > 0 else float("inf")
+    logger.info(f"⚡ [{write_mode}] wrote {rows} orders in {elapsed:.3f}s ({rate:.0f} rows/sec)")
 
 def verify_recent_orders():
-    last_10_min = datetime.utcnow() - timedelta(minutes=10)
-    rows = session.query(AmazonOrderDetail).filter(
-        AmazonOrderDetail.purchase_date >= last_10_min
-    ).all()
+    last_10_min = datetime.now(timezone.utc) - timedelta(minutes=10)
+    with session_scope() as db:
+        rows = db.query(
+            AmazonOrderDetail.amazon_order_id, AmazonOrderDetail.order_status, AmazonOrderDetail.purchase_date
+        ).filter(AmazonOrderDetail.purchase_date >= last_10_min).all()
     logger.info(f"🟢 {len(rows)} orders inserted in the last 10 minutes.")
     if rows:
         logger.info("📋 Sample order:")
         sample = rows[0]
         logger.info(f"  ID: {sample.amazon_order_id}, Status: {sample.order_status}, Date: {sample.purchase_date}")
 
-def main():
-    latest_date = get_latest_order_date()
-    logger.info(f"Starting sync from {latest_date.isoformat()}")
+def sync_marketplace(marketplace, write_mode="upsert", db=None, stream=ORDERS_STREAM):
+    creds = load_credentials().get(_region_label(marketplace), None)
+    if not creds:
+        logger.warning(f"No credentials for {marketplace.name}. Skipping.")
+        return 0, 0
+    try:
+        inserted, updated = fetch_and_insert_orders(marketplace, creds, write_mode, db=db, stream=stream)
+    except Exception as e:
+        logger.error(f"❌ Error syncing {marketplace.name}: {e}")
+        raise
+    logger.info(f"✅ {inserted} total inserted, {updated} updated for {marketplace.name}")
+    return inserted, updated
+
+def main(write_mode="upsert", stream=ORDERS_STREAM):
+    """Sync every marketplace in turn. Returns the number that failed."""
+    logger.info(f"Starting {stream} sync from per-marketplace watermarks [write mode: {write_mode}]")
 
     total_all = 0
-    for marketplace, tz_str in marketplace_timezones.items():
-        local_tz = pytz.timezone(tz_str)
-        start_date = latest_date.astimezone(local_tz)
-        creds = credentials.get(_region_label(marketplace), None)
-        if not creds:
-            logger.warning(f"No credentials for {marketplace.name}. Skipping.")
-            continue
-        try:
-            inserted = fetch_and_insert_orders(marketplace, creds, start_date)
-            logger.info(f"✅ {inserted} total inserted for {marketplace.name}")
+    updated_all = 0
+    failed = 0
+    try:
+        for marketplace in sp_marketplaces():
+            try:
+                inserted, updated = sync_marketplace(marketplace, write_mode, stream=stream)
+            except Exception:
+                failed += 1
+                continue
             total_all += inserted
-        except Exception as e:
-            logger.error(f"❌ Error syncing {marketplace.name}: {e}")
+            updated_all += updated
+    finally:
+        ScopedSession.remove()
+
+    logger.info(f"🎉 Sync complete. Total inserted: {total_all}, updated: {updated_all}, failed marketplaces: {failed}")
+    verify_recent_orders()
+    return failed
+
+def sync_marketplaces(marketplace_ids=None, write_mode="upsert", stream=ORDERS_STREAM):
+    """Importable entry point: sync the given marketplaces (default: all) in sequence on one session.
+
+    Returns {"inserted": n, "updated": n} so schedulers can pass it on as a result.
+    Raises once every marketplace has been tried if any of them failed.
+    """
+    marketplaces = sp_marketplaces(marketplace_ids)
+    totals = {"inserted": 0, "updated": 0}
+    failed = []
+    with session_scope() as db:
+        for marketplace in marketplaces:
+            try:
+                inserted, updated = sync_marketplace(marketplace, write_mode, db=db, stream=stream)
+            except Exception:
+                db.rollback()
+                failed.append(marketplace.name)
+                continue
+            totals["inserted"] += inserted
+            totals["updated"] += updated
+    if failed:
+        raise RuntimeError(f"Order sync failed for {', '.join(failed)}")
+    return totals
+
+# ───────────────────────────────────────
+# Concurrent mode: one lane per credential region
+# ───────────────────────────────────────
+
+class RegionProgress:
+    """Thread-safe per-region counters for the concurrent sync."""
 
-    logger.info(f"🎉 Sync complete. Total inserted: {total_all}")
+    def __init__(self, lanes):
+        self._lock = threading.Lock()
+        self._state = {
+            region: {"total": len(mks), "done": 0, "failed": 0, "inserted": 0, "updated": 0,
+                     "started": None, "elapsed": 0.0}
+            for region, mks in lanes.items()
+        }
+
+    def start(self, region):
+        with self._lock:
+            self._state[region]["started"] = time.perf_counter()
+
+    def record(self, region, marketplace, inserted, updated, failed=False):
+        with self._lock:
+            st = self._state[region]
+            st["done"] += 1
+            st["failed"] += failed
+            st["inserted"] += inserted
+            st["updated"] += updated
+            st["elapsed"] = time.perf_counter() - st["started"]
+            logger.info(
+                f"📊 [{region}] {marketplace.name} {'failed' if failed else 'done'} — "
+                f"{st['done']}/{st['total']} marketplaces, "
+                f"{st['inserted']} inserted, {st['updated']} updated, {st['elapsed']:.1f}s"
+            )
+
+    def summary(self):
+        with self._lock:
+            return {region: dict(st) for region, st in self._state.items()}
+
+def region_lanes():
+    lanes = {}
+    for marketplace in sp_marketplaces():
+        region = _region_label(marketplace)
+        if region:
+            lanes.setdefault(region, []).append(marketplace)
+    return lanes
+
+def sync_region(region, marketplaces, write_mode, progress, stream=ORDERS_STREAM):
+    # Marketplaces inside a region share its SP-API quota (and its limiter
+    # bucket), so they run in sequence on this lane.
+    progress.start(region)
+    with session_scope() as db:
+        for marketplace in marketplaces:
+            try:
+                inserted, updated = sync_marketplace(marketplace, write_mode, db=db, stream=stream)
+            except Exception:
+                db.rollback()
+                progress.record(region, marketplace, 0, 0, failed=True)
+                continue
+            progress.record(region, marketplace, inserted, updated)
+
+def main_concurrent(write_mode="upsert", max_workers=4, stream=ORDERS_STREAM):
+    """Sync each credential region on its own lane. Returns the number of marketplaces that failed."""
+    lanes = region_lanes()
+    logger.info(
+        f"Starting concurrent {stream} sync across {len(lanes)} regions "
+        f"[max workers: {max_workers}, write mode: {write_mode}]"
+    )
+
+    progress = RegionProgress(lanes)
+    failed_regions = []
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="region") as pool:
+        futures = {
+            pool.submit(sync_region, region, mks, write_mode, progress, stream): region
+            for region, mks in lanes.items()
+        }
+        for future in as_completed(futures):
+            region = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                logger.error(f"❌ Region {region} failed: {e}")
+                failed_regions.append(region)
+
+    wall = time.perf_counter() - started
+    summary = progress.summary()
+    for region, st in summary.items():
+        logger.info(
+            f"🌍 {region}: {st['done']}/{st['total']} marketplaces ({st['failed']} failed), {st['inserted']} inserted, "
+            f"{st['updated']} updated in {st['elapsed']:.1f}s"
+        )
+    total_all = sum(st["inserted"] for st in summary.values())
+    updated_all = sum(st["updated"] for st in summary.values())
+    # A lane that died counts every marketplace it didn't get to
+    failed = sum(st["failed"] for st in summary.values())
+    failed += sum(max(1, summary[r]["total"] - summary[r]["done"]) for r in failed_regions)
+    logger.info(f"🎉 Sync complete in {wall:.1f}s. Total inserted: {total_all}, updated: {updated_all}, "
+                f"failed marketplaces: {failed}")
     verify_recent_orders()
+    return failed
 
 def _region_label(marketplace):
-    if marketplace in [Marketplaces.US, Marketplaces.CA, Marketplaces.MX]:
-        return "North America"
-    elif marketplace in [Marketplaces.DE, Marketplaces.FR, Marketplaces.IT, Marketplaces.ES,
-                         Marketplaces.NL, Marketplaces.BE, Marketplaces.SE, Marketplaces.PL,
-                         Marketplaces.TR, Marketplaces.UK]:
-        return "Europe"
-    elif marketplace == Marketplaces.JP:
-        return "Far East"
-    elif marketplace == Marketplaces.AU:
-        return "Australia"
-    else:
+    if marketplace.marketplace_id not in MARKETPLACES:
         return None
+    return marketplace_region(marketplace.marketplace_id)
+
+def cli(argv=None):
+    parser = argparse.ArgumentParser(prog="nimbussync orders", description="Sync Amazon order headers")
+    parser.add_argument("--write-mode", choices=WRITE_MODES, default="upsert",
+                        help="upsert (default), ignore existing orders, or legacy per-row commits")
+    parser.add_argument("--concurrent", action="store_true",
+                        help="sync credential regions in parallel instead of one marketplace at a time")
+    parser.add_argument("--max-workers", type=int, default=int(os.getenv("ORDER_SYNC_MAX_WORKERS", "4")),
+                        help="cap on regions synced at once in --concurrent mode")
+    parser.add_argument("--updates", action="store_true",
+                        help="poll LastUpdatedAfter for status changes instead of new orders")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    metrics.install_exporters()
+    stream = UPDATES_STREAM if args.updates else ORDERS_STREAM
+    if args.concurrent:
+        failed = main_concurrent(write_mode=args.write_mode, max_workers=args.max_workers, stream=stream)
+    else:
+        failed = main(write_mode=args.write_mode, stream=stream)
+    return 1 if failed else 0
 
 if __name__ == "__main__":
-    main()
+    sys.exit(cli())
@@ -0,0 +1,214 @@
+import sys
+import os
+import argparse
+import logging
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import partitions
+from db.connect import session_scope
+from db.models import AmazonOrderDetail, ITEMS_FETCHED
+from sales_data.marketplaces import MARKETPLACES, marketplace_name
+
+logger = logging.getLogger(__name__)
+
+# Statuses that don't count towards revenue
+EXCLUDED_STATUSES = ("Canceled",)
+
+_TZ_VALUES = ", ".join(f"('{mp_id}', '{tz}')" for mp_id, (_, tz, _) in MARKETPLACES.items())
+_EXCLUDED = ", ".join(f"'{s}'" for s in EXCLUDED_STATUSES)
+
+_TZ = f"tz (marketplace_id, tz) AS (VALUES {_TZ_VALUES})"
+
+# (day, marketplace, asin, sku) groups that the stored lines of the given orders
+# fall into. The purchase-date span keeps both lookups to those months' partitions.
+_LINE_GROUPS = """
+    SELECT DISTINCT
+        (o.purchase_date AT TIME ZONE tz.tz)::date AS sales_date,
+        o.marketplace_id,
+        coalesce(i.asin, '') AS asin,
+        coalesce(i.seller_sku, '') AS seller_sku,
+        tz.tz
+    FROM amazon_orders_detail o
+    JOIN tz ON tz.marketplace_id = o.marketplace_id
+    JOIN amazon_order_detail_item i ON i.order_id = o.amazon_order_id AND i.purchase_date = o.purchase_date
+    WHERE o.amazon_order_id = ANY(:ids)
+      AND o.purchase_date BETWEEN CAST(:first AS timestamptz) AND CAST(:last AS timestamptz)
+      AND i.purchase_date BETWEEN CAST(:first AS timestamptz) AND CAST(:last AS timestamptz)
+"""
+
+# Those groups, plus the ones passed in as arrays: groups that lines since
+# deleted or moved to another ASIN/SKU used to fall into
+_TOUCHED = f"""
+    {_TZ},
+    touched AS (
+        {_LINE_GROUPS}
+        UNION
+        SELECT g.sales_date, g.marketplace_id, g.asin, g.seller_sku, tz.tz
+        FROM unnest(CAST(:group_dates AS date[]), CAST(:group_marketplaces AS varchar[]),
+                    CAST(:group_asins AS varchar[]), CAST(:group_skus AS varchar[]))
+             AS g (sales_date, marketplace_id, asin, seller_sku)
+        JOIN tz ON tz.marketplace_id = g.marketplace_id
+    )
+"""
+
+# Recompute only the touched groups, reading each group's local day through
+# the (marketplace_id, purchase_date) index rather than rescanning history.
+_UPSERT = f"""
+WITH {_TOUCHED},
+fresh AS (
+    SELECT t.sales_date, t.marketplace_id, t.asin, t.seller_sku,
+           sum(coalesce(i.quantity_ordered, 0)) AS units,
+           count(*) AS item_count,
+           sum(i.item_price) AS revenue,
+           max(i.item_currency) AS currency
+    FROM touched t
+    JOIN amazon_orders_detail o
+      ON o.marketplace_id = t.marketplace_id
+     AND o.purchase_date >= (t.sales_date::timestamp AT TIME ZONE t.tz)
+     AND o.purchase_date < ((t.sales_date + 1)::timestamp AT TIME ZONE t.tz)
+     AND o.order_status NOT IN ({_EXCLUDED})
+    JOIN amazon_order_detail_item i
+      ON i.order_id = o.amazon_order_id
+     AND i.purchase_date = o.purchase_date
+     AND coalesce(i.asin, '') = t.asin
+     AND coalesce(i.seller_sku, '') = t.seller_sku
+    GROUP BY t.sales_date, t.marketplace_id, t.asin, t.seller_sku
+)
+INSERT INTO daily_product_sales
+    (sales_date, marketplace_id, asin, seller_sku, units, item_count, revenue, currency, updated_at)
+SELECT sales_date, marketplace_id, asin, seller_sku, units, item_count, revenue, currency, :stamp
+FROM fresh
+ON CONFLICT (sales_date, marketplace_id, asin, seller_sku) DO UPDATE SET
+    units = EXCLUDED.units,
+    item_count = EXCLUDED.item_count,
+    revenue = EXCLUDED.revenue,
+    currency = EXCLUDED.currency,
+    updated_at = EXCLUDED.updated_at
+"""
+
+# Touched groups that produced no row above (e.g. every order canceled) are stale
+_DELETE_STALE = f"""
+WITH {_TOUCHED}
+DELETE FROM daily_product_sales d
+USING touched t
+WHERE d.sales_date = t.sales_date
+  AND d.marketplace_id = t.marketplace_id
+  AND d.asin = t.asin
+  AND d.seller_sku = t.seller_sku
+  AND d.updated_at < :stamp
+"""
+
+
+def _order_params(dates):
+    first, last = partitions.date_range(dates.values())
+    return {"ids": list(dates), "first": first, "last": last}
+
+
+def line_groups(db, dates, item_ids=None):
+    """Groups the stored lines of these orders ({order_id: purchase_date}), or only the lines `item_ids`, count towards.
+
+    Read them before deleting or rewriting lines and pass them to
+    refresh_for_orders, which only sees the lines as they are afterwards.
+    """
+    sql = f"WITH {_TZ} SELECT sales_date, marketplace_id, asin, seller_sku FROM ({_LINE_GROUPS}"
+    params = _order_params(dates)
+    if item_ids is not None:
+        sql += " AND i.id = ANY(:item_ids)"
+        params["item_ids"] = list(item_ids)
+    return {tuple(row) for row in db.execute(text(sql + ") g"), params)}
+
+
+def refresh_for_orders(db, dates, groups=()):
+    """Recompute the aggregate rows these orders ({order_id: purchase_date}) contribute to, in the caller's transaction.
+
+    `groups` adds (sales_date, marketplace_id, asin, seller_sku) rows to
+    recompute as well, as returned by line_groups.
+    """
+    groups = list(groups)
+    if not dates and not groups:
+        return 0
+    stamp = datetime.now(timezone.utc)
+    params = {
+        **_order_params(dates), "stamp": stamp,
+        "group_dates": [g[0] for g in groups], "group_marketplaces": [g[1] for g in groups],
+        "group_asins": [g[2] for g in groups], "group_skus": [g[3] for g in groups],
+    }
+    upserted = db.execute(text(_UPSERT), params).rowcount
+    db.execute(text(_DELETE_STALE), params)
+    return upserted
+
+
+def rebuild(days=None, batch_size=1000):
+    """Seed or repair the aggregate from stored orders, in keyset batches."""
+    last_id = 0
+    groups = 0
+    with session_scope() as db:
+        while True:
+            query = db.query(
+                AmazonOrderDetail.id, AmazonOrderDetail.amazon_order_id, AmazonOrderDetail.purchase_date,
+            ).filter(
+                AmazonOrderDetail.id > last_id,
+                AmazonOrderDetail.items_status == ITEMS_FETCHED,
+            )
+            if days:
+                since = datetime.now(timezone.utc) - timedelta(days=days)
+                query = query.filter(AmazonOrderDetail.purchase_date >= since)
+            batch = query.order_by(AmazonOrderDetail.id).limit(batch_size).all()
+            if not batch:
+                break
+            last_id = batch[-1].id
+            groups += refresh_for_orders(db, {row.amazon_order_id: row.purchase_date for row in batch})
+            db.commit()
+    logger.info(f"🧮 Rebuilt {groups} aggregate groups")
+    return groups
+
+
+def reconcile_sales_summary(days=30, tolerance=0.01):
+    """Compare SalesSummary against the local aggregate per (day, marketplace)."""
+    since = (datetime.now(timezone.utc) - timedelta(days=days)).date()
+    with session_scope() as db:
+        local = {
+            (row.sales_date, marketplace_name(row.marketplace_id)): row
+            for row in db.execute(text(
+                "SELECT sales_date, marketplace_id, sum(units) AS units, sum(revenue) AS revenue "
+                "FROM daily_product_sales WHERE sales_date >= :since "
+                "GROUP BY sales_date, marketplace_id"
+            ), {"since": since})
+            if row.marketplace_id in MARKETPLACES
+        }
+        remote = db.execute(text(
+            "SELECT date, country, unit_count, total_sales FROM sales_summary WHERE date >= :since"
+        ), {"since": since}).all()
+
+    mismatches = []
+    for row in remote:
+        mine = local.get((row.date, row.country))
+        units = mine.units if mine else 0
+        revenue = float(mine.revenue or 0) if mine else 0.0
+        total = float(row.total_sales or 0)
+        if units != (row.unit_count or 0) or abs(revenue - total) > tolerance:
+            mismatches.append({
+                "date": row.date.isoformat(), "country": row.country,
+                "units_api": row.unit_count, "units_local": units,
+                "sales_api": total, "sales_local": revenue,
+            })
+    logger.info(f"🔎 Reconciled {len(remote)} SalesSummary rows: {len(mismatches)} mismatches")
+    return mismatches
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Maintain the local daily_product_sales aggregate")
+    parser.add_argument("--rebuild", action="store_true", help="recompute from stored orders")
+    parser.add_argument("--reconcile", action="store_true", help="compare SalesSummary with the aggregate")
+    parser.add_argument("--days", type=int, default=None)
+    args = parser.parse_args()
+    if args.rebuild:
+        rebuild(days=args.days)
+    if args.reconcile:
+        for mismatch in reconcile_sales_summary(days=args.days or 30):
+            logger.info(f"  {mismatch}")
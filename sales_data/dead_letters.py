@@ -0,0 +1,96 @@
+import sys
+import os
+import argparse
+import logging
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db.connect import session_scope
+from db.models import AmazonOrderDetail, DeadLetter, ITEMS_DEAD, ITEMS_PENDING
+from sales_data.order_items_sync import DEAD_LETTER_STREAM as ORDER_ITEMS
+
+logger = logging.getLogger(__name__)
+
+
+def _requeue_order_items(db, keys):
+    return db.query(AmazonOrderDetail).filter(
+        AmazonOrderDetail.amazon_order_id.in_(keys),
+        AmazonOrderDetail.items_status == ITEMS_DEAD,
+    ).update({
+        AmazonOrderDetail.items_status: ITEMS_PENDING,
+        AmazonOrderDetail.items_attempts: 0,
+    }, synchronize_session=False)
+
+
+# stream: puts dead-lettered keys back where that stream picks up work
+REQUEUE = {ORDER_ITEMS: _requeue_order_items}
+
+
+def _query(db, stream, keys=None, marketplace_ids=None, error_kind=None):
+    query = db.query(DeadLetter).filter(DeadLetter.stream == stream)
+    if keys:
+        query = query.filter(DeadLetter.item_key.in_(list(keys)))
+    if marketplace_ids:
+        query = query.filter(DeadLetter.marketplace_id.in_(list(marketplace_ids)))
+    if error_kind:
+        query = query.filter(DeadLetter.error_kind == error_kind)
+    return query
+
+
+def list_dead_letters(stream=ORDER_ITEMS, marketplace_ids=None, error_kind=None, limit=100):
+    with session_scope() as db:
+        rows = _query(db, stream, marketplace_ids=marketplace_ids, error_kind=error_kind) \
+            .order_by(DeadLetter.last_failed_at.desc()).limit(limit).all()
+        return [
+            {"key": r.item_key, "marketplace_id": r.marketplace_id, "kind": r.error_kind,
+             "attempts": r.attempts, "last_failed_at": r.last_failed_at, "error": r.last_error}
+            for r in rows
+        ]
+
+
+def requeue(stream=ORDER_ITEMS, keys=None, marketplace_ids=None, error_kind=None):
+    """Hand matching dead letters back to their stream and drop them. Returns how many were requeued."""
+    with session_scope() as db:
+        query = _query(db, stream, keys, marketplace_ids, error_kind)
+        matched = [r.item_key for r in query.with_entities(DeadLetter.item_key)]
+        if not matched:
+            return 0
+        requeued = REQUEUE[stream](db, matched)
+        query.delete(synchronize_session=False)
+    logger.info(f"🔁 Requeued {requeued} of {len(matched)} dead-lettered {stream} entries")
+    return requeued
+
+
+def cli(argv=None):
+    parser = argparse.ArgumentParser(prog="nimbussync dead-letters",
+                                     description="Inspect or requeue work that exhausted its retries")
+    sub = parser.add_subparsers(dest="action", required=True)
+    for action in ("list", "requeue"):
+        p = sub.add_parser(action)
+        p.add_argument("--stream", choices=list(REQUEUE), default=ORDER_ITEMS)
+        p.add_argument("--marketplace", action="append", metavar="ID", help="only this marketplace id (repeatable)")
+        p.add_argument("--kind", choices=("throttled", "transient", "permanent"), help="only this error class")
+        if action == "list":
+            p.add_argument("--limit", type=int, default=100)
+        else:
+            p.add_argument("keys", nargs="*", help="specific keys (e.g. order ids)")
+            p.add_argument("--all", action="store_true", help="requeue everything matching the filters")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    if args.action == "list":
+        rows = list_dead_letters(args.stream, args.marketplace, args.kind, args.limit)
+        for r in rows:
+            print(f"{r['key']:<22}{r['marketplace_id'] or '':<16}{r['kind'] or '':<11}{r['attempts']:>3}  "
+                  f"{r['last_failed_at']:%Y-%m-%d %H:%M}  {(r['error'] or '')[:80]}")
+        print(f"--- {len(rows)} dead letters shown ---")
+        return 0
+
+    if not args.keys and not args.all and not args.marketplace and not args.kind:
+        parser.error("name keys to requeue, narrow with --marketplace/--kind, or pass --all")
+    requeue(args.stream, args.keys, args.marketplace, args.kind)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(cli())
@@ -0,0 +1,328 @@
+import sys
+import os
+import argparse
+import csv
+import gzip
+import json
+import logging
+import time
+from datetime import date, datetime, timezone
+
+from sqlalchemy import text
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db.connect import session_scope
+from db.models import SalesSummary, AmazonOrderDetail, AmazonOrderDetailItem
+from sales_data.marketplaces import MARKETPLACES, marketplace_name
+
+logger = logging.getLogger(__name__)
+
+# Streams tables out of Postgres into one file per (marketplace, month):
+#
+#   <out>/<dataset>/marketplace=US/month=2024-05/part.parquet   (or .csv.gz)
+#
+# Each partition's fingerprint (row count + checksum of its rows, computed
+# in the database) is kept in <out>/_manifest.json; later runs rewrite only
+# the partitions whose fingerprint changed and remove ones that vanished.
+DEFAULT_OUT = "exports"
+MANIFEST = "_manifest.json"
+CHUNK_SIZE = 10000
+FORMATS = ("parquet", "csv")
+UNKNOWN = "unknown"
+
+# name: model, FROM clause (table aliased t), marketplace and date columns.
+# Months are calendar months of the date column, in UTC for timestamptz.
+DATASETS = {
+    "sales_summary": {
+        "model": SalesSummary,
+        "from": "sales_summary t",
+        "marketplace": "t.country",
+        "date": "t.date",
+        "timestamptz": False,
+        "order_by": "t.date, t.id",
+    },
+    "orders": {
+        "model": AmazonOrderDetail,
+        "from": "amazon_orders_detail t",
+        "marketplace": "t.marketplace_id",
+        "date": "t.purchase_date",
+        "timestamptz": True,
+        "order_by": "t.purchase_date, t.id",
+    },
+    "order_items": {
+        "model": AmazonOrderDetailItem,
+        "from": "amazon_order_detail_item t JOIN amazon_orders_detail o "
+                "ON o.amazon_order_id = t.order_id AND o.purchase_date = t.purchase_date",
+        "marketplace": "o.marketplace_id",
+        "date": "t.purchase_date",
+        "timestamptz": True,
+        "order_by": "t.order_id, t.id",
+    },
+}
+
+
+def default_format():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return "csv"
+    return "parquet"
+
+
+def _month_expr(spec):
+    column = f"({spec['date']} AT TIME ZONE 'UTC')" if spec["timestamptz"] else spec["date"]
+    return f"date_trunc('month', {column})::date"
+
+
+# ───────────────────────────────────────
+# Partitions and fingerprints
+# ───────────────────────────────────────
+
+def _partition_key(marketplace, month):
+    return f"{marketplace or UNKNOWN}/{month.strftime('%Y-%m') if month else UNKNOWN}"
+
+
+def _partition_path(name, marketplace, month, fmt):
+    label = marketplace_name(marketplace) if marketplace in MARKETPLACES else (marketplace or UNKNOWN)
+    month_label = month.strftime("%Y-%m") if month else UNKNOWN
+    ext = "parquet" if fmt == "parquet" else "csv.gz"
+    return os.path.join(name, f"marketplace={label}", f"month={month_label}", f"part.{ext}")
+
+
+def partition_fingerprints(db, name, start=None, end=None):
+    """{key: (marketplace, month, fingerprint)} for every partition, without reading rows out.
+
+    With `start`/`end` (first days of months), only the months in [start, end).
+    """
+    spec = DATASETS[name]
+    where, params = _range_filter(spec, start, end) if start or end else ("TRUE", {})
+    rows = db.execute(text(f"""
+        SELECT {spec['marketplace']} AS marketplace,
+               {_month_expr(spec)} AS month,
+               count(*) AS row_count,
+               sum(hashtext(t::text)::bigint) AS checksum
+        FROM {spec['from']}
+        WHERE {where}
+        GROUP BY 1, 2
+    """), params).all()
+    return {
+        _partition_key(r.marketplace, r.month): (r.marketplace, r.month, f"{r.row_count}:{r.checksum}")
+        for r in rows
+    }
+
+
+def _range_filter(spec, start, end):
+    # A plain range on the column, so (marketplace_id, purchase_date) serves
+    # it and the planner can skip table partitions outside it
+    clauses, params = [], {}
+    for op, key, day in ((">=", "start", start), ("<", "end", end)):
+        if day:
+            clauses.append(f"{spec['date']} {op} :{key}")
+            params[key] = datetime(day.year, day.month, day.day, tzinfo=timezone.utc) if spec["timestamptz"] else day
+    return " AND ".join(clauses), params
+
+
+def _partition_filter(spec, marketplace, month):
+    clauses, params = [], {}
+    if marketplace is None:
+        clauses.append(f"{spec['marketplace']} IS NULL")
+    else:
+        clauses.append(f"{spec['marketplace']} = :marketplace")
+        params["marketplace"] = marketplace
+    if month is None:
+        clauses.append(f"{spec['date']} IS NULL")
+    else:
+        next_month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+        where, range_params = _range_filter(spec, date(month.year, month.month, 1), next_month)
+        clauses.append(where)
+        params.update(range_params)
+    return " AND ".join(clauses), params
+
+
+# ───────────────────────────────────────
+# Writers (write to a temp file, renamed into place when complete)
+# ───────────────────────────────────────
+
+class CsvWriter:
+    def __init__(self, path, columns):
+        self._file = gzip.open(path, "wt", newline="", encoding="utf-8")
+        self._csv = csv.writer(self._file)
+        self._csv.writerow([c.name for c in columns])
+
+    def write(self, rows):
+        self._csv.writerows(
+            [v.isoformat() if isinstance(v, (date, datetime)) else v for v in row] for row in rows
+        )
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetWriter:
+    """One row group per streamed chunk."""
+
+    def __init__(self, path, columns):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        self._schema = pa.schema([(c.name, _arrow_type(pa, c.type)) for c in columns])
+        self._writer = pq.ParquetWriter(path, self._schema, compression="zstd")
+
+    def write(self, rows):
+        arrays = [list(col) for col in zip(*rows)] if rows else [[] for _ in self._schema]
+        self._writer.write_table(self._pa.Table.from_arrays(arrays, schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+
+def _arrow_type(pa, sql_type):
+    type_name = type(sql_type).__name__
+    if type_name in ("Integer", "BigInteger", "SmallInteger"):
+        return pa.int64()
+    if type_name == "Numeric":
+        return pa.decimal128(sql_type.precision or 38, sql_type.scale or 0)
+    if type_name == "DateTime":
+        return pa.timestamp("us", tz="UTC") if sql_type.timezone else pa.timestamp("us")
+    if type_name == "Date":
+        return pa.date32()
+    return pa.string()
+
+
+WRITERS = {"parquet": ParquetWriter, "csv": CsvWriter}
+
+
+# ───────────────────────────────────────
+# Export
+# ───────────────────────────────────────
+
+def export_partition(db, name, marketplace, month, path, fmt, chunk_size=CHUNK_SIZE):
+    """Stream one partition through a server-side cursor into `path`. Returns rows written."""
+    spec = DATASETS[name]
+    columns = list(spec["model"].__table__.columns)
+    where, params = _partition_filter(spec, marketplace, month)
+    result = db.execute(
+        text(f"SELECT {', '.join('t.' + c.name for c in columns)} FROM {spec['from']} "
+             f"WHERE {where} ORDER BY {spec['order_by']}"),
+        params,
+        execution_options={"stream_results": True, "max_row_buffer": chunk_size},
+    )
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    writer = WRITERS[fmt](tmp, columns)
+    rows = 0
+    try:
+        for chunk in result.partitions(chunk_size):
+            writer.write([tuple(row) for row in chunk])
+            rows += len(chunk)
+    finally:
+        writer.close()
+        result.close()
+    os.replace(tmp, path)
+    return rows
+
+
+def _in_range(key, start, end):
+    if not start and not end:
+        return True
+    month = key.rsplit("/", 1)[-1]
+    return (month != UNKNOWN and (not start or month >= f"{start:%Y-%m}")
+            and (not end or month < f"{end:%Y-%m}"))
+
+
+def load_manifest(out):
+    try:
+        with open(os.path.join(out, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"datasets": {}}
+
+
+def save_manifest(out, manifest):
+    path = os.path.join(out, MANIFEST)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(f"{path}.tmp", path)
+
+
+def _remove(out, entry, reason):
+    path = os.path.join(out, entry["path"])
+    if os.path.exists(path):
+        os.remove(path)
+        logger.info(f"🗑️ Removed {path} ({reason})")
+
+
+def export(out=DEFAULT_OUT, datasets=None, fmt=None, full=False, chunk_size=CHUNK_SIZE,
+           start=None, end=None, archive=False):
+    """Write changed partitions of each dataset. Returns {dataset: (partitions written, rows)}.
+
+    `start`/`end` limit the run to the months in [start, end). With `archive`,
+    those partitions are marked as archived: their rows are about to leave
+    the database, and later runs must keep the files rather than remove them.
+    """
+    fmt = fmt or default_format()
+    datasets = datasets or list(DATASETS)
+    os.makedirs(out, exist_ok=True)
+    manifest = load_manifest(out)
+    summary = {}
+
+    for name in datasets:
+        started = time.perf_counter()
+        state = manifest["datasets"].get(name) or {"format": fmt, "partitions": {}}
+        partitions = state["partitions"]
+        if state["format"] != fmt:
+            # Archived files are the only copy left, whatever their format
+            for entry in partitions.values():
+                if not entry.get("archived"):
+                    _remove(out, entry, f"switching to {fmt}")
+            partitions = {key: entry for key, entry in partitions.items() if entry.get("archived")}
+        written = rows = 0
+        with session_scope() as db:
+            current = partition_fingerprints(db, name, start, end)
+            for key, (marketplace, month, fingerprint) in sorted(current.items()):
+                entry = partitions.get(key)
+                if full or not entry or entry["fingerprint"] != fingerprint:
+                    path = _partition_path(name, marketplace, month, fmt)
+                    count = export_partition(db, name, marketplace, month, os.path.join(out, path), fmt, chunk_size)
+                    entry = partitions[key] = {"fingerprint": fingerprint, "path": path, "rows": count,
+                                               "exported_at": datetime.now(timezone.utc).isoformat()}
+                    written += 1
+                    rows += count
+                if archive:
+                    entry["archived"] = True
+        for key in set(partitions) - set(current):
+            if partitions[key].get("archived") or not _in_range(key, start, end):
+                continue
+            _remove(out, partitions.pop(key), "partition no longer has rows")
+
+        manifest["datasets"][name] = {"format": fmt, "partitions": partitions}
+        # Saved per dataset, so an interrupted run keeps what it finished
+        save_manifest(out, manifest)
+        summary[name] = (written, rows)
+        logger.info(f"📦 {name}: {written}/{len(current)} partitions rewritten, {rows} rows "
+                    f"({time.perf_counter() - started:.1f}s)")
+    return summary
+
+
+def cli(argv=None):
+    parser = argparse.ArgumentParser(prog="nimbussync export",
+                                     description="Export tables as Parquet/CSV partitions by marketplace and month")
+    parser.add_argument("--out", default=DEFAULT_OUT, help=f"output directory (default: {DEFAULT_OUT})")
+    parser.add_argument("--datasets", nargs="+", choices=list(DATASETS), default=list(DATASETS))
+    parser.add_argument("--format", choices=FORMATS, default=None,
+                        help="default: parquet if pyarrow is installed, else gzip CSV")
+    parser.add_argument("--full", action="store_true", help="rewrite every partition, not only changed ones")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="rows fetched per round trip")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    if args.format == "parquet" and default_format() != "parquet":
+        parser.error("--format parquet needs pyarrow (pip install pyarrow)")
+    export(args.out, args.datasets, args.format, args.full, args.chunk_size)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(cli())
@@ -1,31 +1,42 @@
 import sys
 import os
+import argparse
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta, timezone
-import pandas as pd
-from sqlalchemy.exc import IntegrityError
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from client_config import CREDENTIALS as credentials
-from sp_api.api import Sales
-from sp_api.base import Granularity, Marketplaces
-from sp_api.auth.exceptions import AuthorizationError
-from db.connect import SessionLocal
-from db.models import SalesSummary
+from db.connect import session_scope
+from db.models import SalesSummary, BackfillWindow
+from utils.rate_limiter import call_limited
+from utils.sp_clients import get_client, load_credentials
+from utils import metrics
+from sales_data.marketplaces import marketplace_region, sp_marketplaces
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+BACKFILL_STREAM = "sales_summary"
+# Amazon keeps revising the most recent days, so windows that end inside this
+# margin are refetched on every run instead of being recorded as complete.
+REVISION_DAYS = 3
+WINDOW_EPOCH = datetime(2000, 1, 1)
+
+
 # Function to fetch and format sales data
-def fetch_sales_data(start_date, end_date, country, credentials):
-    res = Sales(credentials=credentials, marketplace=country)
+def fetch_sales_data(start_date, end_date, country, credentials, region=None):
+    from sp_api.api import Sales
+    from sp_api.base import Granularity
+    from sp_api.auth.exceptions import AuthorizationError
+
+    res = get_client(Sales, region, country, credentials)
     try:
-        data = res.get_order_metrics(granularity=Granularity.DAY, interval=(start_date, end_date))
+        data = call_limited(region, "getOrderMetrics", res.get_order_metrics,
+                            granularity=Granularity.DAY, interval=(start_date, end_date))
     except AuthorizationError as e:
         logger.error(f"Authorization error for {country.name}: {e}")
-        return []
+        return None
 
     rows = []
     if data.payload:
@@ -43,69 +54,136 @@ def fetch_sales_data(start_date, end_date, country, credentials):
 
     return rows
 
-# DB session
-session = SessionLocal()
-
-# Define start and end dates
-end_date = datetime.now(timezone.utc)
-start_date = end_date - timedelta(days=720)
-
-start_str = start_date.strftime('%Y-%m-%dT%H:%M:%SZ')
-end_str = end_date.strftime('%Y-%m-%dT%H:%M:%SZ')
-
-# Define a mapping of marketplaces to their corresponding credentials
-marketplace_credentials = {
-    Marketplaces.US: credentials["North America"],
-    Marketplaces.CA: credentials["North America"],
-    Marketplaces.MX: credentials["North America"],
-    Marketplaces.DE: credentials["Europe"],
-    Marketplaces.FR: credentials["Europe"],
-    Marketplaces.IT: credentials["Europe"],
-    Marketplaces.ES: credentials["Europe"],
-    Marketplaces.NL: credentials["Europe"],
-    Marketplaces.BE: credentials["Europe"],
-    Marketplaces.SE: credentials["Europe"],
-    Marketplaces.PL: credentials["Europe"],
-    Marketplaces.TR: credentials["Europe"],
-    Marketplaces.UK: credentials["Europe"],
-    Marketplaces.JP: credentials["Far East"],
-    Marketplaces.AU: credentials["Australia"]
-}
-
-# List of marketplaces to fetch data for
-marketplaces = list(marketplace_credentials.keys())
-
-# Fetch data and store in DB and Excel
-all_data = []
-inserted = 0
-skipped = 0
-
-for marketplace in marketplaces:
-    logger.info(f"Fetching data for {marketplace.name}...")
-    country_data = fetch_sales_data(start_str, end_str, marketplace, marketplace_credentials[marketplace])
-    for row in country_data:
-        try:
-            obj = SalesSummary(
-                date=datetime.strptime(row['Date'], '%Y-%m-%d'),
-                average_unit_price=row['Average Unit Price'],
-                order_item_count=row['Order Item Count'],
-                unit_count=row['Unit Count'],
-                total_sales=row['Total Sales'],
-                currency=row['Currency'],
-                country=row['Country']
-            )
-            session.add(obj)
-            session.commit()
-            inserted += 1
-        except IntegrityError:
-            session.rollback()
-            skipped += 1
-    all_data.extend(country_data)
-
-logger.info(f"Inserted: {inserted}, Skipped (duplicates or errors): {skipped}")
-
-# Save to Excel
-df = pd.DataFrame(all_data)
-excel_filename = 'sales_data.xlsx'
-df.to_excel(excel_filename, index=False)
-logger.info(f"Data has been written to {excel_filename}")
+
+def plan_windows(start, end, window_days):
+    """Split [start, end) into windows aligned to WINDOW_EPOCH, so boundaries stay stable across runs."""
+    step = timedelta(days=window_days)
+    cursor = WINDOW_EPOCH + ((start - WINDOW_EPOCH) // step) * step
+    windows = []
+    while cursor < end:
+        window_end = min(cursor + step, end)
+        windows.append((cursor, window_end))
+        cursor = window_end
+    return windows
+
+
+def completed_windows(db, marketplace, stream=BACKFILL_STREAM):
+    rows = db.query(BackfillWindow.window_start, BackfillWindow.window_end).filter(
+        BackfillWindow.stream == stream,
+        BackfillWindow.marketplace_id == marketplace.marketplace_id,
+    ).all()
+    return {(r.window_start, r.window_end) for r in rows}
+
+
+def store_window(db, marketplace, window_start, window_end, rows, final):
+    """Replace the window's SalesSummary rows in bulk and record it in one transaction."""
+    try:
+        db.query(SalesSummary).filter(
+            SalesSummary.country == marketplace.name,
+            SalesSummary.date >= window_start,
+            SalesSummary.date < window_end,
+        ).delete(synchronize_session=False)
+        db.bulk_insert_mappings(SalesSummary, [
+            {
+                "date": datetime.strptime(row['Date'], '%Y-%m-%d').date(),
+                "average_unit_price": row['Average Unit Price'],
+                "order_item_count": row['Order Item Count'],
+                "unit_count": row['Unit Count'],
+                "total_sales": row['Total Sales'],
+                "currency": row['Currency'],
+                "country": row['Country'],
+            }
+            for row in rows
+        ])
+        metrics.record_rows(SalesSummary.__tablename__, inserted=len(rows))
+        if final:
+            db.merge(BackfillWindow(
+                stream=BACKFILL_STREAM,
+                marketplace_id=marketplace.marketplace_id,
+                window_start=window_start,
+                window_end=window_end,
+                row_count=len(rows),
+            ))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+
+def backfill_window(marketplace, window_start, window_end, final):
+    start_str = window_start.strftime('%Y-%m-%dT%H:%M:%SZ')
+    end_str = window_end.strftime('%Y-%m-%dT%H:%M:%SZ')
+    region = marketplace_region(marketplace.marketplace_id)
+    rows = fetch_sales_data(start_str, end_str, marketplace, load_credentials()[region], region)
+    if rows is None:
+        return None
+    with session_scope() as db:
+        store_window(db, marketplace, window_start, window_end, rows, final)
+    return len(rows)
+
+
+def backfill(days=720, window_days=30, max_workers=4, marketplaces=None):
+    marketplaces = marketplaces or sp_marketplaces()
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+    end = today + timedelta(days=1)
+    start = today - timedelta(days=days)
+    final_before = today - timedelta(days=REVISION_DAYS)
+
+    jobs = []
+    with session_scope() as db:
+        for marketplace in marketplaces:
+            done = completed_windows(db, marketplace)
+            for window in plan_windows(start, end, window_days):
+                if window not in done:
+                    jobs.append((marketplace, window[0], window[1]))
+
+    logger.info(f"Backfilling {len(jobs)} windows of {window_days} days across {len(marketplaces)} marketplaces "
+                f"[max workers: {max_workers}]")
+    inserted = 0
+    failed = 0
+    started = time.perf_counter()
+    # Windows of different regions overlap freely; the shared limiter keeps
+    # each region within its getOrderMetrics quota.
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="backfill") as pool:
+        futures = {
+            pool.submit(backfill_window, mp, ws, we, we <= final_before): (mp, ws, we)
+            for mp, ws, we in jobs
+        }
+        for future in as_completed(futures):
+            mp, ws, we = futures[future]
+            try:
+                count = future.result()
+            except Exception as e:
+                count = None
+                logger.error(f"❌ {mp.name} {ws.date()}→{we.date()} failed: {e}")
+            if count is None:
+                failed += 1
+                continue
+            inserted += count
+            logger.info(f"✅ {mp.name} {ws.date()}→{we.date()}: {count} rows")
+
+    logger.info(f"Inserted: {inserted}, failed windows: {failed} "
+                f"({time.perf_counter() - started:.1f}s). Rerun to retry failed windows.")
+    return inserted, failed
+
+
+def cli(argv=None):
+    parser = argparse.ArgumentParser(prog="nimbussync backfill",
+                                     description="Backfill daily SalesSummary rows from getOrderMetrics")
+    parser.add_argument("--days", type=int, default=720)
+    parser.add_argument("--window-days", type=int, default=30)
+    parser.add_argument("--max-workers", type=int, default=4)
+    parser.add_argument("--export", metavar="DIR",
+                        help="then export changed SalesSummary partitions to DIR (see `nimbussync export`)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    metrics.install_exporters()
+    _, failed = backfill(days=args.days, window_days=args.window_days, max_workers=args.max_workers)
+    if args.export:
+        from sales_data.export import export
+        export(args.export, datasets=["sales_summary"])
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(cli())
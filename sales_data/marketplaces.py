@@ -0,0 +1,46 @@
+# Plain-data marketplace reference keyed by marketplace id, usable from SQL-side
+# code without importing sp_api.
+# marketplace_id: (name, timezone, credential region)
+MARKETPLACES = {
+    "ATVPDKIKX0DER": ("US", "America/Los_Angeles", "North America"),
+    "A2EUQ1WTGCTBG2": ("CA", "America/Los_Angeles", "North America"),
+    "A1AM78C64UM0Y8": ("MX", "America/Mexico_City", "North America"),
+    "A1PA6795UKMFR9": ("DE", "Europe/Berlin", "Europe"),
+    "A13V1IB3VIYZZH": ("FR", "Europe/Paris", "Europe"),
+    "APJ6JRA9NG5V4": ("IT", "Europe/Rome", "Europe"),
+    "A1RKKUPIHCS9HS": ("ES", "Europe/Madrid", "Europe"),
+    "A1805IZSGTT6HS": ("NL", "Europe/Amsterdam", "Europe"),
+    "AMEN7PMS3EDWL": ("BE", "Europe/Brussels", "Europe"),
+    "A2NODRKZP88ZB9": ("SE", "Europe/Stockholm", "Europe"),
+    "A1C3SOZRARQ6R3": ("PL", "Europe/Warsaw", "Europe"),
+    "A33AVAJ2PDY3EV": ("TR", "Europe/Istanbul", "Europe"),
+    "A1F83G8C2ARO7P": ("UK", "Europe/London", "Europe"),
+    "A1VC38T7YXB528": ("JP", "Asia/Tokyo", "Far East"),
+    "A39IBJ37TRP1C6": ("AU", "Australia/Sydney", "Australia"),
+}
+
+
+def marketplace_name(marketplace_id):
+    return MARKETPLACES[marketplace_id][0]
+
+
+def marketplace_timezone(marketplace_id):
+    return MARKETPLACES[marketplace_id][1]
+
+
+def marketplace_region(marketplace_id):
+    return MARKETPLACES[marketplace_id][2]
+
+
+def marketplace_ids(region=None):
+    return [mp_id for mp_id, (_, _, mp_region) in MARKETPLACES.items() if region is None or mp_region == region]
+
+
+def sp_marketplace(marketplace_id):
+    """sp_api's Marketplaces member for this id (imports sp_api on first use)."""
+    from sp_api.base import Marketplaces
+    return Marketplaces[marketplace_name(marketplace_id)]
+
+
+def sp_marketplaces(ids=None):
+    return [sp_marketplace(mp_id) for mp_id in MARKETPLACES if not ids or mp_id in ids]
@@ -1,117 +1,644 @@
 
 import sys
 import os
+import argparse
+import hashlib
 import logging
+import queue
+import threading
 import time
-from sqlalchemy.exc import IntegrityError
-from sqlalchemy import not_
-
-from sp_api.api import Orders
-from sp_api.base import Marketplaces, SellingApiException
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from db.connect import SessionLocal
-from db.models import AmazonOrderDetail, AmazonOrderDetailItem
-from client_config import CREDENTIALS as credentials
+from sqlalchemy import text
+
+from db import job_queue, partitions
+from db.bulk import upsert
+from db.connect import ScopedSession, session_scope
+from db.models import AmazonOrderDetail, AmazonOrderDetailItem, DeadLetter, ITEMS_PENDING, ITEMS_FETCHED, ITEMS_DEAD
+from utils.rate_limiter import call_limited
+from utils.retry import RetryError, backoff_delay, call_with_retries, classify
+from utils.sp_clients import get_client, load_credentials
+from utils import metrics
+from sales_data.daily_aggregates import line_groups, refresh_for_orders
+from sales_data.marketplaces import MARKETPLACES, marketplace_region, sp_marketplace
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-session = SessionLocal()
-
-marketplace_region_map = {
-    "North America": [Marketplaces.US, Marketplaces.CA, Marketplaces.MX],
-    "Europe": [Marketplaces.DE, Marketplaces.FR, Marketplaces.IT, Marketplaces.ES,
-               Marketplaces.NL, Marketplaces.BE, Marketplaces.SE, Marketplaces.PL,
-               Marketplaces.TR, Marketplaces.UK],
-    "Far East": [Marketplaces.JP],
-    "Australia": [Marketplaces.AU],
-}
-
-def get_unfetched_order_ids(limit=100):
-    subquery = session.query(AmazonOrderDetailItem.order_id).distinct()
-    orders = session.query(AmazonOrderDetail).filter(
-        not_(AmazonOrderDetail.amazon_order_id.in_(subquery))
-    ).limit(limit).all()
-    return orders
-
-def fetch_order_items(order_id, creds, marketplace):
-    try:
-        api = Orders(credentials=creds, marketplace=marketplace)
-        res = api.get_order_items(order_id)
-        return res.payload.get("OrderItems", [])
-    except SellingApiException as e:
-        logger.warning(f"QuotaExceeded or API error on order {order_id}: {e}")
-        time.sleep(60)
-        return fetch_order_items(order_id, creds, marketplace)
-    except Exception as e:
-        logger.error(f"Unexpected error on {order_id}: {e}")
-        return []
+# Attempts per fetch within a run (with backoff), and fetches across runs
+# before an order is dead-lettered
+MAX_API_RETRIES = 3
+MAX_ITEM_ATTEMPTS = 5
+DEAD_LETTER_STREAM = "order_items"
+
+# Items are keyed on (order_id, order_item_id), plus purchase_date as the
+# partition key; content_hash covers these fields, so a re-fetched line is
+# only written when one of them changed.
+ITEM_KEY = ["order_id", "order_item_id", "purchase_date"]
+ITEM_HASHED_COLUMNS = ("asin", "seller_sku", "title", "quantity_ordered", "item_price", "item_currency",
+                       "shipping_price", "shipping_currency", "country", "unit_price")
+ITEM_UPDATE_COLUMNS = list(ITEM_HASHED_COLUMNS) + ["content_hash"]
+
+def get_unfetched_order_ids(limit=100, after_id=0, db=None, marketplace_ids=None):
+    # Keyset page over the partial index on pending orders: the cost of the
+    # next batch doesn't depend on how many orders or items already exist.
+    db = db or ScopedSession()
+    query = db.query(
+        AmazonOrderDetail.id,
+        AmazonOrderDetail.amazon_order_id,
+        AmazonOrderDetail.marketplace_id,
+        AmazonOrderDetail.items_attempts,
+        AmazonOrderDetail.purchase_date,
+    ).filter(
+        AmazonOrderDetail.items_status == ITEMS_PENDING,
+        AmazonOrderDetail.id > after_id,
+    )
+    if marketplace_ids:
+        query = query.filter(AmazonOrderDetail.marketplace_id.in_(list(marketplace_ids)))
+    return query.order_by(AmazonOrderDetail.id).limit(limit).all()
+
+def fetch_order_items(order_id, creds, marketplace, region=None):
+    """Returns the order's items; raises RetryError once retrying can't help."""
+    from sp_api.api import Orders
+
+    api = get_client(Orders, region, marketplace, creds)
+    # Throttling is absorbed by the shared (region, getOrderItems) bucket first
+    res = call_with_retries(call_limited, region, "getOrderItems", api.get_order_items, order_id,
+                            max_attempts=MAX_API_RETRIES, label=f"order {order_id}",
+                            operation="getOrderItems", region=region)
+    return res.payload.get("OrderItems", [])
 
-def insert_items(order_id, items, country):
-    inserted = 0
-    objects = []
-    for item in items:
+def content_hash(row):
+    joined = "\x1f".join("" if row[c] is None else str(row[c]) for c in ITEM_HASHED_COLUMNS)
+    return hashlib.blake2b(joined.encode(), digest_size=8).hexdigest()
+
+def build_item_rows(order_id, items, country):
+    rows = []
+    for n, item in enumerate(items):
         try:
             qty = item.get("QuantityOrdered", 1)
             item_price = item.get("ItemPrice", {}).get("Amount")
             unit_price = float(item_price) / qty if item_price and qty else None
 
-            obj = AmazonOrderDetailItem(
-                order_id=order_id,
-                asin=item.get("ASIN"),
-                seller_sku=item.get("SellerSKU"),
-                title=item.get("Title"),
-                quantity_ordered=qty,
-                item_price=item_price,
-                item_currency=item.get("ItemPrice", {}).get("CurrencyCode"),
-                shipping_price=item.get("ShippingPrice", {}).get("Amount"),
-                shipping_currency=item.get("ShippingPrice", {}).get("CurrencyCode"),
-                country=country,
-                unit_price=unit_price
-            )
-            objects.append(obj)
+            row = {
+                "order_id": order_id,
+                # Every getOrderItems line has one; the position keeps the key unique if not
+                "order_item_id": item.get("OrderItemId") or f"#{n}",
+                "asin": item.get("ASIN"),
+                "seller_sku": item.get("SellerSKU"),
+                "title": item.get("Title"),
+                "quantity_ordered": qty,
+                "item_price": item_price,
+                "item_currency": item.get("ItemPrice", {}).get("CurrencyCode"),
+                "shipping_price": item.get("ShippingPrice", {}).get("Amount"),
+                "shipping_currency": item.get("ShippingPrice", {}).get("CurrencyCode"),
+                "country": country,
+                "unit_price": unit_price,
+            }
+            row["content_hash"] = content_hash(row)
+            rows.append(row)
         except Exception as e:
             logger.warning(f"Skipping item in order {order_id} due to error: {e}")
             continue
-    session.bulk_save_objects(objects)
-    session.commit()
-    return len(objects)
+    return rows
+
+def mark_items_fetched(db, dates):
+    """Flag these orders ({order_id: purchase_date}) as fetched."""
+    db.query(AmazonOrderDetail).filter(
+        AmazonOrderDetail.amazon_order_id.in_(list(dates)),
+        partitions.within(AmazonOrderDetail.purchase_date, dates.values()),
+    ).update({
+        AmazonOrderDetail.items_status: ITEMS_FETCHED,
+        AmazonOrderDetail.items_attempts: AmazonOrderDetail.items_attempts + 1,
+        AmazonOrderDetail.items_fetched_at: datetime.now(timezone.utc),
+    }, synchronize_session=False)
+
+def mark_items_failed(db, failures, dates):
+    """Count a failed fetch per order ({order_id: RetryError}); dead-letter the ones to give up on.
+
+    `dates` holds their purchase dates ({order_id: purchase_date}). Returns
+    the ids of the orders dead-lettered.
+    """
+    table = AmazonOrderDetail.__table__
+    in_months = partitions.within(table.c.purchase_date, [dates[order_id] for order_id in failures])
+    rows = db.execute(
+        table.update()
+        .where(table.c.amazon_order_id.in_(list(failures)), in_months)
+        .values(items_attempts=table.c.items_attempts + 1)
+        .returning(table.c.amazon_order_id, table.c.marketplace_id, table.c.items_attempts)
+    ).all()
+    dead = [r for r in rows if failures[r.amazon_order_id].poison or r.items_attempts >= MAX_ITEM_ATTEMPTS]
+    if not dead:
+        return []
+    # Out of the pending partial index, so later runs never see them
+    db.execute(
+        table.update()
+        .where(table.c.amazon_order_id.in_([r.amazon_order_id for r in dead]), in_months)
+        .values(items_status=ITEMS_DEAD)
+    )
+    now = datetime.now(timezone.utc)
+    upsert(db, DeadLetter, [
+        {
+            "stream": DEAD_LETTER_STREAM,
+            "item_key": r.amazon_order_id,
+            "marketplace_id": r.marketplace_id,
+            "error_kind": failures[r.amazon_order_id].kind,
+            "last_error": str(failures[r.amazon_order_id].error)[:2000],
+            "attempts": r.items_attempts,
+            "last_failed_at": now,
+        }
+        for r in dead
+    ], ["stream", "item_key"], ["marketplace_id", "error_kind", "last_error", "attempts", "last_failed_at"])
+    logger.warning(f"☠️ Dead-lettered {len(dead)} orders: {', '.join(r.amazon_order_id for r in dead[:5])}"
+                   f"{' …' if len(dead) > 5 else ''}")
+    return [r.amazon_order_id for r in dead]
+
+def purchase_dates(db, order_ids):
+    """{order_id: purchase_date}, for callers that only have ids. Probes every partition."""
+    # amazon_order_id is only unique together with purchase_date. Amazon doesn't
+    # reuse order ids, so each should appear once; should one ever appear twice,
+    # the latest purchase wins rather than an arbitrary one.
+    return dict(db.query(AmazonOrderDetail.amazon_order_id, AmazonOrderDetail.purchase_date).filter(
+        AmazonOrderDetail.amazon_order_id.in_(list(order_ids))
+    ).order_by(AmazonOrderDetail.purchase_date).all())
+
+def delete_items(db, dates):
+    # Orders re-loaded from a report already have items; replace them
+    db.query(AmazonOrderDetailItem).filter(
+        AmazonOrderDetailItem.order_id.in_(list(dates)),
+        partitions.within(AmazonOrderDetailItem.purchase_date, dates.values()),
+    ).delete(synchronize_session=False)
+
+def write_items(db, dates, rows):
+    """Diff fetched rows against the stored hashes of these orders and write only the difference.
+
+    `dates` maps each order id to its purchase date: lines share their order's
+    partition, and the dates keep every lookup to those months.
+
+    Returns (written, deleted, unchanged, {order_id: purchase_date} of orders
+    whose items changed, aggregate groups the deleted and rewritten lines
+    counted towards before).
+    """
+    if not dates:
+        return 0, 0, 0, {}, set()
+    in_months = partitions.within(AmazonOrderDetailItem.purchase_date, dates.values())
+    stored = {}
+    stale = {}
+    for r in db.query(
+        AmazonOrderDetailItem.id, AmazonOrderDetailItem.order_id,
+        AmazonOrderDetailItem.order_item_id, AmazonOrderDetailItem.content_hash,
+    ).filter(
+        AmazonOrderDetailItem.order_id.in_(list(dates)),
+        in_months,
+    ):
+        if r.order_item_id is None:
+            stale[r.id] = r.order_id  # unkeyed row from before items had a key
+        else:
+            stored[(r.order_id, r.order_item_id)] = (r.id, r.content_hash)
+
+    changed = [
+        row for row in rows
+        if stored.get((row["order_id"], row["order_item_id"]), (None, None))[1] != row["content_hash"]
+    ]
+    fetched = {(row["order_id"], row["order_item_id"]) for row in rows}
+    # Lines no longer on the order
+    stale.update({item_id: key[0] for key, (item_id, _) in stored.items() if key not in fetched})
+
+    # A rewritten line may have moved to another ASIN/SKU, leaving its old group to recompute
+    replaced = list(stale) + [
+        stored[key][0] for key in ((row["order_id"], row["order_item_id"]) for row in changed) if key in stored
+    ]
+    groups = line_groups(db, dates, replaced) if replaced else set()
+    if stale:
+        db.query(AmazonOrderDetailItem).filter(
+            AmazonOrderDetailItem.id.in_(list(stale)),
+            in_months,
+        ).delete(synchronize_session=False)
+    written = 0
+    if changed:
+        for row in changed:
+            row["purchase_date"] = dates[row["order_id"]]
+        written = sum(upsert(db, AmazonOrderDetailItem, changed, ITEM_KEY, ITEM_UPDATE_COLUMNS))
+    touched = {row["order_id"] for row in changed} | set(stale.values())
+    return written, len(stale), len(rows) - len(changed), {k: dates[k] for k in touched}, groups
+
+def write_order_items(order_id, purchase_date, items, country):
+    rows = build_item_rows(order_id, items, country)
+    db = ScopedSession()
+    try:
+        written, _, _, touched, groups = write_items(db, {order_id: purchase_date}, rows)
+        # Flip the work-tracking state in the same transaction as the items
+        mark_items_fetched(db, {order_id: purchase_date})
+        refresh_for_orders(db, touched, groups)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return written, len(rows) - written
+
+def record_failed_attempt(order_id, purchase_date, error):
+    db = ScopedSession()
+    try:
+        mark_items_failed(db, {order_id: error}, {order_id: purchase_date})
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+def requeue_recent(days, marketplace_ids=None):
+    """Queue orders purchased in the last `days` for another fetch; unchanged lines cost no writes."""
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+    with session_scope() as db:
+        query = db.query(AmazonOrderDetail).filter(
+            AmazonOrderDetail.purchase_date >= since,
+            AmazonOrderDetail.items_status == ITEMS_FETCHED,
+        )
+        if marketplace_ids:
+            query = query.filter(AmazonOrderDetail.marketplace_id.in_(list(marketplace_ids)))
+        count = query.update({
+            AmazonOrderDetail.items_status: ITEMS_PENDING,
+            AmazonOrderDetail.items_attempts: 0,
+        }, synchronize_session=False)
+    logger.info(f"🔁 Re-queued {count} orders from the last {days} days for an item refresh")
+    return count
 
 def get_marketplace_by_id(marketplace_id):
-    for region, mks in marketplace_region_map.items():
-        for m in mks:
-            if m.marketplace_id == marketplace_id:
-                return m, region
-    return None, None
+    if marketplace_id not in MARKETPLACES:
+        return None, None
+    return sp_marketplace(marketplace_id), marketplace_region(marketplace_id)
 
 def main():
-    total_inserted = 0
-    while True:
-        orders = get_unfetched_order_ids()
-        if not orders:
-            logger.info("🟢 No more orders to fetch. Exiting.")
-            break
-
-        logger.info(f"📦 Found {len(orders)} orders without items.")
-        for order in orders:
-            marketplace, region = get_marketplace_by_id(order.marketplace_id)
-            if not marketplace or region not in credentials:
-                logger.warning(f"Skipping order {order.amazon_order_id}: unknown marketplace or missing creds.")
-                continue
+    credentials = load_credentials()
+    total_written = 0
+    last_id = 0
+    try:
+        while True:
+            orders = get_unfetched_order_ids(after_id=last_id)
+            ScopedSession.commit()  # release the read snapshot before the API calls
+            if not orders:
+                logger.info("🟢 No more orders to fetch. Exiting.")
+                break
+
+            logger.info(f"📦 Found {len(orders)} orders without items.")
+            for order in orders:
+                last_id = order.id
+                marketplace, region = get_marketplace_by_id(order.marketplace_id)
+                if not marketplace or region not in credentials:
+                    logger.warning(f"Skipping order {order.amazon_order_id}: unknown marketplace or missing creds.")
+                    continue
+
+                creds = credentials[region]
+                logger.info(f"📦 Fetching items for order {order.amazon_order_id} in {marketplace.name}")
+                try:
+                    items = fetch_order_items(order.amazon_order_id, creds, marketplace, region)
+                except RetryError as e:
+                    record_failed_attempt(order.amazon_order_id, order.purchase_date, e)
+                    logger.warning(f"⚠️ Could not fetch items for order {order.amazon_order_id}: {e}")
+                    continue
+                written, unchanged = write_order_items(order.amazon_order_id, order.purchase_date, items,
+                                                       country=marketplace.name)
+                logger.info(f"✅ Wrote {written} items for order {order.amazon_order_id} ({unchanged} unchanged)")
+                total_written += written
+    finally:
+        ScopedSession.remove()
+
+    logger.info(f"🎉 Done. Total items written: {total_written}")
+
+# ───────────────────────────────────────
+# Pipelined mode: feeder → N fetch workers → single batched writer
+# ───────────────────────────────────────
+
+_DONE = object()
+
+class StageStats:
+    """Busy-time accounting for one pipeline stage."""
+
+    def __init__(self, name, threads=1):
+        self.name = name
+        self.threads = threads
+        self.items = 0
+        self._busy = 0.0
+        self._lock = threading.Lock()
 
-            creds = credentials[region]
-            logger.info(f"📦 Fetching items for order {order.amazon_order_id} in {marketplace.name}")
-            items = fetch_order_items(order.amazon_order_id, creds, marketplace)
-            inserted = insert_items(order.amazon_order_id, items, country=marketplace.name)
-            logger.info(f"✅ Inserted {inserted} items for order {order.amazon_order_id}")
-            total_inserted += inserted
-            time.sleep(1)
+    def add(self, seconds, items=1):
+        with self._lock:
+            self._busy += seconds
+            self.items += items
+
+    def utilization(self, elapsed):
+        with self._lock:
+            return self._busy / (elapsed * self.threads) if elapsed > 0 else 0.0
+
+def _feeder(fetch_q, stats, stop, batch_size, marketplace_ids=None):
+    credentials = load_credentials()
+    last_id = 0
+    with session_scope() as db:
+        while not stop.is_set():
+            started = time.perf_counter()
+            orders = get_unfetched_order_ids(limit=batch_size, after_id=last_id, db=db,
+                                             marketplace_ids=marketplace_ids)
+            db.rollback()  # don't hold a snapshot open while the queue is full
+            stats.add(time.perf_counter() - started, len(orders))
+            if not orders:
+                break
+            for order in orders:
+                last_id = order.id
+                marketplace, region = get_marketplace_by_id(order.marketplace_id)
+                if not marketplace or region not in credentials:
+                    logger.warning(f"Skipping order {order.amazon_order_id}: unknown marketplace or missing creds.")
+                    continue
+                fetch_q.put((order.amazon_order_id, order.purchase_date, marketplace, region))
+
+def _as_retry_error(error):
+    # Anything fetch_order_items lets through unclassified still counts as a failed attempt
+    return error if isinstance(error, RetryError) else RetryError(classify(error), error, 1)
+
+def _fetch_worker(fetch_q, write_q, stats):
+    # The writer waits for one _DONE per worker, so it is posted however this exits
+    try:
+        credentials = load_credentials()
+        while True:
+            job = fetch_q.get()
+            if job is _DONE:
+                return
+            order_id, purchase_date, marketplace, region = job
+            started = time.perf_counter()
+            items, error = None, None
+            try:
+                items = fetch_order_items(order_id, credentials[region], marketplace, region)
+            except Exception as e:
+                error = _as_retry_error(e)
+            stats.add(time.perf_counter() - started)
+            write_q.put((order_id, purchase_date, marketplace.name, items, error))
+    except Exception as e:
+        logger.error(f"❌ Fetch worker failed: {e}")
+        raise
+    finally:
+        write_q.put(_DONE)
+
+def _flush(db, dates, fetched, failed, rows, stats):
+    if not fetched and not failed:
+        return 0
+    started = time.perf_counter()
+    written = deleted = unchanged = dead = 0
+    try:
+        if fetched:
+            fetched_dates = {order_id: dates[order_id] for order_id in fetched}
+            written, deleted, unchanged, touched, groups = write_items(db, fetched_dates, rows)
+            mark_items_fetched(db, fetched_dates)
+            refresh_for_orders(db, touched, groups)
+        if failed:
+            dead = len(mark_items_failed(db, failed, dates))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    stats.add(time.perf_counter() - started, len(rows))
+    logger.info(f"💾 Flushed {len(fetched)} orders: {written} items written, {unchanged} unchanged, "
+                f"{deleted} removed ({len(failed)} failed fetches, {dead} dead-lettered)")
+    return written
+
+def _writer(write_q, workers, stats, batch_size, result):
+    dates, fetched, failed, rows = {}, [], {}, []
+    finished_workers = 0
+    try:
+        with session_scope() as db:
+            while finished_workers < workers:
+                try:
+                    entry = write_q.get(timeout=5)
+                except queue.Empty:
+                    # Don't let a slow API trickle sit unflushed
+                    result["written"] += _flush(db, dates, fetched, failed, rows, stats)
+                    dates, fetched, failed, rows = {}, [], {}, []
+                    continue
+                if entry is _DONE:
+                    finished_workers += 1
+                    continue
+                order_id, purchase_date, country, items, error = entry
+                dates[order_id] = purchase_date
+                if error is not None:
+                    failed[order_id] = error
+                else:
+                    fetched.append(order_id)
+                    rows.extend(build_item_rows(order_id, items, country))
+                if len(rows) >= batch_size or len(fetched) + len(failed) >= batch_size:
+                    result["written"] += _flush(db, dates, fetched, failed, rows, stats)
+                    dates, fetched, failed, rows = {}, [], {}, []
+            result["written"] += _flush(db, dates, fetched, failed, rows, stats)
+    except Exception as e:
+        result["error"] = e
+        logger.error(f"❌ Writer failed: {e}")
+
+def _report(stages, fetch_q, write_q, started):
+    elapsed = time.perf_counter() - started
+    usage = ", ".join(f"{st.name} {st.utilization(elapsed):.0%} ({st.items})" for st in stages)
+    logger.info(
+        f"📈 queues: fetch={fetch_q.qsize()}/{fetch_q.maxsize} write={write_q.qsize()}/{write_q.maxsize} "
+        f"| utilization: {usage} | {elapsed:.0f}s"
+    )
+
+def main_pipeline(workers=4, queue_size=200, batch_size=500, report_every=30, marketplace_ids=None):
+    """Fetch items for pending orders (optionally only these marketplaces). Returns items written."""
+    fetch_q = queue.Queue(maxsize=queue_size)
+    write_q = queue.Queue(maxsize=queue_size)
+    feeder_stats = StageStats("feeder")
+    fetch_stats = StageStats("fetch", threads=workers)
+    writer_stats = StageStats("writer")
+    stages = [feeder_stats, fetch_stats, writer_stats]
+    result = {"written": 0}
+    stop = threading.Event()
+
+    logger.info(f"🚀 Starting item pipeline: {workers} fetch workers, queue size {queue_size}, batch size {batch_size}")
+    started = time.perf_counter()
+
+    fetchers = [
+        threading.Thread(target=_fetch_worker, args=(fetch_q, write_q, fetch_stats), name=f"fetch-{i}", daemon=True)
+        for i in range(workers)
+    ]
+    writer = threading.Thread(target=_writer, args=(write_q, workers, writer_stats, batch_size, result),
+                              name="writer", daemon=True)
+    for t in fetchers + [writer]:
+        t.start()
+
+    def feed():
+        try:
+            _feeder(fetch_q, feeder_stats, stop, batch_size, marketplace_ids)
+        finally:
+            for _ in fetchers:
+                fetch_q.put(_DONE)
+
+    feeder = threading.Thread(target=feed, name="feeder", daemon=True)
+    feeder.start()
+
+    try:
+        while writer.is_alive():
+            writer.join(timeout=report_every)
+            if writer.is_alive():
+                _report(stages, fetch_q, write_q, started)
+    except KeyboardInterrupt:
+        stop.set()
+        raise
+
+    _report(stages, fetch_q, write_q, started)
+    if "error" in result:
+        stop.set()
+        raise RuntimeError(f"Item pipeline aborted: {result['error']}")
+    logger.info(f"🎉 Done. Total items written: {result['written']} in {time.perf_counter() - started:.1f}s")
+    return result["written"]
+
+# ───────────────────────────────────────
+# Queue mode: any number of workers, on any number of nodes, sharing the jobs table
+# ───────────────────────────────────────
+
+QUEUE_KIND = "order_items"
+IDLE_SECONDS = 30
+
+_REGION_VALUES = ", ".join(f"('{mp_id}', '{region}')" for mp_id, (_, _, region) in MARKETPLACES.items())
+
+def enqueue_pending(db, marketplace_ids=None):
+    """Add a job for every pending order that has none yet. Returns how many were added."""
+    marketplace_filter = "AND o.marketplace_id = ANY(:marketplace_ids)" if marketplace_ids else ""
+    added = db.execute(text(f"""
+        INSERT INTO jobs (kind, job_key, key_date, region, marketplace_id)
+        SELECT :kind, o.amazon_order_id, o.purchase_date, r.region, o.marketplace_id
+        FROM amazon_orders_detail o
+        JOIN (VALUES {_REGION_VALUES}) AS r(marketplace_id, region) ON r.marketplace_id = o.marketplace_id
+        WHERE o.items_status = :pending {marketplace_filter}
+          AND NOT EXISTS (SELECT 1 FROM jobs j WHERE j.kind = :kind AND j.job_key = o.amazon_order_id)
+        ON CONFLICT (kind, job_key) DO NOTHING
+    """), {"kind": QUEUE_KIND, "pending": ITEMS_PENDING,
+           "marketplace_ids": list(marketplace_ids or [])}).rowcount
+    db.commit()
+    return added
+
+def _fetch_job(job, credentials):
+    marketplace = sp_marketplace(job.marketplace_id)
+    try:
+        return fetch_order_items(job.job_key, credentials[job.region], marketplace, job.region), marketplace.name, None
+    except Exception as e:
+        return None, marketplace.name, _as_retry_error(e)
+
+def _work_claimed(db, owner, jobs, pool, credentials):
+    """Fetch the claimed orders and settle their jobs with the items they produced. Returns items written."""
+    by_key = {job.job_key: job for job in jobs}
+    dates = {job.job_key: job.key_date for job in jobs if job.key_date}
+    if len(dates) < len(by_key):  # queued before jobs carried the order's purchase date
+        dates.update(purchase_dates(db, [key for key in by_key if key not in dates]))
+    # Orders fetched some other way since they were queued cost no API call
+    pending = {
+        r.amazon_order_id for r in db.query(AmazonOrderDetail.amazon_order_id).filter(
+            AmazonOrderDetail.amazon_order_id.in_(list(dates)),
+            partitions.within(AmazonOrderDetail.purchase_date, dates.values()),
+            AmazonOrderDetail.items_status == ITEMS_PENDING,
+        )
+    }
+    db.rollback()  # no snapshot held open across the API calls
+
+    fetched, failed, rows = [], {}, []
+    results = pool.map(lambda job: (job, _fetch_job(job, credentials)),
+                       [job for job in jobs if job.job_key in pending])
+    for job, (items, country, error) in results:
+        if error is not None:
+            failed[job.job_key] = error
+        else:
+            fetched.append(job.job_key)
+            rows.extend(build_item_rows(job.job_key, items, country))
+
+    written = deleted = unchanged = 0
+    dead = []
+    try:
+        if fetched:
+            fetched_dates = {key: dates[key] for key in fetched}
+            written, deleted, unchanged, touched, groups = write_items(db, fetched_dates, rows)
+            mark_items_fetched(db, fetched_dates)
+            refresh_for_orders(db, touched, groups)
+        if failed:
+            dead = mark_items_failed(db, failed, dates)
+        # Jobs finish in the transaction that wrote their items, so a crash
+        # before commit leaves both the order and its job to be picked up again
+        done = [job.id for key, job in by_key.items() if key not in failed or key in dead]
+        completed = job_queue.complete(db, owner, done)
+        for key in set(failed) - set(dead):
+            job = by_key[key]
+            job_queue.release(db, owner, [job.id], backoff_delay(job.attempts, cap=IDLE_SECONDS * 10))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    if completed < len(done):
+        logger.warning(f"💔 {len(done) - completed} jobs were reclaimed by another worker before we finished")
+    logger.info(f"💾 Settled {len(jobs)} jobs: {written} items written, {unchanged} unchanged, {deleted} removed "
+                f"({len(jobs) - len(pending)} already done, {len(failed)} failed, {len(dead)} dead-lettered)")
+    return written
+
+def main_queue(workers=4, batch_size=50, regions=None, lease_seconds=job_queue.DEFAULT_LEASE_SECONDS,
+               exit_when_empty=False, marketplace_ids=None):
+    """Claim item jobs (only for `regions`, default: every region we hold credentials for) until stopped."""
+    credentials = load_credentials()
+    regions = [r for r in (regions or credentials) if r in credentials]
+    if not regions:
+        raise RuntimeError("No credentials for any of the requested regions")
+    owner = job_queue.worker_id()
+    total_written = 0
+    logger.info(f"🚀 Queue worker {owner}: regions {', '.join(regions)}, {workers} fetch threads, "
+                f"claiming {batch_size} at a time")
+
+    with job_queue.Heartbeat(owner, lease_seconds) as heartbeat, \
+            ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fetch") as pool, \
+            session_scope() as db:
+        while True:
+            jobs = job_queue.claim(db, QUEUE_KIND, owner, batch_size, regions, lease_seconds)
+            if not jobs:
+                if enqueue_pending(db, marketplace_ids):
+                    continue
+                if exit_when_empty:
+                    break
+                time.sleep(IDLE_SECONDS)
+                continue
+            ids = [job.id for job in jobs]
+            heartbeat.hold(ids)
+            try:
+                total_written += _work_claimed(db, owner, jobs, pool, credentials)
+            finally:
+                heartbeat.drop(ids)
 
-        logger.info("🕒 Sleeping for a bit before next batch...")
-        time.sleep(3)
+    logger.info(f"🎉 Queue empty. Total items written: {total_written}")
+    return total_written
 
-    logger.info(f"🎉 Done. Total items inserted: {total_inserted}")
+def cli(argv=None):
+    parser = argparse.ArgumentParser(prog="nimbussync items",
+                                     description="Fetch line items for orders that don't have them yet")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="run the concurrent feeder/fetcher/writer pipeline instead of one order at a time")
+    parser.add_argument("--queue", action="store_true",
+                        help="claim orders from the shared jobs table; any number of workers may run at once")
+    parser.add_argument("--region", action="append", metavar="REGION",
+                        default=[r for r in os.getenv("ITEM_WORKER_REGIONS", "").split(",") if r] or None,
+                        help="with --queue: only claim jobs of this credential region (repeatable)")
+    parser.add_argument("--lease-seconds", type=int, default=job_queue.DEFAULT_LEASE_SECONDS,
+                        help="with --queue: how long a claimed job stays ours without a heartbeat")
+    parser.add_argument("--claim-size", type=int, default=50, help="with --queue: jobs claimed at a time")
+    parser.add_argument("--exit-when-empty", action="store_true",
+                        help="with --queue: stop once no jobs are left instead of waiting for more")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("ITEM_SYNC_WORKERS", "4")))
+    parser.add_argument("--queue-size", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--refresh-days", type=int, metavar="N",
+                        help="first re-queue orders purchased in the last N days to pick up changed lines")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    metrics.install_exporters()
+    if args.refresh_days:
+        requeue_recent(args.refresh_days)
+    if args.queue:
+        main_queue(workers=args.workers, batch_size=args.claim_size, regions=args.region,
+                   lease_seconds=args.lease_seconds, exit_when_empty=args.exit_when_empty)
+    elif args.pipeline:
+        main_pipeline(workers=args.workers, queue_size=args.queue_size, batch_size=args.batch_size)
+    else:
+        main()
+    return 0
 
 if __name__ == "__main__":
-    main()
+    sys.exit(cli())
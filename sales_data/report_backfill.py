@@ -0,0 +1,361 @@
+import sys
+import os
+import argparse
+import base64
+import contextlib
+import csv
+import gzip
+import io
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import partitions
+from db.bulk import upsert
+from db.connect import session_scope
+from db.models import AmazonOrderDetail, AmazonOrderDetailItem, BackfillWindow, ITEMS_PENDING
+from utils.rate_limiter import call_limited
+from utils.sp_clients import get_client, load_credentials
+from utils import metrics
+from sales_data.amazon_sync import ORDER_KEY
+from sales_data.daily_aggregates import line_groups, refresh_for_orders
+from sales_data.fetch_historic_sales import REVISION_DAYS, completed_windows, plan_windows
+from sales_data.marketplaces import marketplace_region, sp_marketplace, sp_marketplaces
+from sales_data.order_items_sync import content_hash, delete_items
+
+logger = logging.getLogger(__name__)
+
+# Bulk alternative to amazon_sync + order_items_sync for historic ranges:
+# one flat-file report per marketplace and window carries every order and
+# line in it, so a window costs a handful of calls instead of one per order.
+REPORT_TYPE = "GET_FLAT_FILE_ALL_ORDERS_DATA_BY_ORDER_DATE_GENERAL"
+REPORT_STREAM = "orders_report"
+# Amazon caps the order report range at 30 days
+MAX_WINDOW_DAYS = 30
+POLL_SECONDS = 30
+POLL_TIMEOUT_SECONDS = 2 * 3600
+# CANCELLED also means "no data in range", so only FATAL is an error
+REPORT_DONE, REPORT_CANCELLED, REPORT_FATAL = "DONE", "CANCELLED", "FATAL"
+# Orders per transaction; each batch is one COPY upsert plus one item insert
+BATCH_ORDERS = 2000
+# The report has no buyer fields, so leave what getOrders stored for them
+REPORT_UPDATE_COLUMNS = ["order_status", "order_total", "currency"]
+# Used when the download doesn't declare a charset (S3 serves octet-stream)
+DEFAULT_ENCODING = "cp1252"
+REPORT_ENCODINGS = {"A1VC38T7YXB528": "cp932"}  # JP flat files are Shift_JIS
+DOWNLOAD_CHUNK = 1 << 16
+AES_BLOCK = 16
+# Summed per line into order_total, like getOrders' OrderTotal
+_TOTAL_COLUMNS = ("item-price", "item-tax", "shipping-price", "shipping-tax", "gift-wrap-price", "gift-wrap-tax")
+_DISCOUNT_COLUMNS = ("item-promotion-discount", "ship-promotion-discount")
+
+
+def _iso(dt):
+    return dt.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _amount(value):
+    value = (value or "").strip()
+    return float(value) if value else None
+
+
+# ───────────────────────────────────────
+# Report lifecycle
+# ───────────────────────────────────────
+
+def request_report(api, region, marketplace, window_start, window_end):
+    """Create the report and poll until it settles. Returns its document id, or None if empty."""
+    res = call_limited(region, "createReport", api.create_report,
+                       reportType=REPORT_TYPE,
+                       dataStartTime=_iso(window_start),
+                       dataEndTime=_iso(window_end),
+                       marketplaceIds=[marketplace.marketplace_id])
+    report_id = res.payload["reportId"]
+    deadline = time.monotonic() + POLL_TIMEOUT_SECONDS
+    while True:
+        report = call_limited(region, "getReport", api.get_report, report_id).payload
+        status = report.get("processingStatus")
+        if status == REPORT_DONE:
+            return report["reportDocumentId"]
+        if status == REPORT_CANCELLED:
+            return None
+        if status == REPORT_FATAL:
+            raise RuntimeError(f"Report {report_id} failed (FATAL)")
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Report {report_id} still {status} after {POLL_TIMEOUT_SECONDS}s")
+        metrics.REPORT_POLL_WAIT.inc(POLL_SECONDS, operation="getReport", region=region or "")
+        time.sleep(POLL_SECONDS)
+
+
+class _DecryptingReader(io.RawIOBase):
+    """AES-CBC decryption of (2020-09-04) encrypted report documents, chunk by chunk."""
+
+    def __init__(self, raw, details):
+        from Crypto.Cipher import AES
+
+        self._raw = raw
+        self._cipher = AES.new(base64.b64decode(details["key"]), AES.MODE_CBC,
+                               base64.b64decode(details["initializationVector"]))
+        self._pending = b""  # ciphertext short of a whole block
+        self._held = b""     # last plaintext block; its padding is stripped at EOF
+        self._buffer = b""
+        self._eof = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buffer and not self._eof:
+            chunk = self._raw.read(DOWNLOAD_CHUNK)
+            if not chunk:
+                self._eof = True
+                self._buffer = self._held[:-self._held[-1]] if self._held else b""
+                break
+            data = self._pending + chunk
+            cut = len(data) - len(data) % AES_BLOCK
+            self._pending = data[cut:]
+            plain = self._held + self._cipher.decrypt(data[:cut])
+            self._buffer, self._held = plain[:-AES_BLOCK], plain[-AES_BLOCK:]
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+
+def report_encoding(content_type, marketplace_id):
+    """The charset= of the Content-Type if given, else the marketplace's flat-file encoding.
+
+    Not requests' get_encoding_from_headers: it answers ISO-8859-1 for any
+    text/* without a charset, which would decode JP reports as Latin-1.
+    """
+    for param in (content_type or "").split(";")[1:]:
+        key, _, value = param.partition("=")
+        value = value.strip(' "\'')
+        if key.strip().lower() == "charset" and value:
+            return value
+    return REPORT_ENCODINGS.get(marketplace_id, DEFAULT_ENCODING)
+
+
+@contextlib.contextmanager
+def open_report(document, marketplace_id):
+    """Yield a csv.DictReader over the document, downloaded, decompressed and decoded as it is read."""
+    import requests
+
+    res = requests.get(document["url"], stream=True, timeout=(10, 300))
+    try:
+        res.raise_for_status()
+        # urllib3 undoes any transport Content-Encoding; the report's own gzip is separate
+        res.raw.decode_content = True
+        stream = res.raw
+        if document.get("encryptionDetails"):
+            stream = io.BufferedReader(_DecryptingReader(stream, document["encryptionDetails"]), DOWNLOAD_CHUNK)
+        if document.get("compressionAlgorithm") == "GZIP":
+            stream = gzip.GzipFile(fileobj=stream)
+        encoding = report_encoding(res.headers.get("Content-Type"), marketplace_id)
+        text = io.TextIOWrapper(stream, encoding=encoding, errors="replace", newline="")
+        yield csv.DictReader(text, delimiter="\t", quoting=csv.QUOTE_NONE)
+    finally:
+        res.close()
+
+
+# ───────────────────────────────────────
+# Loading
+# ───────────────────────────────────────
+
+def _header_row(lines, marketplace_id):
+    first = lines[0]
+    amounts = [_amount(line.get(c)) for line in lines for c in _TOTAL_COLUMNS]
+    discounts = [_amount(line.get(c)) for line in lines for c in _DISCOUNT_COLUMNS]
+    total = None
+    if any(a is not None for a in amounts):
+        total = sum(a for a in amounts if a) - sum(abs(d) for d in discounts if d)
+    return {
+        "amazon_order_id": first["amazon-order-id"],
+        "purchase_date": first.get("purchase-date") or None,
+        "order_status": first.get("order-status") or None,
+        "marketplace_id": marketplace_id,
+        "order_total": round(total, 2) if total is not None else None,
+        "currency": first.get("currency") or None,
+    }
+
+
+def _item_row(line, order_id, country, purchase_date):
+    qty = int(line.get("quantity") or 0)
+    item_price = _amount(line.get("item-price"))
+    currency = line.get("currency") or None
+    row = {
+        "order_id": order_id,
+        "purchase_date": purchase_date,
+        "asin": line.get("asin") or None,
+        "seller_sku": line.get("sku") or None,
+        "title": line.get("product-name") or None,
+        "quantity_ordered": qty,
+        "item_price": item_price,
+        "item_currency": currency,
+        "shipping_price": _amount(line.get("shipping-price")),
+        "shipping_currency": currency,
+        "country": country,
+        "unit_price": item_price / qty if item_price is not None and qty else None,
+    }
+    # The report has no order-item-id, so load_batch leaves the order pending:
+    # the item fetch then replaces these unkeyed rows with keyed ones
+    row["content_hash"] = content_hash(row)
+    return row
+
+
+def load_batch(db, marketplace, batch, seen, written):
+    """Upsert a batch of report orders; write lines for those still awaiting items. Returns (orders, items).
+
+    Those orders stay pending: their lines count towards the daily sales now,
+    and getOrderItems swaps them for keyed ones later.
+
+    `seen` and `written` carry the order ids of earlier batches of the same
+    report, in case an order's lines are not contiguous in the file.
+    """
+    # A split order keeps the header (and total) computed from its first part
+    headers = [_header_row(lines, marketplace.marketplace_id)
+               for order_id, lines in batch.items() if order_id not in seen]
+    try:
+        partitions.write_for_dates(db, [h["purchase_date"] for h in headers],
+                                   lambda: upsert(db, AmazonOrderDetail, headers, ORDER_KEY, REPORT_UPDATE_COLUMNS))
+        stored = db.query(
+            AmazonOrderDetail.amazon_order_id, AmazonOrderDetail.purchase_date, AmazonOrderDetail.items_status,
+        ).filter(
+            AmazonOrderDetail.amazon_order_id.in_(list(batch)),
+            partitions.within(AmazonOrderDetail.purchase_date,
+                              [lines[0].get("purchase-date") for lines in batch.values()]),
+        ).all()
+        dates = {r.amazon_order_id: r.purchase_date for r in stored}
+        # Lines of a split order written by an earlier batch are added to, not replaced
+        fresh = {r.amazon_order_id: r.purchase_date for r in stored
+                 if r.items_status == ITEMS_PENDING and r.amazon_order_id not in written}
+        # Orders already loaded by getOrderItems are left alone
+        write = list(fresh) + [order_id for order_id in batch if order_id in written]
+        groups = set()
+        if fresh:
+            # Re-queued orders and earlier report runs leave lines behind; replace them
+            groups = line_groups(db, fresh)
+            delete_items(db, fresh)
+        rows = [_item_row(line, order_id, marketplace.name, dates[order_id])
+                for order_id in write for line in batch[order_id]]
+        if rows:
+            db.bulk_insert_mappings(AmazonOrderDetailItem, rows)
+        refresh_for_orders(db, {order_id: dates[order_id] for order_id in write}, groups)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    seen.update(batch)
+    written.update(write)
+    metrics.record_rows(AmazonOrderDetailItem.__tablename__, inserted=len(rows))
+    return len(headers), len(rows)
+
+
+def load_window(marketplace, window_start, window_end, final, batch_orders=BATCH_ORDERS):
+    """Request, stream and load one window's report. Returns (orders, items)."""
+    from sp_api.api import Reports
+
+    region = marketplace_region(marketplace.marketplace_id)
+    api = get_client(Reports, region, marketplace, load_credentials()[region])
+    document_id = request_report(api, region, marketplace, window_start, window_end)
+
+    orders = items = 0
+    with session_scope() as db:
+        if document_id:
+            document = call_limited(region, "getReportDocument", api.get_report_document, document_id).payload
+            seen, written = set(), set()
+            batch = {}
+            with open_report(document, marketplace.marketplace_id) as lines:
+                for line in lines:
+                    order_id = line.get("amazon-order-id")
+                    if not order_id:
+                        continue
+                    # Only cut a batch between orders, so an order's lines stay together
+                    if order_id not in batch and len(batch) >= batch_orders:
+                        o, i = load_batch(db, marketplace, batch, seen, written)
+                        orders, items, batch = orders + o, items + i, {}
+                    batch.setdefault(order_id, []).append(line)
+            if batch:
+                o, i = load_batch(db, marketplace, batch, seen, written)
+                orders, items = orders + o, items + i
+        if final:
+            db.merge(BackfillWindow(
+                stream=REPORT_STREAM,
+                marketplace_id=marketplace.marketplace_id,
+                window_start=window_start,
+                window_end=window_end,
+                row_count=orders,
+            ))
+            db.commit()
+    return orders, items
+
+
+def backfill(days=720, window_days=MAX_WINDOW_DAYS, max_workers=4, marketplaces=None, batch_orders=BATCH_ORDERS):
+    """Load orders and items for the last `days` from order reports. Returns (orders, items, failed windows)."""
+    if window_days > MAX_WINDOW_DAYS:
+        raise ValueError(f"Order reports cover at most {MAX_WINDOW_DAYS} days per request")
+    marketplaces = marketplaces or sp_marketplaces()
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+    end = today + timedelta(days=1)
+    start = today - timedelta(days=days)
+    final_before = today - timedelta(days=REVISION_DAYS)
+
+    jobs = []
+    with session_scope() as db:
+        for marketplace in marketplaces:
+            done = completed_windows(db, marketplace, stream=REPORT_STREAM)
+            for window in plan_windows(start, end, window_days):
+                if window not in done:
+                    jobs.append((marketplace, window[0], window[1]))
+
+    logger.info(f"Requesting {len(jobs)} order reports of {window_days} days across {len(marketplaces)} "
+                f"marketplaces [max workers: {max_workers}]")
+    total_orders = total_items = failed = 0
+    started = time.perf_counter()
+    # Report generation dominates, so several windows wait on Amazon at once;
+    # the shared limiter keeps each region within its createReport quota.
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="report") as pool:
+        futures = {
+            pool.submit(load_window, mp, ws, we, we <= final_before, batch_orders): (mp, ws, we)
+            for mp, ws, we in jobs
+        }
+        for future in as_completed(futures):
+            mp, ws, we = futures[future]
+            try:
+                orders, items = future.result()
+            except Exception as e:
+                failed += 1
+                logger.error(f"❌ {mp.name} {ws.date()}→{we.date()} failed: {e}")
+                continue
+            total_orders += orders
+            total_items += items
+            logger.info(f"✅ {mp.name} {ws.date()}→{we.date()}: {orders} orders, {items} items")
+
+    logger.info(f"Orders: {total_orders}, items: {total_items}, failed windows: {failed} "
+                f"({time.perf_counter() - started:.1f}s). Rerun to retry failed windows.")
+    return total_orders, total_items, failed
+
+
+def cli(argv=None):
+    parser = argparse.ArgumentParser(prog="nimbussync report-backfill",
+                                     description="Bulk-load historic orders and items from flat-file order reports")
+    parser.add_argument("--days", type=int, default=720)
+    parser.add_argument("--window-days", type=int, default=MAX_WINDOW_DAYS)
+    parser.add_argument("--max-workers", type=int, default=4, help="reports in flight at once")
+    parser.add_argument("--batch-orders", type=int, default=BATCH_ORDERS, help="orders per transaction")
+    parser.add_argument("--marketplace", action="append", metavar="ID",
+                        help="only this marketplace id (repeatable)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    metrics.install_exporters()
+    marketplaces = [sp_marketplace(mp_id) for mp_id in args.marketplace] if args.marketplace else None
+    _, _, failed = backfill(days=args.days, window_days=args.window_days, max_workers=args.max_workers,
+                            marketplaces=marketplaces, batch_orders=args.batch_orders)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(cli())
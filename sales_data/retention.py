@@ -0,0 +1,112 @@
+import sys
+import os
+import argparse
+import logging
+from datetime import datetime, timezone
+
+from sqlalchemy import text
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import partitions
+from db.connect import session_scope
+
+logger = logging.getLogger(__name__)
+
+# Old months of orders and items leave the database by detaching their
+# partitions: a catalog change, not a DELETE, so nothing is rewritten or
+# vacuumed. Detached partitions stay behind as plain tables until dropped;
+# `ALTER TABLE amazon_orders_detail ATTACH PARTITION ...` (orders first)
+# brings one back.
+DEFAULT_KEEP_MONTHS = 24
+# Export datasets read from the partitioned tables
+ARCHIVE_DATASETS = ("orders", "order_items")
+# DETACH locks the parent table; give up rather than queue every sync query behind it
+LOCK_TIMEOUT = "10s"
+
+
+def _parse_month(value):
+    return datetime.strptime(value, "%Y-%m").date()
+
+
+def list_partitions():
+    """{table: [attached months]}"""
+    with session_scope() as db:
+        return {table: partitions.attached_months(db, table) for table in partitions.PARTITIONED}
+
+
+def ensure(first=None, ahead=partitions.AHEAD_MONTHS):
+    """Create partitions from `first` (default: this month) to `ahead` months past this one."""
+    this_month = partitions.month_start(datetime.now(timezone.utc))
+    with session_scope() as db:
+        return partitions.ensure_range(db, first or this_month, partitions.add_months(this_month, ahead))
+
+
+def detach_before(cutoff, export_dir=None, fmt=None, drop=False):
+    """Detach every month before `cutoff` (a month's first day), exporting it first if asked.
+
+    Returns the months detached.
+    """
+    with session_scope() as db:
+        months = [m for m in partitions.attached_months(db, partitions.PARTITIONED[0]) if m < cutoff]
+    if not months:
+        logger.info(f"🟢 No partitions before {cutoff:%Y-%m}")
+        return []
+
+    if export_dir:
+        from sales_data import export
+
+        # Any failure here stops before anything is detached
+        export.export(export_dir, list(ARCHIVE_DATASETS), fmt, start=months[0], end=cutoff, archive=True)
+
+    for month in months:
+        with session_scope() as db:
+            db.execute(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'"))
+            names = partitions.detach_month(db, month, drop)
+        logger.info(f"🧊 {'Dropped' if drop else 'Detached'} {', '.join(names)}")
+    return months
+
+
+def cli(argv=None):
+    parser = argparse.ArgumentParser(prog="nimbussync retention",
+                                     description="Manage the monthly partitions of orders and items")
+    sub = parser.add_subparsers(dest="action", required=True)
+    sub.add_parser("list", help="show the attached months")
+
+    ensure_p = sub.add_parser("ensure", help="create partitions ahead of time (or for a backfill range)")
+    ensure_p.add_argument("--from", dest="first", type=_parse_month, metavar="YYYY-MM",
+                          help="also create every month since this one (default: this month)")
+    ensure_p.add_argument("--ahead", type=int, default=partitions.AHEAD_MONTHS, help="months past this one")
+
+    detach_p = sub.add_parser("detach", help="detach old months, optionally exporting them first")
+    when = detach_p.add_mutually_exclusive_group()
+    when.add_argument("--keep-months", type=int, default=DEFAULT_KEEP_MONTHS,
+                      help=f"months to keep before the current one (default: {DEFAULT_KEEP_MONTHS})")
+    when.add_argument("--before", type=_parse_month, metavar="YYYY-MM", help="detach months before this one")
+    detach_p.add_argument("--export", metavar="DIR", help="archive the months with `nimbussync export` first")
+    detach_p.add_argument("--format", choices=("parquet", "csv"), default=None, help="archive format")
+    detach_p.add_argument("--drop", action="store_true", help="drop the detached tables (needs --export)")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    if args.action == "list":
+        for table, months in list_partitions().items():
+            span = f"{months[0]:%Y-%m} .. {months[-1]:%Y-%m}" if months else "none"
+            print(f"{table:<28}{len(months):>4} months  {span}")
+        return 0
+
+    if args.action == "ensure":
+        ensure(args.first, args.ahead)
+        return 0
+
+    if args.drop and not args.export:
+        parser.error("--drop deletes the data; archive it with --export DIR first")
+    this_month = partitions.month_start(datetime.now(timezone.utc))
+    cutoff = args.before or partitions.add_months(this_month, -args.keep_months)
+    detach_before(cutoff, args.export, args.format, args.drop)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(cli())
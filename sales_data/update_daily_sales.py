@@ -1,97 +1,99 @@
 # -------------------- update_daily_sales.py --------------------
-import pandas as pd
+import sys
+import os
+import argparse
+import logging
 from datetime import datetime, timedelta
-import pytz
-from sp_api.api import Sales
-from sp_api.base import Granularity, Marketplaces
-from sp_api.auth.exceptions import AuthorizationError
-from db.connect import SessionLocal
-from db.models import SalesSummary
-from client_config import CREDENTIALS
-from logger import logger
+from zoneinfo import ZoneInfo
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-marketplace_timezones = {
-    Marketplaces.US: "America/Los_Angeles",
-    Marketplaces.CA: "America/Los_Angeles",
-    Marketplaces.MX: "America/Mexico_City",
-    Marketplaces.DE: "Europe/Berlin",
-    Marketplaces.FR: "Europe/Paris",
-    Marketplaces.IT: "Europe/Rome",
-    Marketplaces.ES: "Europe/Madrid",
-    Marketplaces.NL: "Europe/Amsterdam",
-    Marketplaces.BE: "Europe/Brussels",
-    Marketplaces.SE: "Europe/Stockholm",
-    Marketplaces.PL: "Europe/Warsaw",
-    Marketplaces.TR: "Europe/Istanbul",
-    Marketplaces.UK: "Europe/London",
-    Marketplaces.JP: "Asia/Tokyo",
-    Marketplaces.AU: "Australia/Sydney"
-}
+from db.connect import session_scope
+from db.models import SalesSummary
+from db.bulk import upsert_rows
+from utils.logger import logger
+from utils.rate_limiter import call_limited
+from utils.sp_clients import get_client, load_credentials
+from utils import metrics
+from sales_data.marketplaces import MARKETPLACES, sp_marketplace
 
-marketplace_credentials = {
-    mp: CREDENTIALS[region] for mp, region in [
-        (Marketplaces.US, "North America"),
-        (Marketplaces.CA, "North America"),
-        (Marketplaces.MX, "North America"),
-        (Marketplaces.DE, "Europe"),
-        (Marketplaces.FR, "Europe"),
-        (Marketplaces.IT, "Europe"),
-        (Marketplaces.ES, "Europe"),
-        (Marketplaces.NL, "Europe"),
-        (Marketplaces.BE, "Europe"),
-        (Marketplaces.SE, "Europe"),
-        (Marketplaces.PL, "Europe"),
-        (Marketplaces.TR, "Europe"),
-        (Marketplaces.UK, "Europe"),
-        (Marketplaces.JP, "Far East"),
-        (Marketplaces.AU, "Australia")
-    ]
-}
+# Amazon revises recent days, so every run overwrites these columns on conflict
+SUMMARY_UPDATE_COLUMNS = ["average_unit_price", "order_item_count", "unit_count", "total_sales", "currency"]
 
-def fetch_and_store():
-    session = SessionLocal()
-    for mp, tz in marketplace_timezones.items():
-        try:
-            local_tz = pytz.timezone(tz)
-            end_dt = datetime.now(local_tz).replace(hour=23, minute=59)
-            start_dt = end_dt - timedelta(days=3)
-            start_str = start_dt.strftime('%Y-%m-%dT%H:%M:%SZ')
-            end_str = end_dt.strftime('%Y-%m-%dT%H:%M:%SZ')
+def fetch_and_store(marketplace_ids=None):
+    """Refresh the last few days of SalesSummary, for all or only the given marketplaces.
 
-            logger.info(f"Fetching {mp.name} sales between {start_str} and {end_str}")
-            res = Sales(credentials=marketplace_credentials[mp], marketplace=mp)
-            data = res.get_order_metrics(
-                granularity=Granularity.DAY,
-                interval=(start_str, end_str),
-                granularityTimeZone=tz
-            )
+    Returns (rows written, marketplaces failed).
+    """
+    from sp_api.api import Sales
+    from sp_api.base import Granularity
+    from sp_api.auth.exceptions import AuthorizationError
 
-            for entry in data.payload:
-                date_str = entry['interval'].split('T')[0]
-                existing = session.query(SalesSummary).filter_by(date=date_str, country=mp.name).first()
-                if existing:
-                    logger.info(f"Skipping duplicate record for {mp.name} on {date_str}")
-                    continue
+    credentials = load_credentials()
+    written = failed = 0
+    with session_scope() as session:
+        for mp_id, (_, tz, region) in MARKETPLACES.items():
+            if marketplace_ids and mp_id not in marketplace_ids:
+                continue
+            mp = sp_marketplace(mp_id)
+            if region not in credentials:
+                logger.warning(f"No credentials for {mp.name}. Skipping.")
+                continue
+            try:
+                local_tz = ZoneInfo(tz)
+                end_dt = datetime.now(local_tz).replace(hour=23, minute=59)
+                start_dt = end_dt - timedelta(days=3)
+                start_str = start_dt.strftime('%Y-%m-%dT%H:%M:%SZ')
+                end_str = end_dt.strftime('%Y-%m-%dT%H:%M:%SZ')
 
-                summary = SalesSummary(
-                    date=date_str,
-                    country=mp.name,
-                    average_unit_price=entry['averageUnitPrice']['amount'],
-                    order_item_count=entry['orderItemCount'],
-                    unit_count=entry['unitCount'],
-                    total_sales=entry['totalSales']['amount'],
-                    currency=entry['totalSales']['currencyCode']
+                logger.info(f"Fetching {mp.name} sales between {start_str} and {end_str}")
+                res = get_client(Sales, region, mp, credentials[region])
+                data = call_limited(
+                    region, "getOrderMetrics", res.get_order_metrics,
+                    granularity=Granularity.DAY,
+                    interval=(start_str, end_str),
+                    granularityTimeZone=tz
                 )
-                session.add(summary)
+
+                rows = [
+                    {
+                        "date": entry['interval'].split('T')[0],
+                        "country": mp.name,
+                        "average_unit_price": entry['averageUnitPrice']['amount'],
+                        "order_item_count": entry['orderItemCount'],
+                        "unit_count": entry['unitCount'],
+                        "total_sales": entry['totalSales']['amount'],
+                        "currency": entry['totalSales']['currencyCode'],
+                    }
+                    for entry in data.payload
+                ]
+                # One round trip per marketplace, keyed on uq_sales_summary_date_country
+                inserted, updated = upsert_rows(session, SalesSummary, rows, ["date", "country"], SUMMARY_UPDATE_COLUMNS)
                 session.commit()
-                logger.info(f"Inserted summary for {mp.name} on {date_str}")
+                written += inserted + updated
+                logger.info(f"Upserted {mp.name}: {inserted} inserted, {updated} revised, "
+                            f"{len(rows) - inserted - updated} unchanged")
 
-        except AuthorizationError as e:
-            logger.error(f"Auth error for {mp.name}: {e}")
-        except Exception as e:
-            logger.error(f"Error fetching sales for {mp.name}: {e}")
+            except AuthorizationError as e:
+                session.rollback()
+                logger.error(f"Auth error for {mp.name}: {e}")
+                failed += 1
+            except Exception as e:
+                session.rollback()
+                logger.error(f"Error fetching sales for {mp.name}: {e}")
+                failed += 1
+    return written, failed
 
-    session.close()
+def cli(argv=None):
+    parser = argparse.ArgumentParser(prog="nimbussync sales",
+                                     description="Refresh the last few days of SalesSummary from getOrderMetrics")
+    parser.add_argument("--marketplace", action="append", dest="marketplace_ids", metavar="ID",
+                        help="only this marketplace id (repeatable)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    metrics.install_exporters()
+    _, failed = fetch_and_store(args.marketplace_ids)
+    return 1 if failed else 0
 
 if __name__ == "__main__":
-    fetch_and_store()
\ No newline at end of file
+    sys.exit(cli())
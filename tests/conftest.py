@@ -0,0 +1,26 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from db.connect import engine
+
+
+@pytest.fixture
+def db():
+    """A session on a migrated database, rolled back afterwards; skipped without one."""
+    try:
+        connection = engine.connect()
+    except OperationalError:
+        pytest.skip("no database (set DB_HOST, DB_PORT, POSTGRES_* to run)")
+    if connection.execute(text("SELECT to_regclass('daily_product_sales')")).scalar() is None:
+        connection.close()
+        pytest.skip("database not migrated (run main.py)")
+    trans = connection.begin()
+    session = Session(bind=connection)
+    try:
+        yield session
+    finally:
+        session.close()
+        trans.rollback()
+        connection.close()
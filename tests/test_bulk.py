@@ -0,0 +1,33 @@
+from datetime import date
+
+from db import bulk
+from db.models import SalesSummary
+
+KEY = ["date", "country"]
+UPDATE = ["unit_count"]
+
+
+def _rows(n, country="ZZ"):
+    # n versions of the same key, unit_count counting up
+    return [{"date": date(1999, 1, 1), "country": country, "unit_count": i} for i in range(n)]
+
+
+def _stored(db, country="ZZ"):
+    return db.query(SalesSummary.unit_count).filter(SalesSummary.country == country).scalar()
+
+
+def test_dedupe_keeps_the_last_row():
+    assert bulk.dedupe_rows(_rows(3), KEY) == [_rows(3)[-1]]
+
+
+def test_copy_upsert_keeps_the_last_duplicate(db):
+    rows = _rows(bulk.COPY_THRESHOLD + 5)
+    assert bulk.copy_upsert_rows(db, SalesSummary, rows, KEY, UPDATE) == (1, 0)
+    assert _stored(db) == rows[-1]["unit_count"]
+
+
+def test_insert_and_update_counts_match_either_path(db):
+    assert bulk.upsert_rows(db, SalesSummary, _rows(1), KEY, UPDATE) == (1, 0)
+    assert bulk.upsert_rows(db, SalesSummary, _rows(2) + _rows(1, "ZY"), KEY, UPDATE) == (1, 1)
+    # Nothing changed: neither inserted nor updated
+    assert bulk.copy_upsert_rows(db, SalesSummary, _rows(2) + _rows(1, "ZY"), KEY, UPDATE) == (0, 0)
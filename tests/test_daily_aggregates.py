@@ -0,0 +1,45 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import text
+
+from db.models import AmazonOrderDetail
+from sales_data.daily_aggregates import refresh_for_orders
+from sales_data.order_items_sync import build_item_rows, write_items
+
+ORDER_ID = "TEST-AGG-0001"
+MARKETPLACE_ID = "A1PA6795UKMFR9"
+
+
+def _aggregate(db):
+    return {
+        (r.asin, r.seller_sku): r.units
+        for r in db.execute(text(
+            "SELECT asin, seller_sku, units FROM daily_product_sales "
+            "WHERE marketplace_id = :mp AND asin LIKE 'TESTAGG%'"
+        ), {"mp": MARKETPLACE_ID})
+    }
+
+
+def _sync(db, purchase_date, lines):
+    rows = build_item_rows(ORDER_ID, lines, "DE")
+    _, _, _, touched, groups = write_items(db, {ORDER_ID: purchase_date}, rows)
+    refresh_for_orders(db, touched, groups)
+
+
+def test_changed_sku_moves_the_units_to_the_new_group(db):
+    # Mid-month, so the partition created ahead by migrations holds it
+    purchase_date = datetime.now(timezone.utc).replace(day=15, hour=12, minute=0, second=0, microsecond=0)
+    db.add(AmazonOrderDetail(amazon_order_id=ORDER_ID, purchase_date=purchase_date,
+                             marketplace_id=MARKETPLACE_ID, order_status="Shipped"))
+    db.flush()
+    line = {"OrderItemId": "L1", "ASIN": "TESTAGG1", "SellerSKU": "OLD-SKU", "QuantityOrdered": 2,
+            "ItemPrice": {"Amount": "20.00", "CurrencyCode": "EUR"}}
+    other = {"OrderItemId": "L2", "ASIN": "TESTAGG2", "SellerSKU": "GONE", "QuantityOrdered": 1,
+             "ItemPrice": {"Amount": "5.00", "CurrencyCode": "EUR"}}
+
+    _sync(db, purchase_date, [line, other])
+    assert _aggregate(db) == {("TESTAGG1", "OLD-SKU"): 2, ("TESTAGG2", "GONE"): 1}
+
+    # Same line, new SKU; the other line dropped off the order
+    _sync(db, purchase_date, [dict(line, SellerSKU="NEW-SKU")])
+    assert _aggregate(db) == {("TESTAGG1", "NEW-SKU"): 2}
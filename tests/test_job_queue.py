@@ -0,0 +1,92 @@
+import contextlib
+import threading
+from types import SimpleNamespace
+
+from sqlalchemy import text
+
+from db import job_queue
+
+
+class FakeDb:
+    """Records statements; every UPDATE/DELETE matches `rowcount` rows."""
+
+    def __init__(self, rowcount=0):
+        self.rowcount = rowcount
+        self.executed = []
+        self.commits = 0
+
+    def execute(self, statement, params=None):
+        self.executed.append((" ".join(str(statement).split()), params))
+        return SimpleNamespace(rowcount=self.rowcount, all=lambda: [])
+
+    def commit(self):
+        self.commits += 1
+
+
+def test_release_delays_only_the_owners_jobs():
+    db = FakeDb(rowcount=2)
+    assert job_queue.release(db, "w1", [3, 4], delay_seconds=90) == 2
+    (sql, params), = db.executed
+    assert "available_at = now() + make_interval(secs => :delay)" in sql
+    assert "lease_owner = NULL, lease_expires_at = NULL" in sql
+    assert "lease_owner = :owner" in sql
+    assert params == {"ids": [3, 4], "owner": "w1", "delay": 90}
+    # In the caller's transaction
+    assert db.commits == 0
+
+
+def test_leases_are_timed_and_expired_ones_claimable():
+    db = FakeDb()
+    job_queue.claim(db, "order_items", "w1", 10, lease_seconds=45)
+    (sql, params), = db.executed
+    assert "(lease_expires_at IS NULL OR lease_expires_at < now())" in sql
+    assert "lease_expires_at = now() + make_interval(secs => :lease)" in sql
+    assert params["lease"] == 45 and db.commits == 1
+
+    db = FakeDb(rowcount=1)
+    assert job_queue.heartbeat(db, "w1", [1, 2], lease_seconds=45) == 1
+    assert db.executed[0][1] == {"ids": [1, 2], "owner": "w1", "lease": 45}
+
+
+def test_no_ids_no_statement():
+    db = FakeDb()
+    assert job_queue.release(db, "w1", []) == 0
+    assert job_queue.heartbeat(db, "w1", []) == 0
+    assert job_queue.complete(db, "w1", []) == 0
+    assert db.executed == []
+
+
+def test_heartbeat_renews_what_the_worker_still_holds(monkeypatch):
+    beats = []
+    renewed = threading.Event()
+
+    def heartbeat(db, owner, ids, lease_seconds):
+        beats.append((owner, sorted(ids), lease_seconds))
+        renewed.set()
+        return len(ids)
+
+    monkeypatch.setattr(job_queue, "heartbeat", heartbeat)
+    monkeypatch.setattr(job_queue, "session_scope", contextlib.nullcontext)
+    with job_queue.Heartbeat("w1", lease_seconds=0.03) as beat:
+        beat.hold([1, 2, 3])
+        beat.drop([2])
+        assert renewed.wait(2)
+    assert beats[0] == ("w1", [1, 3], 0.03)
+
+
+def test_lease_expiry_and_release_delay_in_postgres(db):
+    db.execute(text("DELETE FROM jobs WHERE kind = 'test'"))
+    db.execute(text("INSERT INTO jobs (kind, job_key) VALUES ('test', 'A'), ('test', 'B')"))
+    # now() is fixed within the transaction, so an expired lease is a negative one
+    claimed = job_queue.claim(db, "test", "w1", 10, lease_seconds=-1)
+    assert len(claimed) == 2
+    claimed = job_queue.claim(db, "test", "w2", 10)
+    assert sorted(j.job_key for j in claimed) == ["A", "B"]
+    assert all(j.attempts == 2 for j in claimed)
+    assert job_queue.claim(db, "test", "w3", 10) == []
+
+    by_key = {j.job_key: j.id for j in claimed}
+    assert job_queue.release(db, "w1", list(by_key.values())) == 0  # no longer w1's
+    job_queue.release(db, "w2", [by_key["A"]], delay_seconds=60)
+    job_queue.release(db, "w2", [by_key["B"]])
+    assert [j.job_key for j in job_queue.claim(db, "test", "w3", 10)] == ["B"]
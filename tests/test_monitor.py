@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from db import partitions
+from db.models import AmazonOrderDetail
+from utils import monitor
+
+
+def test_orders_without_items_counts_only_settled_fetched_orders(db):
+    def without_items():
+        return monitor.check_orders(db.connection(), None)["orders_without_items"]
+
+    before = without_items()
+    now = datetime.now(timezone.utc)
+    old = now - timedelta(hours=monitor.ITEMS_GRACE_HOURS + 1)
+    partitions.ensure_for_dates(db, [old, now])
+    db.add_all([
+        AmazonOrderDetail(amazon_order_id="TEST-MON-1", purchase_date=old, items_status="fetched"),
+        AmazonOrderDetail(amazon_order_id="TEST-MON-2", purchase_date=old, items_status="pending"),
+        AmazonOrderDetail(amazon_order_id="TEST-MON-3", purchase_date=now, items_status="fetched"),
+    ])
+    db.flush()
+
+    assert without_items() == before + 1
+
+
+class _FakeConn:
+    """Records the statement and parameters; returns one row of zeros."""
+
+    def __init__(self):
+        self.calls = []
+
+    def execute(self, statement, params):
+        self.calls.append((str(statement), params))
+        return SimpleNamespace(one=lambda: SimpleNamespace(_mapping={"orders_without_items": 0}))
+
+
+def test_orders_without_items_filter_and_grace_cutoff():
+    conn = _FakeConn()
+    monitor.check_orders(conn, None)
+
+    (sql, params), = conn.calls
+    rule = sql[sql.index("FILTER (WHERE o.items_status = 'fetched'"):sql.index("AS orders_without_items")]
+    assert "o.purchase_date < :grace_before" in rule and "NOT EXISTS" in rule
+    expected = datetime.now(timezone.utc) - timedelta(hours=monitor.ITEMS_GRACE_HOURS)
+    assert abs(params["grace_before"] - expected) < timedelta(seconds=5)
+    assert "WHERE o.purchase_date >= :since" not in sql
+
+
+def test_orders_without_items_only_warns(monkeypatch):
+    metrics = {"orders": {"orders_without_items": 3}, "sales_summary": {}}
+    monkeypatch.setattr(monitor, "_run_check", lambda name, since: metrics[name])
+    report = monitor.run_audit()
+
+    assert report["findings"] == [
+        {"check": "orders", "metric": "orders_without_items", "value": 3, "severity": "warn"}
+    ]
+    assert monitor.exit_code(report) == monitor.EXIT_OK
+    assert monitor.exit_code(report, strict=True) == monitor.EXIT_FAILED
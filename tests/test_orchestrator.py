@@ -0,0 +1,58 @@
+import pytest
+
+from nimbussync import orchestrator
+from nimbussync.orchestrator import FAILED, OK, SKIPPED, Stage
+
+
+def _ok():
+    return "done"
+
+
+def _fail():
+    raise RuntimeError("boom")
+
+
+def test_failure_skips_diamond_once():
+    # orders -> order_updates -> export, and orders -> export directly
+    stages = [
+        Stage("orders", _fail),
+        Stage("order_updates", _ok, deps=("orders",)),
+        Stage("items", _ok, deps=("orders",)),
+        Stage("export", _ok, deps=("orders", "order_updates", "items")),
+        Stage("sales_summary", _ok),
+    ]
+    results = orchestrator.run(stages, max_parallel=2)
+
+    assert results["orders"]["status"] == FAILED
+    assert results["sales_summary"]["status"] == OK
+    for name in ("order_updates", "items", "export"):
+        assert results[name]["status"] == SKIPPED
+    assert results["export"]["error"] == "order_updates failed"
+
+
+def test_dependents_wait_for_their_deps():
+    order = []
+    stages = [
+        Stage("a", lambda: order.append("a")),
+        Stage("b", lambda: order.append("b"), deps=("a",)),
+        Stage("c", lambda: order.append("c"), deps=("a",)),
+        Stage("d", lambda: order.append("d"), deps=("b", "c")),
+    ]
+    results = orchestrator.run(stages)
+
+    assert all(r["status"] == OK for r in results.values())
+    assert order[0] == "a" and order[-1] == "d"
+
+
+def test_sync_stage_fails_when_marketplaces_fail(monkeypatch):
+    pytest.importorskip("sp_api")
+    from sales_data import amazon_sync, update_daily_sales
+
+    monkeypatch.setattr(amazon_sync, "main_concurrent", lambda **kwargs: 2)
+    monkeypatch.setattr(update_daily_sales, "fetch_and_store", lambda: (10, 1))
+    results = orchestrator.run(orchestrator.select(["orders", "items", "sales_summary"]))
+
+    assert results["orders"]["status"] == FAILED
+    assert results["orders"]["error"] == "2 marketplaces failed"
+    assert results["items"]["status"] == SKIPPED
+    assert results["sales_summary"]["status"] == FAILED
@@ -0,0 +1,48 @@
+import queue
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from sales_data import order_items_sync
+from sales_data.order_items_sync import _DONE, StageStats
+from utils.retry import RetryError, TRANSIENT
+
+
+def _queues(jobs):
+    fetch_q, write_q = queue.Queue(), queue.Queue()
+    for job in jobs + [_DONE]:
+        fetch_q.put(job)
+    return fetch_q, write_q
+
+
+def _drain(q):
+    return [q.get_nowait() for _ in range(q.qsize())]
+
+
+def test_unexpected_fetch_error_is_passed_to_the_writer(monkeypatch):
+    def boom(*args):
+        raise ValueError("bad payload")
+
+    monkeypatch.setattr(order_items_sync, "load_credentials", lambda: {"EU": {}})
+    monkeypatch.setattr(order_items_sync, "fetch_order_items", boom)
+    purchase_date = datetime(2024, 5, 1, tzinfo=timezone.utc)
+    fetch_q, write_q = _queues([("A-1", purchase_date, SimpleNamespace(name="DE"), "EU")])
+    order_items_sync._fetch_worker(fetch_q, write_q, StageStats("fetch"))
+
+    (order_id, date, country, items, error), done = _drain(write_q)
+    assert (order_id, date, country, items) == ("A-1", purchase_date, "DE", None)
+    assert isinstance(error, RetryError) and error.kind == TRANSIENT
+    assert done is _DONE
+
+
+def test_worker_posts_done_when_it_dies(monkeypatch):
+    def no_credentials():
+        raise KeyError("client_config")
+
+    monkeypatch.setattr(order_items_sync, "load_credentials", no_credentials)
+    fetch_q, write_q = _queues([])
+    with pytest.raises(KeyError):
+        order_items_sync._fetch_worker(fetch_q, write_q, StageStats("fetch"))
+
+    assert _drain(write_q) == [_DONE]
@@ -0,0 +1,67 @@
+from datetime import date
+
+from sqlalchemy import event
+
+from db import partitions
+
+
+def test_known_months_skip_the_catalog(db, monkeypatch):
+    month = partitions.month_start(date.today())
+    monkeypatch.setattr(partitions, "_ensured", set())
+    assert partitions.ensure_for_dates(db, [date.today()]) == []
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db.get_bind(), "before_cursor_execute", listener)
+    try:
+        assert partitions.ensure_months(db, [month]) == []
+    finally:
+        event.remove(db.get_bind(), "before_cursor_execute", listener)
+    assert statements == []
+
+
+def test_created_months_are_not_cached(db, monkeypatch):
+    month = date(1990, 1, 1)  # far outside anything retention or migrations create
+    monkeypatch.setattr(partitions, "_ensured", set())
+    assert partitions.ensure_months(db, [month]) == [month]
+    # The caller may still roll back; only the next call, finding it in place, caches it
+    assert not any(m == month for _, m in partitions._ensured)
+    assert partitions.ensure_months(db, [month]) == []
+    assert any(m == month for _, m in partitions._ensured)
+
+
+def test_within_bounds_to_the_span_of_the_dates():
+    from datetime import datetime, timezone
+
+    from db.models import AmazonOrderDetail
+
+    first = datetime(2024, 5, 3, tzinfo=timezone.utc)
+    last = datetime(2024, 7, 1, 12, tzinfo=timezone.utc)
+    assert partitions.date_range([last, None, "2024-05-03T00:00:00Z", first]) == (first, last)
+
+    clause = partitions.within(AmazonOrderDetail.purchase_date, [last, first])
+    assert "BETWEEN" in str(clause)
+    assert sorted(clause.compile().params.values()) == [first, last]
+    # No dates: no bound rather than one that matches nothing
+    assert str(partitions.within(AmazonOrderDetail.purchase_date, [None])) == "true"
+
+
+def test_write_recreates_a_month_detached_elsewhere(db, monkeypatch):
+    from datetime import datetime, timezone
+
+    from db.models import AmazonOrderDetail
+
+    month = date(1990, 2, 1)
+    monkeypatch.setattr(partitions, "_ensured", set())
+    partitions.ensure_months(db, [month])
+    partitions.ensure_months(db, [month])
+    cached = set(partitions._ensured)
+    # Another process drops the month; this one still has it cached
+    partitions.detach_month(db, month, drop=True)
+    partitions._ensured.update(cached)
+
+    purchase_date = datetime(1990, 2, 10, tzinfo=timezone.utc)
+    order = dict(amazon_order_id="TEST-PART-0001", purchase_date=purchase_date,
+                 marketplace_id="A1PA6795UKMFR9", order_status="Shipped")
+    partitions.write_for_dates(db, [purchase_date], lambda: db.execute(AmazonOrderDetail.__table__.insert(), order))
+    assert db.query(AmazonOrderDetail).filter_by(amazon_order_id="TEST-PART-0001").count() == 1
@@ -0,0 +1,70 @@
+import pytest
+
+from utils import rate_limiter
+from utils.rate_limiter import RATE_LIMIT_HEADER, TokenBucket
+
+
+class Clock:
+    """Stands in for time.monotonic/time.sleep; sleeping advances it."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limiter.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(rate_limiter.time, "sleep", clock.sleep)
+    return clock
+
+
+def test_burst_then_refill_at_the_rate(clock):
+    bucket = TokenBucket(rate=0.5, burst=2)
+    assert bucket.acquire() == 0
+    assert bucket.acquire() == 0
+    # Empty: the next token is 1 / rate away
+    assert bucket.acquire() == pytest.approx(2.0)
+
+    # Refill never goes past the burst
+    clock.now += 60
+    assert [bucket.acquire() for _ in range(3)] == [0, 0, pytest.approx(2.0)]
+
+
+def test_rate_follows_the_response_header(clock):
+    bucket = TokenBucket(rate=0.5, burst=1)
+    bucket.update_from_headers({RATE_LIMIT_HEADER.lower(): "2.0"})
+    assert bucket.rate == 2.0
+    bucket.acquire()
+    assert bucket.acquire() == pytest.approx(0.5)
+
+    # Missing or unparseable headers leave it alone
+    for headers in (None, {}, {RATE_LIMIT_HEADER: "n/a"}, {RATE_LIMIT_HEADER: "0"}):
+        bucket.update_from_headers(headers)
+    assert bucket.rate == 2.0
+
+
+def test_rate_change_keeps_the_tokens_earned_at_the_old_rate(clock):
+    bucket = TokenBucket(rate=0.5, burst=5)
+    for _ in range(5):
+        bucket.acquire()
+    clock.now += 4  # two tokens at 0.5/s
+    bucket.update_from_headers({RATE_LIMIT_HEADER: "0.1"})
+    assert [bucket.acquire() for _ in range(2)] == [0, 0]
+    assert bucket.acquire() == pytest.approx(10.0)
+
+
+def test_throttling_pauses_with_growing_penalty(clock):
+    bucket = TokenBucket(rate=1, burst=10)
+    assert bucket.on_throttled() == 1
+    assert bucket.on_throttled() == 2
+    # Drained and blocked until the penalty is over
+    assert bucket.acquire() == pytest.approx(2.0)
+    bucket.on_success()
+    assert bucket.on_throttled() == 1
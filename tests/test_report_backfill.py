@@ -0,0 +1,42 @@
+from sales_data.report_backfill import report_encoding
+
+JP = "A1VC38T7YXB528"
+DE = "A1PA6795UKMFR9"
+
+
+def test_marketplace_encoding_unless_the_header_names_a_charset():
+    # text/* without a charset is not a claim of ISO-8859-1
+    assert report_encoding("text/plain", JP) == "cp932"
+    assert report_encoding(None, DE) == "cp1252"
+    assert report_encoding('text/tab-separated-values; Charset="UTF-8"', JP) == "UTF-8"
+    assert report_encoding("text/plain; charset=", JP) == "cp932"
+
+
+def test_report_lines_leave_the_order_pending_for_the_item_fetch(db):
+    from datetime import datetime, timezone
+    from types import SimpleNamespace
+
+    from db.models import AmazonOrderDetail, AmazonOrderDetailItem, ITEMS_PENDING
+    from sales_data.order_items_sync import build_item_rows, write_items
+    from sales_data.report_backfill import load_batch
+
+    order_id = "TEST-RPT-0001"
+    purchase_date = datetime.now(timezone.utc).replace(day=15, hour=12, minute=0, second=0, microsecond=0)
+    line = {"amazon-order-id": order_id, "purchase-date": purchase_date.isoformat(), "order-status": "Shipped",
+            "asin": "TESTRPT1", "sku": "SKU-1", "quantity": "1", "item-price": "10.00", "currency": "EUR"}
+    marketplace = SimpleNamespace(marketplace_id=DE, name="DE")
+    seen, written = set(), set()
+    # A split order: its second line comes in a later batch
+    load_batch(db, marketplace, {order_id: [line]}, seen, written)
+    load_batch(db, marketplace, {order_id: [dict(line, asin="TESTRPT2", sku="SKU-2")]}, seen, written)
+
+    order = db.query(AmazonOrderDetail).filter_by(amazon_order_id=order_id).one()
+    assert order.items_status == ITEMS_PENDING
+    items = db.query(AmazonOrderDetailItem).filter_by(order_id=order_id)
+    assert sorted((i.asin, i.order_item_id) for i in items) == [("TESTRPT1", None), ("TESTRPT2", None)]
+
+    # The item fetch replaces the unkeyed lines
+    rows = build_item_rows(order_id, [{"OrderItemId": "L1", "ASIN": "TESTRPT1", "SellerSKU": "SKU-1",
+                                       "QuantityOrdered": 1}], "DE")
+    write_items(db, {order_id: order.purchase_date}, rows)
+    assert [(i.asin, i.order_item_id) for i in items] == [("TESTRPT1", "L1")]
@@ -0,0 +1,70 @@
+import pytest
+
+from utils import retry
+from utils.metrics import RETRY_WAIT
+from utils.retry import PERMANENT, THROTTLED, TRANSIENT, RetryError, backoff_delay, call_with_retries, classify
+
+
+class ApiError(Exception):
+    def __init__(self, code, message=""):
+        super().__init__(message or f"HTTP {code}")
+        self.code = code
+
+
+def test_classify():
+    assert classify(ApiError(429)) == THROTTLED
+    assert classify(Exception("QuotaExceeded: You exceeded your quota")) == THROTTLED
+    assert classify(ApiError(503)) == TRANSIENT
+    assert classify(ApiError(408)) == TRANSIENT
+    assert classify(ApiError(403)) == PERMANENT
+    assert classify(ConnectionResetError()) == TRANSIENT
+    # Only 400 and 404 condemn the request itself
+    assert RetryError(PERMANENT, ApiError(404), 1).poison
+    assert not RetryError(PERMANENT, ApiError(403), 1).poison
+
+
+def test_backoff_delay_is_full_jitter_up_to_the_cap(monkeypatch):
+    monkeypatch.setattr(retry.random, "uniform", lambda low, high: (low, high))
+    assert backoff_delay(1, base=2, cap=60) == (0, 2)
+    assert backoff_delay(3, base=2, cap=60) == (0, 8)
+    assert backoff_delay(10, base=2, cap=60) == (0, 60)
+
+
+def test_call_with_retries_backs_off_between_transient_failures(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(retry.time, "sleep", sleeps.append)
+    monkeypatch.setattr(retry, "backoff_delay", lambda attempt, base, cap: attempt * 1.5)
+    monkeypatch.setattr(RETRY_WAIT, "_values", {})
+    outcomes = [ApiError(503), ApiError(429), "ok"]
+
+    def flaky():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    assert call_with_retries(flaky, max_attempts=3, operation="getOrderItems", region="eu") == "ok"
+    assert sleeps == [1.5, 3.0]
+    assert RETRY_WAIT._values == {("getOrderItems", "eu"): 4.5}
+
+
+def test_call_with_retries_gives_up(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(retry.time, "sleep", sleeps.append)
+    calls = []
+
+    def rejected():
+        calls.append(1)
+        raise ApiError(400)
+
+    with pytest.raises(RetryError) as info:
+        call_with_retries(rejected, max_attempts=5)
+    # Permanent: no retry, no sleep
+    assert (info.value.kind, info.value.attempts, len(calls), sleeps) == (PERMANENT, 1, 1, [])
+
+    def down():
+        raise ApiError(503)
+
+    with pytest.raises(RetryError) as info:
+        call_with_retries(down, max_attempts=3, base_delay=0)
+    assert (info.value.kind, info.value.attempts, len(sleeps)) == (TRANSIENT, 3, 2)
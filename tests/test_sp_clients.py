@@ -0,0 +1,33 @@
+import threading
+from types import SimpleNamespace
+
+from utils import sp_clients
+
+
+class Orders:
+    def __init__(self, credentials, marketplace):
+        self.marketplace = marketplace
+
+
+class Sales(Orders):
+    pass
+
+
+def test_one_client_per_region_marketplace_and_api_across_threads(monkeypatch):
+    monkeypatch.setattr(sp_clients, "_clients", {})
+    monkeypatch.setattr(sp_clients, "SP_API_ENDPOINT", None)
+    de, fr = SimpleNamespace(marketplace_id="A1PA6795UKMFR9"), SimpleNamespace(marketplace_id="A13V1IB3VIYZZH")
+    got = []
+    threads = [threading.Thread(target=lambda: got.append(sp_clients.get_client(Orders, "EU", de, {})))
+               for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len({id(c) for c in got}) == 1
+    assert sp_clients.get_client(Orders, "EU", fr, {}) is not got[0]
+    assert sp_clients.get_client(Sales, "EU", de, {}) is not got[0]
+    assert sp_clients.get_client(Orders, "FE", de, {}) is not got[0]
+    sp_clients.clear_clients()
+    assert sp_clients.get_client(Orders, "EU", de, {}) is not got[0]
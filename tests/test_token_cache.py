@@ -0,0 +1,57 @@
+import json
+import os
+
+import pytest
+
+from utils import token_cache
+from utils.token_cache import REFRESH_MARGIN_SECONDS, get_access_token
+
+CREDS = {"lwa_app_id": "app", "refresh_token": "refresh", "lwa_client_secret": "secret"}
+NOW = 1_700_000_000.0
+
+
+@pytest.fixture
+def requests_made(monkeypatch):
+    requests_made = []
+
+    def request_token(creds):
+        requests_made.append(creds)
+        return {"access_token": f"token-{len(requests_made)}", "token_type": "bearer", "expires_at": NOW + 3600}
+
+    monkeypatch.setattr(token_cache, "_memory", {})
+    monkeypatch.setattr(token_cache, "_request_token", request_token)
+    monkeypatch.setattr(token_cache.time, "time", lambda: NOW)
+    return requests_made
+
+
+def test_refreshes_only_within_the_margin(tmp_path, monkeypatch, requests_made):
+    path = str(tmp_path / "tokens.json")
+    assert get_access_token(CREDS, path)["access_token"] == "token-1"
+    assert get_access_token(CREDS, path)["access_token"] == "token-1"
+
+    monkeypatch.setattr(token_cache.time, "time", lambda: NOW + 3600 - REFRESH_MARGIN_SECONDS - 1)
+    assert get_access_token(CREDS, path)["access_token"] == "token-1"
+    monkeypatch.setattr(token_cache.time, "time", lambda: NOW + 3600 - REFRESH_MARGIN_SECONDS)
+    assert get_access_token(CREDS, path)["access_token"] == "token-2"
+    assert len(requests_made) == 2
+
+
+def test_takes_a_token_another_process_refreshed(tmp_path, requests_made):
+    path = str(tmp_path / "tokens.json")
+    key = token_cache._cache_key(CREDS)
+    stale = {"access_token": "gone", "token_type": "bearer", "expires_at": NOW - 10}
+    with open(path, "w") as f:
+        json.dump({key: {"access_token": "shared", "token_type": "bearer", "expires_at": NOW + 3600},
+                   "other": stale}, f)
+
+    assert get_access_token(CREDS, path)["access_token"] == "shared"
+    assert requests_made == []
+    assert os.path.exists(path + ".lock")
+
+    # A refresh rewrites the file without the entries that have expired
+    token_cache._memory.clear()
+    with open(path, "w") as f:
+        json.dump({key: dict(stale, access_token="expiring"), "other": stale}, f)
+    assert get_access_token(CREDS, path)["access_token"] == "token-1"
+    with open(path) as f:
+        assert set(json.load(f)) == {key}
@@ -3,12 +3,19 @@ from logging.handlers import RotatingFileHandler
 import os
 
 log_folder = "logs"
-os.makedirs(log_folder, exist_ok=True)
 log_file = os.path.join(log_folder, "sync.log")
 logger = logging.getLogger("gorilla_logger")
 logger.setLevel(logging.INFO)
 
-handler = RotatingFileHandler(log_file, maxBytes=1000000, backupCount=5)
+
+class _DeferredFileHandler(RotatingFileHandler):
+    # Creates logs/ and opens the file on the first record, not at import
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+
+handler = _DeferredFileHandler(log_file, maxBytes=1000000, backupCount=5, delay=True)
 formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
 handler.setFormatter(formatter)
-logger.addHandler(handler)
\ No newline at end of file
+logger.addHandler(handler)
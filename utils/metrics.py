@@ -0,0 +1,209 @@
+import atexit
+import bisect
+import logging
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from a fast DB commit to a throttled API call
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(l, "") for l in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def collect(self):
+        with self._lock:
+            values = dict(self._values)
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(l, "") for l in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def collect(self):
+        with self._lock:
+            snapshot = {k: ([*v[0]], v[1], v[2]) for k, v in self._series.items()}
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count) in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames + ('le',), key + (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self._histogram = histogram
+        self._labels = labels
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._histogram.observe(time.perf_counter() - self._started, **self._labels)
+        return False
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+# ───────────────────────────────────────
+# Metrics recorded by the sync hot paths
+# ───────────────────────────────────────
+
+SP_API_LATENCY = Histogram(
+    "nimbussync_sp_api_request_seconds", "SP-API call latency", ("operation", "region", "outcome"))
+SP_API_THROTTLED = Counter(
+    "nimbussync_sp_api_throttled_total", "SP-API calls rejected with QuotaExceeded/429", ("operation", "region"))
+LIMITER_WAIT = Counter(
+    "nimbussync_rate_limiter_wait_seconds_total", "Time spent waiting on the rate limiter", ("operation", "region"))
+RETRY_WAIT = Counter(
+    "nimbussync_retry_wait_seconds_total", "Time spent backing off before retrying a failed call", ("operation", "region"))
+REPORT_POLL_WAIT = Counter(
+    "nimbussync_report_poll_wait_seconds_total", "Time spent waiting for reports to be generated", ("operation", "region"))
+ROWS = Counter(
+    "nimbussync_rows_total", "Rows written per table", ("table", "outcome"))
+DB_COMMIT_LATENCY = Histogram(
+    "nimbussync_db_commit_seconds", "Session commit latency")
+
+REGISTRY = [SP_API_LATENCY, SP_API_THROTTLED, LIMITER_WAIT, RETRY_WAIT, REPORT_POLL_WAIT, ROWS, DB_COMMIT_LATENCY]
+
+
+def record_rows(table, inserted=0, updated=0, skipped=0):
+    if inserted:
+        ROWS.inc(inserted, table=table, outcome="inserted")
+    if updated:
+        ROWS.inc(updated, table=table, outcome="updated")
+    if skipped:
+        ROWS.inc(skipped, table=table, outcome="skipped")
+
+
+@event.listens_for(Session, "before_commit")
+def _commit_started(session):
+    session.info["_commit_started"] = time.perf_counter()
+
+
+@event.listens_for(Session, "after_commit")
+def _commit_finished(session):
+    started = session.info.pop("_commit_started", None)
+    if started is not None:
+        DB_COMMIT_LATENCY.observe(time.perf_counter() - started)
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.collect())
+    return "\n".join(lines) + "\n"
+
+
+# ───────────────────────────────────────
+# Exporters
+# ───────────────────────────────────────
+
+def write_textfile(path):
+    """Atomically write the metrics for node_exporter's textfile collector."""
+    directory = os.path.dirname(path) or "."
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".nimbussync_metrics_")
+    with os.fdopen(fd, "w") as f:
+        f.write(render())
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, addr="0.0.0.0"):
+    server = ThreadingHTTPServer((addr, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info(f"📈 Serving metrics on http://{addr}:{port}/metrics")
+    return server
+
+
+_exporters_started = False
+
+
+def install_exporters(textfile=None, port=None, interval=15):
+    """Start the exporters configured via METRICS_TEXTFILE / METRICS_PORT."""
+    global _exporters_started
+    if _exporters_started:
+        return
+    _exporters_started = True
+
+    textfile = textfile or os.getenv("METRICS_TEXTFILE")
+    port = port or os.getenv("METRICS_PORT")
+    if port:
+        start_http_server(int(port))
+    if textfile:
+        def flush_periodically():
+            while True:
+                time.sleep(interval)
+                write_textfile(textfile)
+
+        threading.Thread(target=flush_periodically, name="metrics-textfile", daemon=True).start()
+        atexit.register(write_textfile, textfile)
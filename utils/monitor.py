@@ -1,70 +1,190 @@
 import sys
 import os
+import argparse
+import json
 import logging
-from sqlalchemy.sql import func
-from sqlalchemy import and_, distinct
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
 
 # Dynamically add the root project dir to sys.path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from db.connect import SessionLocal
-from db.models import SalesSummary, AmazonOrderDetail, AmazonOrderDetailItem
+from db.connect import engine
+
+logger = logging.getLogger(__name__)
 
-# Setup session
-session = SessionLocal()
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_ERROR = 2
 
-print("\n--- ✅ Recent SalesSummary Records ---")
-sales_check = session.query(SalesSummary.date, SalesSummary.country).order_by(SalesSummary.date.desc()).limit(10).all()
-for r in sales_check:
-    print(r)
+# Orders still without items after this many fetch attempts count as stuck
+STUCK_ATTEMPTS = 3
+# Fetched orders this old with no item rows count as missing items; newer ones
+# may be Pending orders that Amazon hasn't attached lines to yet
+ITEMS_GRACE_HOURS = 24
+# A marketplace whose newest SalesSummary day is older than this is stale
+STALE_SALES_DAYS = 3
 
 # ------------------ 🔍 Integrity Checks -------------------
-print("\n--- 🧪 Data Integrity Audit ---")
-
-# 1. Null check: unit_count in SalesSummary
-null_units = session.query(SalesSummary).filter(SalesSummary.unit_count == None).count()
-print(f"Null unit_count rows in SalesSummary: {null_units}")
-
-# 2. Null check: order_id in AmazonOrderDetail
-null_orders = session.query(AmazonOrderDetail).filter(AmazonOrderDetail.amazon_order_id == None).count()
-print(f"Null amazon_order_id in AmazonOrderDetail: {null_orders}")
-
-# 3. Check duplicates for date + country in SalesSummary
-duplicates = (
-    session.query(SalesSummary.date, SalesSummary.country, func.count('*').label("count"))
-    .group_by(SalesSummary.date, SalesSummary.country)
-    .having(func.count('*') > 1)
-    .all()
-)
-print(f"Duplicate SalesSummary date+country records: {len(duplicates)}")
-if duplicates:
-    print("Sample Duplicates:")
-    for row in duplicates[:5]:
-        print(row)
-
-# 4. Currency consistency check
-print("\nCurrency mismatches (per country):")
-currency_issues = (
-    session.query(SalesSummary.country, SalesSummary.currency, func.count('*'))
-    .group_by(SalesSummary.country, SalesSummary.currency)
-    .having(func.count('*') > 1)
-    .all()
-)
-if currency_issues:
-    for issue in currency_issues:
-        print(issue)
-else:
-    print("✅ All currencies consistent")
-
-# 5. Orders missing line items
-missing_items = (
-    session.query(AmazonOrderDetail.amazon_order_id)
-    .outerjoin(AmazonOrderDetailItem, AmazonOrderDetail.amazon_order_id == AmazonOrderDetailItem.order_id)
-    .filter(AmazonOrderDetailItem.id == None)
-    .all()
+# Each check is a single aggregate query (one scan of its table) and runs on
+# its own connection, so independent checks run concurrently.
+
+_SALES_SQL = """
+WITH per_day AS (
+    SELECT country, date,
+           count(*) AS n,
+           count(*) FILTER (WHERE unit_count IS NULL) AS null_units,
+           min(currency) AS min_currency,
+           max(currency) AS max_currency
+    FROM sales_summary
+    WHERE CAST(:since AS date) IS NULL OR date >= :since
+    GROUP BY country, date
+),
+per_country AS (
+    SELECT country,
+           sum(n) AS n,
+           sum(null_units) AS null_units,
+           count(*) FILTER (WHERE n > 1) AS duplicate_keys,
+           min(min_currency) IS DISTINCT FROM max(max_currency) AS mixed_currency,
+           max(date) AS latest
+    FROM per_day
+    GROUP BY country
 )
-print(f"Orders with no item detail: {len(missing_items)}")
+SELECT coalesce(sum(n), 0) AS rows,
+       coalesce(sum(null_units), 0) AS null_unit_count,
+       coalesce(sum(duplicate_keys), 0) AS duplicate_date_country,
+       count(*) FILTER (WHERE mixed_currency) AS mixed_currency_countries,
+       count(*) FILTER (WHERE latest < :stale_before) AS stale_countries,
+       max(latest) AS latest_date
+FROM per_country
+"""
+
+_ORDERS_SQL = """
+SELECT count(*) AS rows,
+       count(*) FILTER (WHERE o.amazon_order_id IS NULL) AS null_order_ids,
+       count(*) FILTER (WHERE o.items_status = 'pending') AS pending_items,
+       count(*) FILTER (WHERE o.items_status = 'pending' AND o.items_attempts >= :stuck) AS stuck_items,
+       count(*) FILTER (WHERE o.items_status = 'dead') AS dead_letter_items,
+       count(*) FILTER (WHERE o.items_status = 'fetched' AND o.purchase_date < :grace_before AND NOT EXISTS (
+           SELECT 1 FROM amazon_order_detail_item i
+           WHERE i.order_id = o.amazon_order_id AND i.purchase_date = o.purchase_date
+       )) AS orders_without_items,
+       max(o.purchase_date) AS latest_purchase
+FROM amazon_orders_detail o
+{where}
+"""
+
+
+def check_sales_summary(conn, since):
+    today = datetime.now(timezone.utc).date()
+    row = conn.execute(text(_SALES_SQL), {
+        "since": since.date() if since else None,
+        "stale_before": today - timedelta(days=STALE_SALES_DAYS),
+    }).one()
+    return dict(row._mapping)
+
+
+def check_orders(conn, since):
+    # A plain range rather than ":since IS NULL OR ...", so the planner can
+    # prune the order partitions before `since`
+    where = "WHERE o.purchase_date >= :since" if since else ""
+    row = conn.execute(text(_ORDERS_SQL.format(where=where)), {
+        "since": since,
+        "stuck": STUCK_ATTEMPTS,
+        "grace_before": datetime.now(timezone.utc) - timedelta(hours=ITEMS_GRACE_HOURS),
+    }).one()
+    return dict(row._mapping)
+
+
+CHECKS = {
+    "sales_summary": check_sales_summary,
+    "orders": check_orders,
+}
+
+# metric: (check, severity when the metric is non-zero)
+RULES = {
+    "null_order_ids": ("orders", "fail"),
+    "duplicate_date_country": ("sales_summary", "fail"),
+    "mixed_currency_countries": ("sales_summary", "fail"),
+    "null_unit_count": ("sales_summary", "warn"),
+    "stale_countries": ("sales_summary", "warn"),
+    "stuck_items": ("orders", "warn"),
+    "dead_letter_items": ("orders", "warn"),
+    "orders_without_items": ("orders", "warn"),
+}
+
+
+def _run_check(name, since):
+    with engine.connect() as conn:
+        return CHECKS[name](conn, since)
+
+
+def run_audit(days=None):
+    since = datetime.now(timezone.utc) - timedelta(days=days) if days else None
+    with ThreadPoolExecutor(max_workers=len(CHECKS), thread_name_prefix="monitor") as pool:
+        futures = {name: pool.submit(_run_check, name, since) for name in CHECKS}
+        metrics = {name: future.result() for name, future in futures.items()}
+
+    findings = []
+    for metric, (check, severity) in RULES.items():
+        value = metrics[check].get(metric) or 0
+        if value:
+            findings.append({"check": check, "metric": metric, "value": value, "severity": severity})
+
+    return {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "window_days": days,
+        "metrics": metrics,
+        "findings": findings,
+    }
+
+
+def exit_code(report, strict=False):
+    severities = {f["severity"] for f in report["findings"]}
+    if "fail" in severities or (strict and "warn" in severities):
+        return EXIT_FAILED
+    return EXIT_OK
+
+
+def print_report(report):
+    scope = f"last {report['window_days']} days" if report["window_days"] else "all time"
+    print(f"\n--- 🧪 Data Integrity Audit ({scope}) ---")
+    for check, metrics in report["metrics"].items():
+        print(f"\n[{check}]")
+        for key, value in metrics.items():
+            print(f"  {key}: {value}")
+    print()
+    if not report["findings"]:
+        print("✅ All checks passed")
+    for finding in report["findings"]:
+        icon = "❌" if finding["severity"] == "fail" else "⚠️"
+        print(f"{icon} {finding['check']}.{finding['metric']} = {finding['value']}")
+    print("\n--- 🟢 Monitor Checks Complete ---")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="nimbussync monitor", description="Integrity audit for synced Amazon data")
+    parser.add_argument("--days", type=int, default=None, help="only audit the last N days")
+    parser.add_argument("--json", action="store_true", help="print a machine-readable JSON report")
+    parser.add_argument("--strict", action="store_true", help="treat warnings as failures in the exit code")
+    args = parser.parse_args(argv)
+
+    try:
+        report = run_audit(days=args.days)
+    except Exception as e:
+        logger.error(f"Monitor failed: {e}")
+        if args.json:
+            print(json.dumps({"error": str(e)}))
+        return EXIT_ERROR
+
+    if args.json:
+        print(json.dumps(report, default=str))
+    else:
+        print_report(report)
+    return exit_code(report, strict=args.strict)
+
 
-# Cleanup
-session.close()
-print("\n--- 🟢 Monitor Checks Complete ---")
\ No newline at end of file
+if __name__ == "__main__":
+    sys.exit(main())
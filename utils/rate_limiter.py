@@ -0,0 +1,136 @@
+import logging
+import threading
+import time
+
+from utils.metrics import SP_API_LATENCY, SP_API_THROTTLED, LIMITER_WAIT
+
+logger = logging.getLogger(__name__)
+
+# Documented SP-API usage plans per operation: (requests per second, burst)
+OPERATION_LIMITS = {
+    "getOrders": (0.0167, 20),
+    "getOrder": (0.5, 30),
+    "getOrderItems": (0.5, 30),
+    "getOrderMetrics": (0.5, 15),
+    "createReport": (0.0167, 15),
+    "getReport": (2.0, 15),
+    "getReportDocument": (0.0167, 15),
+}
+DEFAULT_LIMIT = (0.5, 1)
+
+# Longest single pause after repeated throttling responses
+MAX_PENALTY_SECONDS = 300
+
+RATE_LIMIT_HEADER = "x-amzn-RateLimit-Limit"
+
+
+class TokenBucket:
+    """Blocking token bucket that adapts to the rate Amazon reports back."""
+
+    def __init__(self, rate, burst, name=""):
+        self.name = name
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._strikes = 0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """Wait for one token. Returns the number of seconds spent waiting."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self._blocked_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                wait = max(self._blocked_until - now, (1 - self._tokens) / self.rate)
+            time.sleep(wait)
+            waited += wait
+
+    def update_from_headers(self, headers):
+        headers = headers or {}
+        value = headers.get(RATE_LIMIT_HEADER) or headers.get(RATE_LIMIT_HEADER.lower())
+        if not value:
+            return
+        try:
+            rate = float(value)
+        except (TypeError, ValueError):
+            return
+        if rate > 0 and abs(rate - self.rate) > 1e-9:
+            with self._lock:
+                self._refill(time.monotonic())
+                logger.info(f"🔧 {self.name}: rate limit {self.rate:g} → {rate:g} req/s (from response header)")
+                self.rate = rate
+
+    def on_success(self):
+        with self._lock:
+            self._strikes = 0
+
+    def on_throttled(self):
+        """Drain the bucket and pause for an exponentially growing interval."""
+        with self._lock:
+            self._strikes += 1
+            penalty = min(MAX_PENALTY_SECONDS, (1 / self.rate) * 2 ** (self._strikes - 1))
+            now = time.monotonic()
+            self._tokens = 0.0
+            self._updated = now
+            self._blocked_until = max(self._blocked_until, now + penalty)
+            logger.warning(f"⏳ {self.name}: throttled, pausing {penalty:.1f}s [strike {self._strikes}]")
+            return penalty
+
+
+_limiters = {}
+_registry_lock = threading.Lock()
+
+
+def get_limiter(region, operation):
+    """One shared bucket per (credential region, SP-API operation)."""
+    key = (region, operation)
+    with _registry_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            rate, burst = OPERATION_LIMITS.get(operation, DEFAULT_LIMIT)
+            limiter = TokenBucket(rate, burst, name=f"{region}/{operation}")
+            _limiters[key] = limiter
+        return limiter
+
+
+def is_throttled(exc):
+    return getattr(exc, "code", None) == 429 or "QuotaExceeded" in str(exc)
+
+
+def call_limited(region, operation, fn, *args, max_throttle_retries=10, **kwargs):
+    """Run one SP-API call under the shared limiter, retrying on throttling."""
+    limiter = get_limiter(region, operation)
+    labels = {"operation": operation, "region": region or ""}
+    throttled = 0
+    while True:
+        waited = limiter.acquire()
+        if waited:
+            LIMITER_WAIT.inc(waited, **labels)
+        started = time.perf_counter()
+        try:
+            res = fn(*args, **kwargs)
+        except Exception as e:
+            outcome = "throttled" if is_throttled(e) else "error"
+            SP_API_LATENCY.observe(time.perf_counter() - started, outcome=outcome, **labels)
+            if outcome == "throttled":
+                SP_API_THROTTLED.inc(**labels)
+            if outcome != "throttled" or throttled >= max_throttle_retries:
+                raise
+            throttled += 1
+            limiter.update_from_headers(getattr(e, "headers", None))
+            limiter.on_throttled()
+            continue
+        SP_API_LATENCY.observe(time.perf_counter() - started, outcome="ok", **labels)
+        limiter.update_from_headers(getattr(res, "headers", None))
+        limiter.on_success()
+        return res
@@ -0,0 +1,71 @@
+import logging
+import random
+import time
+
+from utils.metrics import RETRY_WAIT
+from utils.rate_limiter import is_throttled
+
+logger = logging.getLogger(__name__)
+
+# Error classes, by what retrying can achieve
+THROTTLED = "throttled"  # over quota even after the limiter's own retries
+TRANSIENT = "transient"  # server/network trouble; worth retrying after a pause
+PERMANENT = "permanent"  # the request itself is rejected; retrying won't help
+
+TRANSIENT_CODES = {408, 425, 429, 500, 502, 503, 504}
+# Rejections that are about the request, not the caller: the order itself is
+# bad, so it is dead-lettered on first sight. Other 4xx (401/403) may be a
+# credentials problem shared by every order and only count as an attempt.
+POISON_CODES = {400, 404}
+
+BASE_DELAY = 2.0
+MAX_DELAY = 60.0
+
+
+class RetryError(Exception):
+    """Raised once a call has failed for good; carries the last error and its class."""
+
+    def __init__(self, kind, error, attempts):
+        super().__init__(f"{kind} after {attempts} attempt(s): {error}")
+        self.kind = kind
+        self.error = error
+        self.attempts = attempts
+
+    @property
+    def poison(self):
+        return self.kind == PERMANENT and getattr(self.error, "code", None) in POISON_CODES
+
+
+def classify(exc):
+    if is_throttled(exc):
+        return THROTTLED
+    code = getattr(exc, "code", None)
+    if isinstance(code, int) and 400 <= code < 600:
+        return TRANSIENT if code in TRANSIENT_CODES or code >= 500 else PERMANENT
+    # Connection resets, timeouts and anything unrecognised: bounded retries are cheap
+    return TRANSIENT
+
+
+def backoff_delay(attempt, base=BASE_DELAY, cap=MAX_DELAY):
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2^(attempt-1))]."""
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+def call_with_retries(fn, *args, max_attempts=3, base_delay=BASE_DELAY, max_delay=MAX_DELAY, label="",
+                      operation="", region="", **kwargs):
+    """Call fn, retrying throttled and transient failures with backoff. Raises RetryError when done trying.
+
+    The backoff is counted in RETRY_WAIT under operation and region, as the limiter counts its waits.
+    """
+    for attempt in range(1, max_attempts + 1):
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            kind = classify(e)
+            if kind == PERMANENT or attempt == max_attempts:
+                raise RetryError(kind, e, attempt) from e
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            logger.warning(f"{kind.capitalize()} error{' on ' + label if label else ''} "
+                           f"[attempt {attempt}/{max_attempts}], retrying in {delay:.1f}s: {e}")
+            RETRY_WAIT.inc(delay, operation=operation, region=region or "")
+            time.sleep(delay)
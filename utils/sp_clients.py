@@ -0,0 +1,132 @@
+import os
+import threading
+
+from utils.token_cache import CachedAuth, get_access_token
+
+# Point every client at a local SP-API stand-in (see bench/fake_sp_api.py)
+# instead of Amazon's regional endpoints.
+SP_API_ENDPOINT = os.getenv("SP_API_ENDPOINT")
+
+# One client per (region, marketplace, API) for the whole process, so the
+# fetch workers share its connection pool and cached token instead of each
+# thread building (and authenticating) its own. Calls pass all request state
+# as arguments, so concurrent use of one client is safe.
+_clients = {}
+_registry_lock = threading.Lock()
+
+
+def load_credentials():
+    """client_config.CREDENTIALS, imported on first use so modules import without it."""
+    from client_config import CREDENTIALS
+    return CREDENTIALS
+
+
+def get_client(api_cls, region, marketplace, creds=None):
+    """Reuse one SP-API client per (region, marketplace, API) across all threads."""
+    key = (region, marketplace.marketplace_id, api_cls.__name__)
+    with _registry_lock:
+        client = _clients.get(key)
+        if client is None:
+            if creds is None:
+                creds = load_credentials()[region]
+            if SP_API_ENDPOINT:
+                client = LocalClient(SP_API_ENDPOINT, marketplace, creds)
+            else:
+                client = api_cls(credentials=creds, marketplace=marketplace)
+                client._auth = CachedAuth(creds, inner=getattr(client, "_auth", None))
+            _clients[key] = client
+        return client
+
+
+def clear_clients():
+    with _registry_lock:
+        _clients.clear()
+
+
+# ───────────────────────────────────────
+# Plain-HTTP client for the local stand-in
+# ───────────────────────────────────────
+
+class LocalApiResponse:
+    def __init__(self, payload, headers):
+        self.payload = payload
+        self.headers = headers
+
+
+_error_cls = None
+
+
+def local_api_error(code, message, headers=None):
+    """Error response from the stand-in, caught wherever SellingApiException is."""
+    global _error_cls
+    if _error_cls is None:
+        from sp_api.base import SellingApiException
+
+        class LocalApiError(SellingApiException):
+            def __init__(self, code, message, headers=None):
+                Exception.__init__(self, message)
+                self.code = code
+                self.message = message
+                self.headers = headers or {}
+
+        _error_cls = LocalApiError
+    return _error_cls(code, message, headers)
+
+
+class LocalClient:
+    """Covers the Orders, Sales and Reports calls the sync modules make, without SigV4 signing."""
+
+    def __init__(self, endpoint, marketplace, creds):
+        import requests
+
+        self.endpoint = endpoint.rstrip("/")
+        self.marketplace_id = marketplace.marketplace_id
+        self.creds = creds
+        self._http = requests.Session()
+
+    def _request(self, method, path, params=None, body=None):
+        token = get_access_token(self.creds)["access_token"]
+        res = self._http.request(method, self.endpoint + path, params=params, json=body,
+                                 headers={"x-amz-access-token": token}, timeout=60)
+        body = res.json() if res.content else {}
+        if res.status_code >= 400:
+            errors = body.get("errors") or [{}]
+            message = f"{errors[0].get('code', res.status_code)}: {errors[0].get('message', '')}"
+            raise local_api_error(res.status_code, message, dict(res.headers))
+        return LocalApiResponse(body.get("payload"), dict(res.headers))
+
+    def _get(self, path, params):
+        return self._request("GET", path, params)
+
+    def get_orders(self, **kwargs):
+        params = dict(kwargs)
+        if "NextToken" not in params:
+            params.setdefault("MarketplaceIds", [self.marketplace_id])
+        if "MarketplaceIds" in params:
+            params["MarketplaceIds"] = ",".join(params["MarketplaceIds"])
+        return self._get("/orders/v0/orders", params)
+
+    def get_order_items(self, order_id, **kwargs):
+        return self._get(f"/orders/v0/orders/{order_id}/orderItems", kwargs)
+
+    def get_order_metrics(self, interval, granularity, granularityTimeZone=None, **kwargs):
+        params = {
+            "marketplaceIds": self.marketplace_id,
+            "interval": "--".join(interval),
+            "granularity": getattr(granularity, "value", granularity),
+        }
+        if granularityTimeZone:
+            params["granularityTimeZone"] = granularityTimeZone
+        params.update(kwargs)
+        return self._get("/sales/v1/orderMetrics", params)
+
+    def create_report(self, **kwargs):
+        body = dict(kwargs)
+        body.setdefault("marketplaceIds", [self.marketplace_id])
+        return self._request("POST", "/reports/2021-06-30/reports", body=body)
+
+    def get_report(self, report_id, **kwargs):
+        return self._get(f"/reports/2021-06-30/reports/{report_id}", kwargs)
+
+    def get_report_document(self, document_id, **kwargs):
+        return self._get(f"/reports/2021-06-30/documents/{document_id}", kwargs)
@@ -0,0 +1,122 @@
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Shared by every process on the host (Airflow tasks, run_all.py, workers).
+# Point LWA_TOKEN_CACHE at a shared volume to share across containers too.
+TOKEN_CACHE_PATH = os.getenv(
+    "LWA_TOKEN_CACHE", os.path.join(tempfile.gettempdir(), "nimbussync_lwa_tokens.json")
+)
+LWA_TOKEN_URL = os.getenv("LWA_TOKEN_URL", "https://api.amazon.com/auth/o2/token")
+
+# Refresh this many seconds before the token actually expires
+REFRESH_MARGIN_SECONDS = 300
+
+_memory = {}
+_memory_lock = threading.Lock()
+
+
+def _cache_key(creds):
+    raw = f"{creds.get('lwa_app_id')}:{creds.get('refresh_token')}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _fresh(entry):
+    return entry and entry["expires_at"] - REFRESH_MARGIN_SECONDS > time.time()
+
+
+@contextmanager
+def _file_lock(path):
+    with open(path + ".lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _read_cache(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _write_cache(path, data):
+    directory = os.path.dirname(path) or "."
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".lwa_tokens_")
+    with os.fdopen(fd, "w") as f:
+        json.dump(data, f)
+    os.chmod(tmp, 0o600)
+    os.replace(tmp, path)
+
+
+def _request_token(creds):
+    import requests
+
+    res = requests.post(LWA_TOKEN_URL, data={
+        "grant_type": "refresh_token",
+        "refresh_token": creds.get("refresh_token"),
+        "client_id": creds.get("lwa_app_id"),
+        "client_secret": creds.get("lwa_client_secret"),
+    }, timeout=30)
+    res.raise_for_status()
+    body = res.json()
+    return {
+        "access_token": body["access_token"],
+        "token_type": body.get("token_type", "bearer"),
+        "expires_at": time.time() + int(body.get("expires_in", 3600)),
+    }
+
+
+def get_access_token(creds, path=TOKEN_CACHE_PATH):
+    """Return a cached LWA token entry, refreshing it once shortly before expiry."""
+    key = _cache_key(creds)
+    with _memory_lock:
+        entry = _memory.get(key)
+        if _fresh(entry):
+            return entry
+
+        # Another process may already have refreshed it; check under the file lock
+        with _file_lock(path):
+            cache = _read_cache(path)
+            entry = cache.get(key)
+            if not _fresh(entry):
+                logger.info("🔑 Refreshing LWA access token")
+                entry = _request_token(creds)
+                cache = {k: v for k, v in cache.items() if v["expires_at"] > time.time()}
+                cache[key] = entry
+                _write_cache(path, cache)
+        _memory[key] = entry
+        return entry
+
+
+class CachedAuth:
+    """Stands in for sp_api's AccessTokenClient, serving tokens from the shared cache."""
+
+    def __init__(self, creds, inner=None):
+        self._creds = creds
+        self._inner = inner
+
+    def get_auth(self):
+        from sp_api.auth import AccessTokenResponse
+
+        entry = get_access_token(self._creds)
+        return AccessTokenResponse(
+            access_token=entry["access_token"],
+            refresh_token=self._creds.get("refresh_token"),
+            expires_in=int(entry["expires_at"] - time.time()),
+            token_type=entry["token_type"],
+        )
+
+    def __getattr__(self, name):
+        return getattr(self._inner, name)